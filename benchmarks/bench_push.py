@@ -0,0 +1,186 @@
+'''
+@Project : dongdong
+@File : bench_push.py
+@Description : Latency, throughput, decorator overhead and queue memory of every webhook backend,
+    measured against the local stub of stub_server.py
+
+Usage: python benchmarks/bench_push.py [--messages 200] [--latency 0] [--error-rate 0] [--rate-limit 20/60]
+                                       [--backends bark,dingtalk,wechat,teams] [--json results.json]
+'''
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import threading
+import contextlib
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from stub_server import StubServer, parse_rate
+
+
+def make_notificator(backend: str, url: str, **kwargs):
+    '''
+    A notificator of backend posting to the stub at url, the client-side rate limit is off unless given,
+    and messages are sent directly even if a relay is running.
+    '''
+    import dongdong
+    kwargs.setdefault('rate_limit', False)
+    kwargs.setdefault('relay', False)
+    if backend == 'bark':
+        return dongdong.BarkNotificator(token='bench', server=url + '/bark', **kwargs)
+    if backend == 'dingtalk':
+        return dongdong.DingTalkNotificator(webhook=url + '/dingtalk?access_token=bench', **kwargs)
+    if backend == 'wechat':
+        return dongdong.WechatNotificator(webhook=url + '/wechat?key=bench', **kwargs)
+    if backend == 'teams':
+        return dongdong.TeamsNotificator(webhook=url + '/teams', **kwargs)
+    raise ValueError('unknown backend %r' % backend)
+
+
+def push(notificator, text: str):
+    '''
+    The public push() of the backend, Bark takes a string, the others a list of lines.
+    '''
+    import dongdong
+    if isinstance(notificator, dongdong.BarkNotificator):
+        notificator.push(text)
+    else:
+        notificator.push([text])
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def bench_latency(backend: str, server: StubServer, messages: int) -> dict:
+    '''
+    Synchronous push() latency and throughput, the first message opens the connection and is not counted.
+    '''
+    notificator = make_notificator(backend, server.url)
+    push(notificator, 'warm up')
+    server.reset()
+    latencies = []
+    begin = time.perf_counter()
+    for i in range(messages):
+        start = time.perf_counter()
+        push(notificator, 'message %d' % i)
+        latencies.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - begin
+    return {
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p90_ms': percentile(latencies, 0.9) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'sync_msgs_per_s': messages / elapsed,
+        'connections': len(server.connections),
+        'errors': server.errors,
+        'limited': server.limited,
+    }
+
+
+def bench_async(backend: str, server: StubServer, messages: int) -> dict:
+    '''
+    Time spent in push() in asynchronous mode, and time until the queue is drained.
+    '''
+    notificator = make_notificator(backend, server.url, async_delivery=True, queue_size=messages)
+    begin = time.perf_counter()
+    for i in range(messages):
+        push(notificator, 'message %d' % i)
+    enqueued = time.perf_counter() - begin
+    notificator.flush()
+    drained = time.perf_counter() - begin
+    return {
+        'async_push_us': enqueued / messages * 1e6,
+        'async_msgs_per_s': messages / drained,
+    }
+
+
+def bench_decorator(backend: str, server: StubServer, calls: int) -> dict:
+    '''
+    Cost of @monitor() on a function doing nothing, in synchronous and asynchronous mode.
+    '''
+    def noop():
+        return None
+
+    results = {}
+    begin = time.perf_counter()
+    for _ in range(calls):
+        noop()
+    bare = (time.perf_counter() - begin) / calls
+    for mode, async_delivery in (('sync', False), ('async', True)):
+        notificator = make_notificator(backend, server.url, async_delivery=async_delivery, queue_size=2 * calls)
+        monitored = notificator.monitor()(noop)
+        begin = time.perf_counter()
+        for _ in range(calls):
+            monitored()
+        results['decorator_%s_us' % mode] = ((time.perf_counter() - begin) / calls - bare) * 1e6
+        notificator.flush()
+    return results
+
+
+def bench_memory(backend: str, server: StubServer, messages: int) -> dict:
+    '''
+    Memory held by each message waiting in the asynchronous queue, the worker is held back while measuring.
+    '''
+    notificator = make_notificator(backend, server.url, async_delivery=True, queue_size=messages)
+    gate = threading.Event()
+    deliver = notificator._queue.deliver
+    notificator._queue.deliver = lambda item: (gate.wait(), deliver(item))
+    # The first message starts the worker thread, it stays blocked on the gate
+    push(notificator, 'first')
+    texts = ['message %d' % i for i in range(messages)]
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for text in texts:
+        push(notificator, text)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    notificator._queue.deliver = deliver
+    gate.set()
+    notificator.flush()
+    return {'bytes_per_queued_message': (after - before) / messages}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Delivery benchmark of dongdong against a local stub server')
+    parser.add_argument('--messages', type=int, default=200, help='messages per measurement')
+    parser.add_argument('--latency', type=float, default=0, help='seconds the stub waits before answering')
+    parser.add_argument('--error-rate', type=float, default=0, help='fraction of requests answered with 500')
+    parser.add_argument('--rate-limit', type=parse_rate, default=None,
+                        help='messages/seconds the stub accepts per webhook, the others are answered with 429')
+    parser.add_argument('--backends', default='bark,dingtalk,wechat,teams')
+    parser.add_argument('--json', help='also write the results to this file, to compare runs')
+    args = parser.parse_args()
+
+    server = StubServer(0, args.latency, args.error_rate, args.rate_limit).start()
+    results = {}
+    # Failed messages print a warning each, they are counted by the stub instead
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for backend in args.backends.split(','):
+            result = bench_latency(backend, server, args.messages)
+            result.update(bench_async(backend, server, args.messages))
+            result.update(bench_decorator(backend, server, max(args.messages // 4, 1)))
+            result.update(bench_memory(backend, server, args.messages))
+            results[backend] = result
+    server.shutdown()
+
+    columns = ['p50_ms', 'p90_ms', 'p99_ms', 'sync_msgs_per_s', 'async_msgs_per_s', 'async_push_us',
+               'decorator_sync_us', 'decorator_async_us', 'bytes_per_queued_message', 'connections', 'errors',
+               'limited']
+    print('%-20s' % 'metric' + ''.join('%12s' % backend for backend in results))
+    for column in columns:
+        print('%-20s' % column.replace('bytes_per_queued_message', 'bytes_per_queued')
+              + ''.join('%12.1f' % result[column] for result in results.values()))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'settings': vars(args), 'python': sys.version.split()[0], 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+'''
+@Project : dongdong
+@File : import_time.py
+@Description : Import-time benchmark based on `python -X importtime`, exits with 1 on a regression
+
+Usage: python benchmarks/import_time.py [--repeat 15]
+'''
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# statement: (budget in milliseconds, modules it must not import)
+CASES = {
+    'import dongdong': (10, ['requests', 'asyncio', 'dongdong.BaseNotificator']),
+    'from dongdong import DesktopNotificator': (40, ['requests', 'asyncio', 'subprocess', 'sqlite3', 'json']),
+    'from dongdong import DingTalkNotificator': (40, ['requests', 'asyncio', 'sqlite3']),
+}
+
+
+def measure(statement: str):
+    '''
+    Run the statement in a fresh interpreter.
+    :return: the import time of the statement in milliseconds and the modules it loaded
+    '''
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    code = statement + '\nimport sys\nprint(" ".join(sys.modules))'
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    total = 0
+    after_site = False
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Startup imports end with site, the top-level entries after it come from the statement
+        if name.strip() == 'site' and not name.startswith('  '):
+            after_site = True
+        elif after_site and not name.startswith('  '):
+            total += int(cumulative)
+    return total / 1000, set(result.stdout.split())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import-time benchmark of dongdong')
+    parser.add_argument('--repeat', type=int, default=15, help='runs per statement, the median is reported')
+    args = parser.parse_args()
+
+    failed = False
+    print('%-45s %10s %10s  %s' % ('statement', 'median ms', 'budget ms', 'status'))
+    for statement, (budget, forbidden) in CASES.items():
+        runs = [measure(statement) for _ in range(args.repeat)]
+        median = statistics.median(ms for ms, _ in runs)
+        loaded = sorted(set(forbidden) & runs[0][1])
+        status = 'ok'
+        if median > budget:
+            status = 'SLOW'
+        if loaded:
+            status = 'IMPORTS ' + ', '.join(loaded)
+        failed = failed or status != 'ok'
+        print('%-45s %10.2f %10d  %s' % (statement, median, budget, status))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
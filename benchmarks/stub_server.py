@@ -0,0 +1,134 @@
+'''
+@Project : dongdong
+@File : stub_server.py
+@Description : Local stand-in for the Bark, DingTalk, WeChat and Teams webhooks
+
+Usage: python benchmarks/stub_server.py --port 8080 --latency 0.05 --error-rate 0.01 --rate-limit 20/60
+'''
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# What each service answers when the message is accepted, keyed by the first path component
+RESPONSES = {
+    'bark': {'code': 200, 'message': 'success'},
+    'dingtalk': {'errcode': 0, 'errmsg': 'ok'},
+    'wechat': {'errcode': 0, 'errmsg': 'ok'},
+    'teams': 1,
+}
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency: float = 0, error_rate: float = 0, rate_limit: tuple = None):
+        '''
+        Accepts POST requests on /bark/<token>, /dingtalk, /wechat and /teams, with keep-alive connections.
+        :param port: 0 picks a free port
+        :param latency: seconds to wait before answering
+        :param error_rate: fraction of requests answered with 500
+        :param rate_limit: (messages, seconds) accepted per path, the others are answered with 429
+        '''
+        super().__init__(('127.0.0.1', port), _Handler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.limited = 0
+        self.connections = set()
+        self._windows = {}
+
+    @property
+    def url(self) -> str:
+        return 'http://127.0.0.1:%d' % self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name='stub-server', daemon=True).start()
+        return self
+
+    def reset(self):
+        with self.lock:
+            self.requests = self.errors = self.limited = 0
+            self.connections = set()
+            self._windows = {}
+
+    def admit(self, path: str) -> bool:
+        if not self.rate_limit:
+            return True
+        rate, per = self.rate_limit
+        now = time.monotonic()
+        with self.lock:
+            window = [t for t in self._windows.get(path, []) if now - t < per]
+            if len(window) >= rate:
+                self._windows[path] = window
+                return False
+            window.append(now)
+            self._windows[path] = window
+            return True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, with Nagle on each answer would wait for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        path = self.path.split('?')[0]
+        with server.lock:
+            server.requests += 1
+            server.connections.add(self.client_address)
+        if server.latency:
+            time.sleep(server.latency)
+        if not server.admit(path):
+            with server.lock:
+                server.limited += 1
+            return self._answer(429, {'errcode': 130101, 'errmsg': 'send too fast'})
+        if server.error_rate and random.random() < server.error_rate:
+            with server.lock:
+                server.errors += 1
+            return self._answer(500, {'errmsg': 'stub error'})
+        self._answer(200, RESPONSES.get(path.strip('/').split('/')[0], {}))
+
+    def _answer(self, status: int, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def parse_rate(text: str) -> tuple:
+    '''
+    '20/60' -> (20, 60.0)
+    '''
+    if not text:
+        return None
+    rate, per = text.split('/')
+    return int(rate), float(per)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the dongdong webhooks')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0, help='seconds before answering')
+    parser.add_argument('--error-rate', type=float, default=0, help='fraction of requests answered with 500')
+    parser.add_argument('--rate-limit', type=parse_rate, default=None, help='messages/seconds accepted per path')
+    args = parser.parse_args()
+    server = StubServer(args.port, args.latency, args.error_rate, args.rate_limit)
+    print('Listening on %s: /bark/<token>, /dingtalk, /wechat, /teams' % server.url)
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -6,22 +6,24 @@
 @Email : Chenglongli@cug.edu.cn
 @Description : 
 '''
-import functools
-import os
-import datetime
-import socket
-import traceback
-import requests
-from .configure import bark_token, DATE_FORMAT
+from .UserConfig import load_config
+from .BaseNotificator import BaseNotificator
 
 
-class BarkNotificator:
-    def __init__(self, token: str = None, taskname: str = None, sound: str = None):
+class BarkNotificator(BaseNotificator):
+    # APNs accepts 4 KB per notification, title and options included
+    MAX_BYTES = 3000
+
+    def __init__(self, token: str = None, taskname: str = None, sound: str = None,
+                 server: str = 'https://api.day.app', profile: str = None, **kwargs):
         '''
         This class will configure the settings for bark notification.
         :param token: the bark token, you can get it from your bark app, https://api.day.app/yourtoken
         :param taskname: this variable is used to group messages, and pushes will be displayed in the notification center grouped by group
         :param sound: ringtone name, you can find them from your bark app
+        :param server: URL of the bark server, change it if you host your own
+        :param profile: section of the config file to read the missing settings from, see setconfigures
+        :param kwargs: delivery options such as async_delivery, see BaseNotificator
 
         You can set self.startmsg，self.completemsg and self.crashmsg to change the push information of the monitor, the format is as follows
         {
@@ -32,9 +34,10 @@ class BarkNotificator:
             'sound': self.sound,
         }
         '''
+        super().__init__(**kwargs)
         if not token:
-            token = bark_token
-        self.url = 'https://api.day.app/' + token
+            token = load_config(profile)['bark_token']
+        self.url = server.rstrip('/') + '/' + token
         self.sound = sound
         self.taskname = taskname
         self.headers = {
@@ -44,87 +47,34 @@ class BarkNotificator:
         self.completemsg = None
         self.crashmsg = None
 
-    def monitor(self):
-        def decorator_sender(func):
-            @functools.wraps(func)
-            def wrapper_sender(*args, **kwargs):
-
-                start_time = datetime.datetime.now()
-                host_name = socket.gethostname()
-
-                if 'RANK' in os.environ:
-                    master_process = (int(os.environ['RANK']) == 0)
-                    host_name += ' - RANK: %s' % os.environ['RANK']
-                else:
-                    master_process = True
-
-                if master_process:
-                    if self.startmsg:
-                        message = self.startmsg
-                    else:
-                        message = {
-                            'title': 'The script starts running 🎬',
-                            'body': f'Machine name: {host_name}\nTask name: {self.taskname}\nStarting date: {start_time.strftime(DATE_FORMAT)}',
-                            'group': self.taskname,
-                            'level': None,
-                            'sound': self.sound,
-                        }
-                    try:
-                        requests.post(url=self.url, headers=self.headers, data=message)
-                    except:
-                        print('Unable to push message, please check network or configuration file')
-                try:
-                    value = func(*args, **kwargs)
+    def _event_payload(self, kind, event):
+        custom = self._custom_message(kind)
+        if custom:
+            message = dict(custom)
+        else:
+            title, contents = self._default_contents(kind, event)
+            message = {
+                'title': title,
+                'body': ''.join(contents),
+                'group': self.taskname,
+                'level': None,
+                'sound': self.sound,
+            }
+            if kind in ('crash', 'interrupt'):
+                message['isArchive'] = '1'
+        if kind == 'complete':
+            message['body'] = message['body'] + self._returned_value_line(event)
+        message['body'] = self._fit(message['body'])
+        return message
 
-                    if master_process:
-                        end_time = datetime.datetime.now()
-                        elapsed_time = end_time - start_time
-                        if self.completemsg:
-                            message = self.completemsg
-                        else:
-                            message = {
-                                'title': 'The script is complete 🎉',
-                                'body': f'Machine name: {host_name}\nTask name: {self.taskname}\nStarting date: {start_time.strftime(DATE_FORMAT)}\nEnd date: {end_time.strftime(DATE_FORMAT)}\nRunning duration: {str(elapsed_time)}',
-                                'group': self.taskname,
-                                'level': None,
-                                'sound': self.sound,
-                            }
-                        try:
-                            str_value = str(value)
-                            message['body'] = message['body'] + f'\nMain call returned value: {str_value}'
-                        except:
-                            message['body'] = message[
-                                                  'body'] + "\nMain call returned value: ERROR - Couldn't str the returned value."
-                        try:
-                            requests.post(url=self.url, headers=self.headers, data=message)
-                        except:
-                            print('Unable to push message, please check network or configuration file')
+    def _text_options(self, text, title=None):
+        return text, {'title': title or self.taskname}
 
-                    return value
+    def _rate_limit_key(self):
+        return self.url
 
-                except Exception as ex:
-                    end_time = datetime.datetime.now()
-                    elapsed_time = end_time - start_time
-                    if self.crashmsg:
-                        message = self.crashmsg
-                    else:
-                        message = {
-                            'title': 'The script has crashed ☠️',
-                            'body': f'Machine name: {host_name}\nTask name: {self.taskname}\nStarting date: {start_time.strftime(DATE_FORMAT)}\nCrash date: {end_time.strftime(DATE_FORMAT)}\nCrashed running duration: {str(elapsed_time)}\n\nHere is the error:\n\n{ex}\n\n{traceback.format_exc()}',
-                            'group': self.taskname,
-                            'isArchive': '1',
-                            'level': None,
-                            'sound': self.sound,
-                        }
-                    try:
-                        requests.post(url=self.url, headers=self.headers, data=message)
-                    except:
-                        print('Unable to push message, please check network or configuration file')
-                    raise ex
-
-            return wrapper_sender
-
-        return decorator_sender
+    def _request(self, payload):
+        return self.url, {'headers': self.headers, 'data': payload}
 
     def push(self, body: str, title: str = None, level: str = 'passive', isArchive=0):
         '''
@@ -137,7 +87,10 @@ class BarkNotificator:
         '''
         if not title:
             title = self.taskname
-        message = {
+        self._submit(body, title=title, level=level, isArchive=isArchive)
+
+    def _payload(self, body, title=None, level='passive', isArchive=0):
+        return {
             'title': title,
             'body': body,
             'group': self.taskname,
@@ -145,7 +98,3 @@ class BarkNotificator:
             'level': level,
             'sound': self.sound,
         }
-        try:
-            requests.post(url=self.url, headers=self.headers, data=message)
-        except:
-            print('Unable to push message, please check network or configuration file')
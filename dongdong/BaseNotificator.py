@@ -0,0 +1,675 @@
+'''
+@Project : dongdong
+@File : BaseNotificator.py
+@Description : Delivery logic shared by every notificator
+'''
+import time
+import functools
+import threading
+from .BoundedRepr import render_value, format_traceback, truncate, MAX_TRACEBACK_BYTES
+from .Coalescer import Coalescer
+from .DeliveryQueue import DeliveryQueue, register_flush
+from .DeliveryStats import BackendStats, get_stats, watch_queue, backend_name
+from .Event import Event, EventFormatter
+from .HttpTransport import get_transport
+from .ResourceSampler import ResourceSampler
+from .MetricsHistory import MetricsHistory
+from .ProgressTracker import ProgressTracker
+from .Watchdog import Watchdog, heartbeat
+from .RateLimiter import get_limiter, NORMAL, HIGH
+from .Relay import find_relay
+from .ShutdownHandlers import stopping, describe, mark_reported, within_deadline
+
+# Returned by _deliver when the message is only handed over, the backend counts it once it is shown or has failed
+DEFERRED = object()
+
+
+class BaseNotificator:
+    # (messages, seconds) accepted by the backend for one webhook, None if it has no documented limit
+    RATE_LIMIT = None
+    # Bytes of text the backend accepts in one message, longer texts lose their middle, None if it has no limit
+    MAX_BYTES = None
+    # Whether the deliveries appear in dongdong.stats(), not for notificators only forwarding to others
+    COUNTED = True
+
+    def __init__(self, async_delivery: bool = False, queue_size: int = 1000, overflow: str = 'drop-oldest',
+                 timeout=None, coalesce_window: float = None, coalesce_max_messages: int = None,
+                 coalesce_max_bytes: int = None, rate_limit=None, rate_limit_wait: float = None, outbox=None,
+                 outbox_retry: float = 60, relay=None, metrics_interval: float = None):
+        '''
+        This class holds the logic shared by every notificator,
+        subclasses implement _payload and _deliver, and _event_payload if their monitor messages are not a string list.
+        :param async_delivery: if True, push() and monitor() only put the message into an in-memory queue,
+            a background thread sends it, so the caller never waits for the network.
+            Pending messages are flushed when the process exits, you can also call flush() yourself.
+        :param queue_size: maximum number of pending messages when async_delivery is True
+        :param overflow: what to do with push() when the queue is full, one of
+            'drop-oldest' (default), 'block' and 'drop-new'.
+            The start, complete and crash messages of monitor() are never dropped.
+        :param timeout: seconds, or a (connect, read) tuple, to wait for the backend before giving up,
+            defaults to the timeouts of the shared transport, see configure_transport
+        :param coalesce_window: if set, push() messages arriving within this many seconds are merged into one
+            message, each line stamped with its time. A monitor() message sends the pending batch first.
+        :param coalesce_max_messages: send the merged message as soon as it holds this many pushes
+        :param coalesce_max_bytes: send the merged message before it grows beyond this many bytes
+        :param rate_limit: (messages, seconds) allowed for this webhook, shared by every notificator
+            of the process posting to it. Defaults to the documented limit of the backend, False disables it.
+            Messages are delayed to stay under the limit, the monitor() messages go first.
+        :param rate_limit_wait: seconds a push() message may wait for the rate limit before it is dropped,
+            None waits as long as needed
+        :param outbox: if True, messages that could not be sent are stored in ~/.cache/dongdong/outbox.sqlite
+            and replayed in order by a background thread once the backend can be reached again, or by the next
+            process using the same webhook. You can also pass the path of the file, or an Outbox.
+        :param outbox_retry: seconds between two replay attempts while the backend cannot be reached
+        :param relay: socket of a `dongdong relay` daemon, defaults to $DONGDONG_RELAY or the socket in
+            $XDG_RUNTIME_DIR, True also uses the socket in the temp directory when neither is set.
+            When a relay listens there, messages are handed to it in a few microseconds, and it sends the messages
+            of every process of the host with shared connections, rate limits and retries.
+            Messages are sent directly when no relay is running, or when the socket does not belong to this user.
+            False always sends directly.
+            Notificators with an outbox always send directly, so that failed messages are stored.
+        :param metrics_interval: seconds between two messages summarizing the metrics given to log_metrics(),
+            None only adds the summaries to the complete and crash messages of monitor()
+        '''
+        self.timeout = timeout
+        backend = backend_name(type(self))
+        self._stats = get_stats(backend) if self.COUNTED else BackendStats(backend)
+        self.rate_limit = self.RATE_LIMIT if rate_limit is None else rate_limit
+        self.rate_limit_wait = rate_limit_wait
+        self._limiter = None
+        self._queue = None
+        if async_delivery:
+            self._queue = DeliveryQueue(self._deliver_item, maxsize=queue_size, overflow=overflow,
+                                        on_drop=functools.partial(self._stats.count, 'dropped'))
+            watch_queue(self._stats.backend, self._queue)
+        self._coalescer = None
+        if coalesce_window:
+            self._coalescer = Coalescer(self._emit_digest, window=coalesce_window, max_messages=coalesce_max_messages,
+                                        max_bytes=coalesce_max_bytes or self.MAX_BYTES)
+        if self._queue is not None or self._coalescer is not None:
+            register_flush(self)
+        self._outbox = None
+        if outbox:
+            # sqlite3 is only imported by the notificators with an outbox
+            from .Outbox import Outbox, get_outbox
+            self._outbox = outbox if isinstance(outbox, Outbox) else get_outbox(None if outbox is True else outbox)
+        self.outbox_retry = outbox_retry
+        self._outbox_checked = False
+        self._draining = False
+        self._drain_lock = threading.Lock()
+        self._formatter = None
+        self._relay = find_relay(relay)
+        # The metrics logged outside monitored functions, each monitored call has its own history
+        self.metrics = MetricsHistory()
+        self.metrics_interval = metrics_interval
+
+    def monitor(self, distributed: bool = False, rendezvous_dir: str = None, rendezvous_timeout: float = 120,
+                rendezvous_fallback: float = 10, telemetry: bool = False, telemetry_interval: float = 5,
+                watchdog: float = None, watchdog_backoff: float = 2, repeat_window: float = None):
+        '''
+        Decorator pushing a message when the function starts running, completes or crashes.
+        Coroutine functions are awaited, their messages are sent from a worker thread so the event loop never waits.
+        :param distributed: for jobs launched with RANK and WORLD_SIZE set (torchrun, ...), every rank reports
+            its outcome to rank 0, which sends a single summary listing the ranks that failed and why,
+            instead of every rank sending its own crash message.
+        :param rendezvous_dir: directory where the ranks report, it must be shared by every rank,
+            defaults to $DONGDONG_RENDEZVOUS_DIR or a directory named after the job in the temp directory,
+            which only works when all ranks run on one machine
+        :param rendezvous_timeout: seconds rank 0 waits for the other ranks once it is done,
+            ranks that have not reported by then are listed as such
+        :param rendezvous_fallback: seconds a failed rank waits for rank 0 to read its report, before it sends its
+            own crash message. Rank 0 only reads the reports once it is done, it may be stuck in a collective
+            operation, or killed by the launcher once a rank fails.
+        :param telemetry: sample CPU time, memory, threads, I/O and load average of the process in a background
+            thread while the function runs, and add a summary to the complete and crash messages.
+            The sampler reads /proc, it samples less often if it uses more than 0.1% of one core.
+        :param telemetry_interval: seconds between two samples
+        :param watchdog: seconds without a call to heartbeat() after which the job is considered stuck,
+            a message with the stacks of all threads is pushed, and again later while it stays stuck.
+            Call heartbeat() in your training loop when you set it, e.g. once per batch.
+        :param watchdog_backoff: factor applied to the delay between two messages about the same stall
+        :param repeat_window: seconds after a crash is reported during which the same crash is not reported again,
+            e.g. when a supervisor restarts a crash-looping job. Crashes are identified by the type of the exception
+            and the code it went through, recorded in ~/.cache/dongdong/crashes.sqlite so restarts know them.
+            The next report of the crash tells how many times it was seen meanwhile. Not used with distributed.
+        '''
+
+        def decorator_sender(func):
+            # asyncio is only imported for coroutine functions, it is slow to import
+            from inspect import iscoroutinefunction
+            if iscoroutinefunction(func):
+                import asyncio
+
+                @functools.wraps(func)
+                async def async_wrapper_sender(*args, **kwargs):
+                    loop = asyncio.get_running_loop()
+                    event = self._start_event(distributed, rendezvous_dir, telemetry and telemetry_interval,
+                                              watchdog, watchdog_backoff, repeat_window)
+                    try:
+                        if event.master_process:
+                            await loop.run_in_executor(None, self._notify, 'start', event)
+                        value = await func(*args, **kwargs)
+                    except Exception as ex:
+                        # The traceback has to be formatted here, exception info does not cross threads
+                        self._end_event(event, error=ex)
+                        await loop.run_in_executor(None, self._finish, 'crash', event, rendezvous_timeout,
+                                                   rendezvous_fallback)
+                        mark_reported(ex)
+                        raise
+                    except BaseException as ex:
+                        if stopping(ex):
+                            # The loop is shutting down, the message is sent without it
+                            self._interrupted(event, ex)
+                        raise
+                    finally:
+                        self._stop_event(event)
+                    self._end_event(event, value=value)
+                    await loop.run_in_executor(None, self._finish, 'complete', event, rendezvous_timeout,
+                                               rendezvous_fallback)
+                    return value
+
+                return async_wrapper_sender
+
+            @functools.wraps(func)
+            def wrapper_sender(*args, **kwargs):
+                event = self._start_event(distributed, rendezvous_dir, telemetry and telemetry_interval,
+                                          watchdog, watchdog_backoff, repeat_window)
+                try:
+                    if event.master_process:
+                        self._notify('start', event)
+                    value = func(*args, **kwargs)
+                except Exception as ex:
+                    self._finish('crash', self._end_event(event, error=ex), rendezvous_timeout, rendezvous_fallback)
+                    mark_reported(ex)
+                    raise
+                except BaseException as ex:
+                    # Only a stop by a signal handled by install_shutdown is reported, not sys.exit() or a
+                    # cancelled task, but the event is ended in any case
+                    if stopping(ex):
+                        self._interrupted(event, ex)
+                    raise
+                finally:
+                    self._stop_event(event)
+                self._finish('complete', self._end_event(event, value=value), rendezvous_timeout,
+                             rendezvous_fallback)
+                return value
+
+            return wrapper_sender
+
+        return decorator_sender
+
+    async def apush(self, *args, **kwargs):
+        '''
+        Same as push(), but the message is sent from a worker thread so the event loop is never blocked.
+        '''
+        import asyncio
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, functools.partial(self.push, *args, **kwargs))
+
+    def _start_event(self, distributed: bool = False, rendezvous_dir: str = None, telemetry_interval: float = None,
+                     watchdog: float = None, watchdog_backoff: float = 2, repeat_window: float = None) -> Event:
+        event = Event()
+        event.begin()
+        event.repeat_window = repeat_window
+        if distributed:
+            from .Rendezvous import FileRendezvous, rank_info, default_rendezvous_dir
+            event.ranks = rank_info()
+            event.rendezvous = FileRendezvous(rendezvous_dir or default_rendezvous_dir(),
+                                              event.ranks['rank'], event.ranks['world_size'])
+        if telemetry_interval:
+            try:
+                event.sampler = ResourceSampler(telemetry_interval).start()
+            except:
+                print('Unable to sample the resources of this process')
+        if watchdog:
+            event.watchdog = Watchdog(functools.partial(self._stall_alert, event), watchdog, watchdog_backoff,
+                                      resume=functools.partial(self._stall_resumed, event)).start()
+        return event
+
+    @staticmethod
+    def _stop_event(event: Event):
+        '''
+        End event and stop its watchdog and resource sampler, whichever way the monitored function exits.
+        Only the first call does something.
+        '''
+        if event.end_time is not None:
+            return
+        event.end()
+        if event.watchdog is not None:
+            event.watchdog.stop()
+        if event.sampler is not None:
+            event.sampler.stop()
+            event.resources = event.sampler.summary_lines()
+
+    @classmethod
+    def _end_event(cls, event: Event, value=None, error: BaseException = None) -> Event:
+        cls._stop_event(event)
+        # Rendered once and bounded, whatever the function returned, the cost of the message stays the same
+        if error is None:
+            event.value = value
+            event.value_text = render_value(value)
+        else:
+            event.error = error
+            event.traceback = format_traceback(error)
+        return event
+
+    def _interrupted(self, event: Event, error: BaseException):
+        '''
+        Push the interrupt message of a monitored function stopped by a signal, see install_shutdown.
+        Only rank 0 reports it, the ranks are all stopped at once and do not wait for each other.
+        '''
+        self._end_event(event, error=error)
+        event.error = describe(error)
+        if event.master_process:
+            within_deadline(self._notify, 'interrupt', event)
+        mark_reported(error)
+
+    @staticmethod
+    def _check_repeat(event: Event):
+        '''
+        Record the crash of event in the crash cache, and mark it suppressed if it was reported recently.
+        '''
+        from .CrashCache import get_crash_cache, fingerprint
+        try:
+            report, repeats, since = get_crash_cache().record(fingerprint(event.error), event.repeat_window)
+        except:
+            print('Unable to read the crash cache, the crash is reported')
+            return
+        event.suppressed = not report
+        if report and repeats:
+            event.repeats = (repeats, since)
+
+    def _stall_alert(self, event: Event, stalled: float, stacks: str):
+        title, lines = self._get_formatter().stall_contents(event, stalled)
+        lines.append('\nThread stacks:\n\n' + truncate(stacks, MAX_TRACEBACK_BYTES))
+        self._push_text(''.join(lines), title=title, important=True)
+
+    def _stall_resumed(self, event: Event, stalled: float):
+        title, lines = self._get_formatter().stall_contents(event, stalled, resumed=True)
+        self._push_text(''.join(lines), title=title, important=True)
+
+    def track(self, iterable, total: int = None, every=None, desc: str = None) -> ProgressTracker:
+        '''
+        Wrap a loop to push its progress, throughput and ETA now and then, e.g. for batch in bark.track(loader).
+        The complete and crash messages of the monitored function running it, in the same thread or asyncio task,
+        include the measured throughput.
+        :param iterable: the DataLoader, range, ... to iterate over
+        :param total: number of items, defaults to len(iterable) if it has one
+        :param every: seconds between two progress messages, or a string such as '10%'.
+            Defaults to every 10% if the total is known, every 10 minutes otherwise.
+        :param desc: name of the loop, shown in the messages
+        '''
+        tracker = ProgressTracker(iterable, self._report_progress, total=total, every=every, desc=desc)
+        event = Event.current()
+        if event is not None:
+            event.trackers.append(tracker)
+        return tracker
+
+    def _report_progress(self, tracker: ProgressTracker):
+        self._push_text(tracker.progress_line(), title=tracker.desc or 'Progress')
+
+    def sweep(self, name: str = None, interval: float = 600, rank_by=None, goal: str = None, total: int = None,
+              top: int = 10, directory: str = None):
+        '''
+        Decorator for the trial function of a hyperparameter sweep, pushing a digest of all trials every interval
+        seconds and a summary ranking them at the end, instead of messages for every trial, see SweepMonitor.
+        Trials can run in threads or in a process pool, e.g.
+        @bark.sweep(rank_by='val_loss', total=500)
+        def trial(lr, wd): ... return {'val_loss': ...}
+        '''
+        from .SweepMonitor import SweepMonitor
+        return SweepMonitor(self, name, interval=interval, rank_by=rank_by, goal=goal, total=total, top=top,
+                            directory=directory)
+
+    def log_metrics(self, step: int, **scalars):
+        '''
+        Record metrics, e.g. log_metrics(epoch, loss=0.31, val_acc=0.87). Only a summary is pushed:
+        last value, best value and its step, min, max and a sparkline of each metric, in the complete and crash
+        messages of the monitored function running in the same thread or asyncio task, and every metrics_interval
+        seconds if it is set. Concurrent monitored calls each keep their own history.
+        Whether lower or higher is best is guessed from the name (loss, error, ... are minimized),
+        set self.metrics.goals[name] = 'min' or 'max' before the first call to choose.
+        :param step: epoch, iteration, ...
+        :param scalars: metric names and values, Python or NumPy numbers, or 0-d tensors
+        '''
+        history = self._current_metrics()
+        history.log(step, scalars)
+        if self.metrics_interval:
+            now = time.monotonic()
+            if history.pushed is None:
+                history.pushed = now
+            elif now - history.pushed >= self.metrics_interval:
+                history.pushed = now
+                self._push_metrics(history)
+
+    def _current_metrics(self) -> MetricsHistory:
+        '''
+        The metrics of the monitored call running in this thread or asyncio task, self.metrics outside one.
+        '''
+        event = Event.current()
+        if event is None:
+            return self.metrics
+        history = event.metrics.get(self)
+        if history is None:
+            history = event.metrics[self] = MetricsHistory(self.metrics.capacity)
+            # The goals chosen on self.metrics apply to every call
+            history.goals = self.metrics.goals
+        return history
+
+    def push_metrics(self):
+        '''
+        Push the summary of the metrics given to log_metrics() now, those of the monitored call running
+        in this thread or asyncio task if there is one.
+        '''
+        self._push_metrics(self._current_metrics())
+
+    def _push_metrics(self, history: MetricsHistory):
+        lines = history.summary_lines()
+        if lines:
+            self._push_text(''.join(lines).rstrip('\n'), title='Metrics')
+
+    def stats(self) -> dict:
+        '''
+        Delivery statistics of the backend of this notificator, shared by all its notificators in the process,
+        see dongdong.stats.
+        '''
+        return self._stats.snapshot()
+
+    def heartbeat(self):
+        '''
+        Tell the watchdog of monitor(watchdog=...) that the job is making progress, see dongdong.heartbeat.
+        '''
+        heartbeat()
+
+    def _finish(self, kind: str, event: Event, rendezvous_timeout: float = 120, rendezvous_fallback: float = 10):
+        '''
+        Send the complete or crash message, in distributed mode only rank 0 sends a summary of all ranks,
+        and the failed ranks whose report it does not read within rendezvous_fallback seconds.
+        '''
+        rendezvous = event.rendezvous
+        if rendezvous is None:
+            # Here rather than in _end_event, the crash cache is an SQLite file and this runs off the event loop
+            if kind == 'crash' and event.repeat_window and isinstance(event.error, Exception):
+                self._check_repeat(event)
+            if kind == 'crash' and event.suppressed:
+                print('The same crash was reported less than %s seconds ago, it is not reported again'
+                      % event.repeat_window)
+            elif kind == 'crash' or event.master_process:
+                self._notify(kind, event)
+            return
+        ranks = event.ranks
+        outcome = {
+            'rank': ranks['rank'],
+            'local_rank': ranks['local_rank'],
+            'host': event.host,
+            'status': kind,
+            'end': event.end_time.timestamp(),
+            'error': '%s: %s' % (type(event.error).__name__, event.error) if kind == 'crash' else None,
+            'traceback': event.traceback,
+        }
+        try:
+            rendezvous.report(outcome)
+        except:
+            print('Unable to report to the rendezvous directory %s' % rendezvous.directory)
+            self._notify(kind, event)
+            return
+        if not event.master_process:
+            if kind == 'crash' and not rendezvous.wait_collected(rendezvous_fallback):
+                self._notify(kind, event)
+            return
+        from .Rendezvous import summarize
+        outcomes = rendezvous.collect(rendezvous_timeout, since=event.start_time.timestamp())
+        event.rank_summary, first_failure = summarize(outcomes, ranks['world_size'])
+        if first_failure is not None and first_failure['rank'] != ranks['rank']:
+            kind = 'crash'
+            event.error = 'Rank %d: %s' % (first_failure['rank'], first_failure['error'])
+            event.traceback = first_failure['traceback']
+        elif first_failure is not None:
+            kind = 'crash'
+        self._notify(kind, event)
+        rendezvous.cleanup()
+
+    def _notify(self, kind: str, event: Event):
+        '''
+        Send the start, complete, crash or interrupt message of monitor().
+        '''
+        try:
+            payload = self._event_payload(kind, event)
+        except:
+            print('Unable to build the %s message' % kind)
+            return
+        self._send(payload, important=True)
+
+    def _custom_message(self, kind: str):
+        '''
+        self.startmsg, self.completemsg or self.crashmsg
+        '''
+        return getattr(self, kind + 'msg', None)
+
+    def _default_contents(self, kind: str, event: Event):
+        '''
+        The title and the lines of the default monitor() messages.
+        '''
+        return self._get_formatter().contents(kind, event)
+
+    def _get_formatter(self) -> EventFormatter:
+        taskname = getattr(self, 'taskname', None)
+        # Rebuilt only when the task name is changed after the notificator was created
+        if self._formatter is None or self._formatter.taskname != taskname:
+            self._formatter = EventFormatter(taskname)
+        return self._formatter
+
+    @staticmethod
+    def _returned_value_line(event: Event) -> str:
+        if event.command is not None:
+            return '\nExit code: %s' % event.value_text + ('\n\n' + event.output if event.output else '')
+        return '\nMain call returned value: %s' % event.value_text
+
+    def _event_contents(self, kind: str, event: Event) -> list:
+        custom = self._custom_message(kind)
+        if custom:
+            contents = list(custom)
+        else:
+            title, contents = self._default_contents(kind, event)
+            contents.insert(0, title + '\n')
+        if kind == 'complete':
+            contents.append(self._returned_value_line(event))
+        return contents
+
+    def _event_payload(self, kind: str, event: Event):
+        '''
+        Build the payload of a monitor() message, kind is 'start', 'complete', 'crash' or 'interrupt'.
+        Backends only implement _payload, unless their monitor messages are not built from a string list.
+        '''
+        return self._payload(self._fit('\n'.join(self._event_contents(kind, event))))
+
+    def _deliver(self, payload):
+        '''
+        Send one message, this is the only method that talks to the backend.
+        HTTP backends only implement _request, the others override this method. It returns DEFERRED if it only
+        hands the message over, and counts the delivery itself once it is confirmed.
+        '''
+        url, options = self._request(payload)
+        self._post(url, **options)
+
+    def _request(self, payload):
+        '''
+        The URL and the arguments (data, json, headers) of the POST sending payload, None if the backend is not HTTP.
+        '''
+        return None
+
+    def _payload(self, text: str, **options):
+        '''
+        Build the payload of a push() message from its text, options are the backend specific arguments of push().
+        '''
+        raise NotImplementedError
+
+    def _fit(self, text: str) -> str:
+        '''
+        Truncate text to MAX_BYTES, keeping its beginning and most of its end.
+        '''
+        return truncate(text, self.MAX_BYTES)
+
+    def _rate_limit_key(self) -> str:
+        '''
+        The endpoint the rate limit applies to, e.g. the webhook URL.
+        '''
+        return None
+
+    def _post(self, url: str, data=None, json=None, headers: dict = None):
+        '''
+        POST through the keep-alive transport shared by every notificator.
+        '''
+        return get_transport().post(url, data=data, json=json, headers=headers, timeout=self.timeout)
+
+    def _get_limiter(self):
+        if self._limiter is None and self.rate_limit and self._rate_limit_key():
+            self._limiter = get_limiter(self._rate_limit_key(), *self.rate_limit)
+        return self._limiter
+
+    def _relay_submit(self, payload, important: bool = False) -> bool:
+        '''
+        Hand the message to the relay of the host, False if it has to be sent directly.
+        '''
+        request = self._request(payload)
+        if request is None:
+            return False
+        url, options = request
+        return self._relay.submit(dict(options, url=url, key=self._rate_limit_key(), important=important,
+                                       rate_limit=self.rate_limit or None, timeout=self.timeout,
+                                       backend=self._stats.backend))
+
+    def _deliver_safely(self, payload, important: bool = False):
+        if self._relay is not None and self._outbox is None and self._relay_submit(payload, important):
+            self._stats.count('relayed')
+            return
+        limiter = self._get_limiter()
+        if limiter is not None:
+            if important:
+                limiter.acquire(HIGH)
+            elif not limiter.acquire(NORMAL, timeout=self.rate_limit_wait):
+                self._stats.count('dropped')
+                print('Rate limit reached, the message was dropped')
+                return
+        start = time.perf_counter()
+        try:
+            result = self._deliver(payload)
+        except:
+            self._stats.count('failed')
+            if self._outbox is None:
+                print('Unable to push message, please check network or configuration file')
+                return
+            print('Unable to push message, it is kept in the outbox and will be sent later')
+            self._store(payload, important)
+            self._replay_outbox()
+        else:
+            if result is not DEFERRED:
+                self._stats.observe(time.perf_counter() - start)
+            # The messages left by a previous process are replayed once the backend is reachable
+            if self._outbox is not None and not self._outbox_checked:
+                self._outbox_checked = True
+                self._replay_outbox()
+
+    def _outbox_key(self):
+        return type(self).__name__, self._rate_limit_key() or ''
+
+    def _store(self, payload, important: bool = False):
+        try:
+            self._outbox.add(*self._outbox_key(), payload, important)
+        except:
+            print('Unable to store the message in the outbox %s' % self._outbox.path)
+
+    def _replay_outbox(self):
+        with self._drain_lock:
+            if self._draining:
+                return
+            self._draining = True
+        threading.Thread(target=self._drain_outbox, name='dongdong-outbox', daemon=True).start()
+
+    def _drain_outbox(self):
+        '''
+        Send the stored messages oldest first, waiting outbox_retry seconds whenever the backend fails again.
+        '''
+        try:
+            while True:
+                messages = self._outbox.claim(*self._outbox_key())
+                if not messages:
+                    return
+                for index, (id_, payload, important) in enumerate(messages):
+                    limiter = self._get_limiter()
+                    if limiter is not None:
+                        limiter.acquire(HIGH if important else NORMAL)
+                    self._stats.count('retried')
+                    start = time.perf_counter()
+                    try:
+                        result = self._deliver(payload)
+                    except:
+                        self._outbox.release([message[0] for message in messages[index:]])
+                        time.sleep(self.outbox_retry)
+                        break
+                    if result is not DEFERRED:
+                        self._stats.observe(time.perf_counter() - start)
+                    self._outbox.remove(id_)
+        except:
+            print('Unable to replay the outbox %s' % self._outbox.path)
+        finally:
+            self._draining = False
+
+    def _deliver_item(self, item):
+        self._deliver_safely(*item)
+
+    def _send(self, payload, important: bool = False):
+        '''
+        Send the payload now, or enqueue it in asynchronous mode.
+        :param payload: a snapshot of the message, it must not be modified afterwards
+        :param important: the message comes from monitor(), it is sent before push() messages and never dropped
+        '''
+        if important and self._coalescer is not None:
+            self._coalescer.flush()
+        if self._queue is None:
+            self._deliver_safely(payload, important)
+        else:
+            self._queue.put((payload, important), urgent=important)
+
+    def _submit(self, text: str, **options):
+        '''
+        Send a push() message, or add it to the pending batch in coalescing mode.
+        '''
+        if self._coalescer is None:
+            self._send(self._payload(self._fit(text), **options))
+        else:
+            self._coalescer.add(text, options)
+
+    def _push_text(self, text: str, title: str = None, important: bool = False):
+        '''
+        push() with the same arguments for every backend, used by the helpers built on top of notificators.
+        :param important: send it like a monitor() message, before pending pushes and never dropped
+        '''
+        text, options = self._text_options(text, title)
+        if important:
+            self._send(self._payload(self._fit(text), **options), important=True)
+        else:
+            self._submit(text, **options)
+
+    def _text_options(self, text: str, title: str = None):
+        '''
+        Turn a text and a title into the arguments of _payload, backends without titles put it on the first line.
+        '''
+        if title:
+            text = title + '\n' + text
+        return text, {}
+
+    def _emit_digest(self, text, options):
+        self._send(self._payload(self._fit(text), **options))
+
+    def flush(self, timeout: float = None) -> bool:
+        '''
+        Wait until every pending message has been sent.
+        :param timeout: seconds to wait at most, None waits forever
+        :return: True if nothing is left to send
+        '''
+        if self._coalescer is not None:
+            self._coalescer.flush()
+        if self._queue is None:
+            return True
+        return self._queue.flush(timeout)
@@ -0,0 +1,218 @@
+'''
+@Project : dongdong
+@File : BoundedRepr.py
+@Description : Size-bounded rendering of returned values, tracebacks and message texts
+'''
+import time
+import reprlib
+from itertools import islice
+from collections.abc import Mapping, Sequence, Set
+
+# Seconds the repr of a returned value may take before the remaining items are replaced with ...
+RENDER_TIME_BUDGET = 0.05
+MAX_VALUE_CHARS = 2000
+MAX_TRACEBACK_BYTES = 64 * 1024
+# Frames repeated at least this many times in a row are shown once, longest cycle looked for
+MIN_REPEATS = 3
+MAX_CYCLE = 8
+TRUNCATED = '\n[... %d characters truncated ...]\n'
+
+
+def _container_kind(x) -> str:
+    '''
+    'mapping', 'sequence', 'set' or 'namedtuple' for the containers reprlib has no method for, else None.
+    '''
+    if isinstance(x, Mapping):
+        return 'mapping'
+    if isinstance(x, tuple) and hasattr(x, '_fields'):
+        return 'namedtuple'
+    if isinstance(x, Sequence) and not isinstance(x, (str, bytes, bytearray, memoryview, range)):
+        return 'sequence'
+    if isinstance(x, Set):
+        return 'set'
+    return None
+
+
+def _array_summary(x) -> str:
+    '''
+    numpy arrays, tensors and data frames are shown by their shape, their repr can be huge and slow.
+    '''
+    if hasattr(type(x), 'shape') and hasattr(x, 'dtype'):
+        try:
+            return '%s(shape=%s, dtype=%s)' % (type(x).__name__, tuple(x.shape), x.dtype)
+        except:
+            return None
+    return None
+
+
+class BoundedRepr(reprlib.Repr):
+    def __init__(self, time_budget: float = RENDER_TIME_BUDGET):
+        '''
+        reprlib.Repr with larger limits, arrays summarized by their shape and a time budget for the whole repr.
+        :param time_budget: seconds after which the items not rendered yet are replaced with ...
+        '''
+        super().__init__()
+        self.maxlevel = 4
+        self.maxtuple = self.maxlist = self.maxarray = self.maxdeque = self.maxset = self.maxfrozenset = 50
+        self.maxdict = 30
+        self.maxstring = 200
+        self.maxlong = 100
+        self.maxother = 200
+        self.time_budget = time_budget
+        self._deadline = None
+
+    def repr(self, x):
+        self._deadline = time.perf_counter() + self.time_budget
+        return super().repr(x)
+
+    def render(self, x) -> str:
+        '''
+        Like repr(), but objects that are neither containers nor arrays are shown with str().
+        '''
+        self._deadline = time.perf_counter() + self.time_budget
+        if _array_summary(x) or hasattr(self, 'repr_' + type(x).__name__) or _container_kind(x):
+            return self.repr1(x, self.maxlevel)
+        return str(x)
+
+    def repr1(self, x, level):
+        if time.perf_counter() > self._deadline:
+            return '...'
+        summary = _array_summary(x)
+        if summary:
+            return summary
+        if not hasattr(self, 'repr_' + type(x).__name__):
+            kind = _container_kind(x)
+            if kind:
+                return self._repr_container(x, level, kind)
+        return super().repr1(x, level)
+
+    def _repr_container(self, x, level, kind: str) -> str:
+        '''
+        Subclasses and other implementations of the builtin containers, e.g. the OrderedDict of a state_dict(),
+        reprlib would call their own repr, which renders every item.
+        '''
+        name = type(x).__name__
+        if kind == 'mapping':
+            return '%s(%s)' % (name, self.repr_dict(x, level))
+        if kind == 'set':
+            return '%s(%s)' % (name, self._repr_iterable(x, level, '{', '}', self.maxset))
+        if kind == 'namedtuple':
+            if level <= 0:
+                return '%s(...)' % name
+            pieces = ['%s=%s' % (field, self.repr1(value, level - 1))
+                      for field, value in islice(zip(x._fields, x), self.maxtuple)]
+            if len(x) > self.maxtuple:
+                pieces.append('...')
+            return '%s(%s)' % (name, ', '.join(pieces))
+        return '%s(%s)' % (name, self._repr_iterable(x, level, '[', ']', self.maxlist))
+
+    # reprlib sorts dicts and sets before cutting them, which takes long on big ones, str() does not sort either
+    def repr_dict(self, x, level):
+        if not x:
+            return '{}'
+        if level <= 0:
+            return '{...}'
+        pieces = ['%s: %s' % (self.repr1(key, level - 1), self.repr1(x[key], level - 1))
+                  for key in islice(x, self.maxdict)]
+        if len(x) > self.maxdict:
+            pieces.append('...')
+        return '{%s}' % ', '.join(pieces)
+
+    def repr_set(self, x, level):
+        if not x:
+            return 'set()'
+        return self._repr_iterable(x, level, '{', '}', self.maxset)
+
+    def repr_frozenset(self, x, level):
+        if not x:
+            return 'frozenset()'
+        return self._repr_iterable(x, level, 'frozenset({', '})', self.maxfrozenset)
+
+
+def render_value(value, limit: int = MAX_VALUE_CHARS) -> str:
+    '''
+    str(value), in bounded time and size: containers are rendered with BoundedRepr, arrays by their shape.
+    '''
+    try:
+        if isinstance(value, str):
+            text = value
+        else:
+            text = BoundedRepr().render(value)
+        return truncate(text, limit)
+    except:
+        return "ERROR - Couldn't str the returned value."
+
+
+class _CollapsedStack(list):
+    '''
+    The frames of a traceback where repeated cycles of frames are kept once, with a note of how often they repeat.
+    '''
+
+    def __init__(self, frames: list):
+        super().__init__()
+        self.repeats = {}
+        keys = [(frame.filename, frame.lineno, frame.name) for frame in frames]
+        i = 0
+        while i < len(frames):
+            for period in range(1, MAX_CYCLE + 1):
+                block = keys[i:i + period]
+                count = 1
+                while keys[i + count * period:i + (count + 1) * period] == block:
+                    count += 1
+                if len(block) == period and count >= MIN_REPEATS:
+                    self.extend(frames[i:i + period])
+                    self.repeats[len(self) - 1] = (period, count - 1)
+                    i += count * period
+                    break
+            else:
+                self.append(frames[i])
+                i += 1
+
+    def format(self, **kwargs) -> list:
+        import traceback
+        lines = []
+        for index, frame in enumerate(self):
+            lines.extend(traceback.StackSummary.from_list([frame]).format(**kwargs))
+            if index in self.repeats:
+                period, times = self.repeats[index]
+                what = 'line' if period == 1 else '%d frames' % period
+                lines.append('  [Previous %s repeated %d more times]\n' % (what, times))
+        return lines
+
+
+def format_traceback(error: BaseException, limit: int = MAX_TRACEBACK_BYTES) -> str:
+    '''
+    The traceback of error, with recursions collapsed and the middle cut if it is longer than limit bytes.
+    '''
+    import traceback
+    exception = traceback.TracebackException(type(error), error, error.__traceback__)
+    seen = set()
+    current = exception
+    while current is not None and id(current) not in seen:
+        seen.add(id(current))
+        current.stack = _CollapsedStack(current.stack)
+        current = current.__cause__ or (None if current.__suppress_context__ else current.__context__)
+    return truncate(''.join(exception.format()), limit)
+
+
+def truncate(text: str, limit: int, head: float = 1 / 3) -> str:
+    '''
+    Cut the middle of text so that it fits in limit bytes of UTF-8,
+    most of the room goes to the end, where a traceback has the error.
+    :param limit: bytes, None does not truncate
+    :param head: fraction of the room kept for the beginning
+    '''
+    # A character is at most 4 bytes in UTF-8, short texts are not encoded at all
+    if limit is None or len(text) * 4 <= limit:
+        return text
+    if len(text) <= limit and len(text.encode('utf-8')) <= limit:
+        return text
+    room = min(max(limit - len(TRUNCATED % len(text)), 0), len(text) - 1)
+    while True:
+        first = int(room * head)
+        last = room - first
+        result = text[:first] + TRUNCATED % (len(text) - first - last) + text[len(text) - last:]
+        size = len(result.encode('utf-8'))
+        if size <= limit or room == 0:
+            return result
+        room = max(min(room - 1, int(room * limit / size)), 0)
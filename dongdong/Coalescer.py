@@ -0,0 +1,82 @@
+'''
+@Project : dongdong
+@File : Coalescer.py
+@Description : Merge the messages pushed within a time window into one digest
+'''
+import datetime
+import threading
+
+TIME_FORMAT = '%H:%M:%S'
+
+
+class Coalescer:
+    def __init__(self, emit, window: float = 60, max_messages: int = None, max_bytes: int = None):
+        '''
+        Messages added within `window` seconds of the first pending one are merged and handed to emit once.
+        :param emit: callable emit(text, options) receiving the merged text and the options of the batch
+        :param window: seconds to wait for more messages before emitting the batch
+        :param max_messages: emit the batch as soon as it holds this many messages
+        :param max_bytes: emit the batch before its UTF-8 text grows beyond this size
+        '''
+        self.emit = emit
+        self.window = window
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Only one batch is emitted at a time, so digests go out in the order they were collected
+        self._emit_lock = threading.Lock()
+        self._entries = []
+        self._options = None
+        self._size = 0
+        self._timer = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, text: str, options: dict = None):
+        '''
+        Add a message to the pending batch.
+        Messages with different options (title, level, ...) are never merged, the pending batch is emitted first.
+        '''
+        options = options or {}
+        size = len(text.encode('utf-8')) + len(TIME_FORMAT) + 4
+        if self._entries and (options != self._options or
+                              (self.max_bytes and self._size + size > self.max_bytes)):
+            self.flush()
+        with self._lock:
+            if not self._entries:
+                self._options = options
+                if self.window:
+                    self._timer = threading.Timer(self.window, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+            self._entries.append((datetime.datetime.now(), text))
+            self._size += size
+            full = self.max_messages and len(self._entries) >= self.max_messages
+        if full:
+            self.flush()
+
+    def flush(self, timeout: float = None) -> bool:
+        '''
+        Emit the pending batch now.
+        :param timeout: unused, accepted so this can be registered as a flushable
+        '''
+        with self._emit_lock:
+            with self._lock:
+                entries, options = self._entries, self._options
+                self._entries, self._options, self._size = [], None, 0
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if entries:
+                self.emit(self.merge(entries), options)
+        return True
+
+    @staticmethod
+    def merge(entries) -> str:
+        '''
+        A single message is returned unchanged, several messages are stamped with their time, oldest first.
+        '''
+        if len(entries) == 1:
+            return entries[0][1]
+        return '\n'.join('[%s] %s' % (date.strftime(TIME_FORMAT), text) for date, text in entries)
@@ -0,0 +1,189 @@
+'''
+@Project : dongdong
+@File : CommandRunner.py
+@Description : Run any command, pass its output through and report how it ended with its last lines
+'''
+import os
+import sys
+import shlex
+import signal
+import threading
+from collections import deque
+
+DEFAULT_TAIL_LINES = 30
+# Longer lines are cut, so a command printing gigabytes without a newline is still kept in bounded memory
+MAX_LINE_BYTES = 1000
+READ_SIZE = 65536
+# Signals sent to dongdong that are passed on to the command.
+# SIGINT is ignored instead, Ctrl-C in the terminal already reaches the command, dongdong waits for it to exit.
+FORWARDED_SIGNALS = ('SIGTERM', 'SIGHUP', 'SIGQUIT', 'SIGUSR1', 'SIGUSR2')
+
+
+class TailBuffer:
+    def __init__(self, max_lines: int = DEFAULT_TAIL_LINES, max_line_bytes: int = MAX_LINE_BYTES):
+        '''
+        The last max_lines lines of a byte stream, in memory bounded by max_lines * max_line_bytes
+        whatever the size of the stream. Several threads can feed it.
+        '''
+        self.max_line_bytes = max_line_bytes
+        self._lines = deque(maxlen=max_lines)
+        self._partial = bytearray()
+        self._cut = False
+        self._lock = threading.Lock()
+
+    def feed(self, data: bytes):
+        with self._lock:
+            newlines = data.count(b'\n')
+            if newlines > self._lines.maxlen:
+                # Only the lines that end up in the buffer are split, a chunk of short lines costs one scan
+                start = len(data)
+                for _ in range(self._lines.maxlen + 1):
+                    start = data.rfind(b'\n', 0, start)
+                data = data[start + 1:]
+                self._partial.clear()
+                self._cut = False
+            *complete, rest = data.split(b'\n')
+            for piece in complete:
+                self._append(piece)
+                self._lines.append(self._line())
+                self._partial.clear()
+                self._cut = False
+            self._append(rest)
+
+    def _append(self, piece: bytes):
+        # A progress bar rewrites its line with \r, only what was written after the last one is shown
+        if b'\r' in piece:
+            piece = piece.rsplit(b'\r', 1)[1]
+            if piece:
+                self._partial.clear()
+                self._cut = False
+        room = self.max_line_bytes - len(self._partial)
+        if len(piece) > room:
+            piece = piece[:max(room, 0)]
+            self._cut = True
+        self._partial.extend(piece)
+
+    def _line(self) -> bytes:
+        if not self._cut:
+            return bytes(self._partial)
+        return _whole_characters(bytes(self._partial)) + b' [...]'
+
+    def text(self) -> str:
+        with self._lock:
+            lines = list(self._lines)
+            if self._partial:
+                lines.append(self._line())
+        return b'\n'.join(lines).decode('utf-8', errors='replace')
+
+
+def _whole_characters(data: bytes) -> bytes:
+    '''
+    data without the UTF-8 character it ends in the middle of, if any, as when a long line is cut.
+    '''
+    for back in range(1, min(len(data), 4) + 1):
+        byte = data[-back]
+        if byte & 0xC0 != 0x80:
+            # The lead byte of a character, its length is given by its high bits
+            length = 1 if byte < 0xC0 else 2 if byte < 0xE0 else 3 if byte < 0xF0 else 4
+            return data[:-back] if length > back else data
+    return data
+
+
+def _pump(source, target, tail: TailBuffer):
+    '''
+    Copy a pipe of the command to our own stream as soon as bytes arrive, and keep its last lines.
+    '''
+    fd = source.fileno()
+    while True:
+        try:
+            data = os.read(fd, READ_SIZE)
+        except OSError:
+            break
+        if not data:
+            break
+        tail.feed(data)
+        try:
+            target.write(data)
+            target.flush()
+        except (OSError, ValueError):
+            pass
+    source.close()
+
+
+def describe_exit(returncode: int) -> str:
+    '''
+    A negative return code means the command was killed by a signal.
+    '''
+    if returncode >= 0:
+        return 'Exit code %d' % returncode
+    try:
+        name = signal.Signals(-returncode).name
+    except ValueError:
+        name = 'signal %d' % -returncode
+    return 'Killed by %s' % name
+
+
+def run_command(notificator, command: [str], tail_lines: int = DEFAULT_TAIL_LINES) -> int:
+    '''
+    Start command, pass its stdout and stderr through unchanged, and push the start message, then the complete
+    message if it exits with 0, or the crash message with its exit code or signal. Both give its last lines.
+    :param notificator: any notificator, or a MultiNotificator
+    :param command: the program and its arguments
+    :param tail_lines: number of output lines given in the messages
+    :return: the exit code to leave with, 128 + the signal number if the command was killed
+    '''
+    import subprocess
+    tail = TailBuffer(tail_lines)
+    event = notificator._start_event()
+    event.command = ' '.join(shlex.quote(arg) for arg in command)
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as ex:
+        notificator._end_event(event, error=ex)
+        event.traceback = ''
+        notificator._finish('crash', event)
+        print('dongdong: cannot run %s: %s' % (command[0], ex), file=sys.stderr)
+        return 127
+    pumps = [threading.Thread(target=_pump, args=(process.stdout, sys.stdout.buffer, tail), daemon=True),
+             threading.Thread(target=_pump, args=(process.stderr, sys.stderr.buffer, tail), daemon=True)]
+    for pump in pumps:
+        pump.start()
+    previous = _forward_signals(process)
+    try:
+        if event.master_process:
+            notificator._notify('start', event)
+        returncode = process.wait()
+    finally:
+        for name, handler in previous.items():
+            signal.signal(getattr(signal, name), handler)
+    for pump in pumps:
+        pump.join()
+    notificator._end_event(event, value=returncode)
+    output = tail.text()
+    event.output = 'Last lines of output:\n\n' + output if output else ''
+    if returncode == 0:
+        notificator._finish('complete', event)
+        return 0
+    event.error = describe_exit(returncode)
+    event.traceback = event.output
+    notificator._finish('crash', event)
+    return returncode if returncode > 0 else 128 - returncode
+
+
+def _forward_signals(process) -> dict:
+    '''
+    Pass the signals in FORWARDED_SIGNALS on to the process and ignore SIGINT, so that stopping dongdong
+    stops the command and its outcome is still reported. Returns the previous handlers.
+    '''
+    previous = {}
+    if threading.current_thread() is not threading.main_thread():
+        return previous
+    for name in FORWARDED_SIGNALS + ('SIGINT',):
+        if not hasattr(signal, name):
+            continue
+        handler = signal.SIG_IGN if name == 'SIGINT' else lambda signum, frame: process.send_signal(signum)
+        try:
+            previous[name] = signal.signal(getattr(signal, name), handler)
+        except (OSError, ValueError):
+            pass
+    return previous
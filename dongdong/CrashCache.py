@@ -0,0 +1,116 @@
+'''
+@Project : dongdong
+@File : CrashCache.py
+@Description : Fingerprints of the reported crashes, so a crash-looping job does not report the same crash every time
+'''
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+from contextlib import closing
+
+# Seconds a fingerprint is remembered after the crash was last seen
+DEFAULT_TTL = 7 * 24 * 3600
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def default_crash_cache_path() -> str:
+    cache = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache, 'dongdong', 'crashes.sqlite')
+
+
+def _frame_file(filename: str) -> str:
+    # The same code installed in another environment or checked out elsewhere has the same fingerprint
+    return '/'.join(filename.replace('\\', '/').split('/')[-2:])
+
+
+def fingerprint(error: BaseException) -> str:
+    '''
+    A hash of the type of error and of the frames it went through: file, function and source line,
+    without line numbers or the message, which change between runs while the crash stays the same.
+    Consecutive identical frames, as in a recursion, count once. The causes of error are included.
+    '''
+    import traceback
+    digest = hashlib.sha1()
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        digest.update(('%s.%s\n' % (type(error).__module__, type(error).__qualname__)).encode('utf-8'))
+        previous = None
+        for frame in traceback.extract_tb(error.__traceback__):
+            key = (_frame_file(frame.filename), frame.name, (frame.line or '').strip())
+            if key != previous:
+                digest.update(('%s:%s:%s\n' % key).encode('utf-8'))
+                previous = key
+        error = error.__cause__ or (None if error.__suppress_context__ else error.__context__)
+    return digest.hexdigest()[:20]
+
+
+class CrashCache:
+    def __init__(self, path: str = None, ttl: float = DEFAULT_TTL):
+        '''
+        When and how often each crash fingerprint was seen, in an SQLite file shared by the processes of the user,
+        so the restarts of a job know what the previous runs reported.
+        :param path: SQLite file, defaults to ~/.cache/dongdong/crashes.sqlite
+        :param ttl: seconds after which a fingerprint not seen again is forgotten
+        '''
+        self.path = path or default_crash_cache_path()
+        self.ttl = ttl
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS crashes ('
+                         'fingerprint TEXT PRIMARY KEY, reported REAL NOT NULL, last_seen REAL NOT NULL, '
+                         'suppressed INTEGER NOT NULL DEFAULT 0)')
+            conn.execute('PRAGMA journal_mode = WAL')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def record(self, fingerprint: str, window: float):
+        '''
+        Record a crash and decide whether to report it.
+        :param window: seconds after a report during which the same crash is not reported again
+        :return: (report, repeats, since): report is False if the crash is to be suppressed,
+            repeats is the number of times it was suppressed since it was last reported at the timestamp since
+        '''
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('DELETE FROM crashes WHERE last_seen < ?', (now - self.ttl,))
+                row = conn.execute('SELECT reported, suppressed FROM crashes WHERE fingerprint = ?',
+                                   (fingerprint,)).fetchone()
+                if row is None:
+                    conn.execute('INSERT INTO crashes (fingerprint, reported, last_seen) VALUES (?, ?, ?)',
+                                 (fingerprint, now, now))
+                    result = (True, 0, None)
+                elif now - row[0] < window:
+                    conn.execute('UPDATE crashes SET last_seen = ?, suppressed = suppressed + 1 '
+                                 'WHERE fingerprint = ?', (now, fingerprint))
+                    result = (False, row[1] + 1, row[0])
+                else:
+                    conn.execute('UPDATE crashes SET reported = ?, last_seen = ?, suppressed = 0 '
+                                 'WHERE fingerprint = ?', (now, now, fingerprint))
+                    result = (True, row[1], row[0])
+                conn.execute('COMMIT')
+            except:
+                conn.execute('ROLLBACK')
+                raise
+        return result
+
+
+def get_crash_cache(path: str = None) -> CrashCache:
+    '''
+    The crash cache stored in path, shared by every notificator of the process.
+    '''
+    path = os.path.abspath(path or default_crash_cache_path())
+    cache = _caches.get(path)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(path)
+            if cache is None:
+                cache = _caches[path] = CrashCache(path)
+    return cache
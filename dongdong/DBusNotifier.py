@@ -0,0 +1,366 @@
+'''
+@Project : dongdong
+@File : DBusNotifier.py
+@Description : Desktop notifications sent over one long-lived connection to the D-Bus session bus
+'''
+import os
+import time
+import struct
+import threading
+from collections import deque
+from urllib.parse import unquote
+from .DeliveryQueue import register_flush
+
+NOTIFICATIONS = 'org.freedesktop.Notifications'
+# Notifications arriving within this many seconds of each other are shown as one
+BURST_WINDOW = 0.05
+# Seconds before connecting again once the bus could not be reached, messages go to notify-send meanwhile
+RETRY_INTERVAL = 60
+CALL_TIMEOUT = 5
+
+METHOD_CALL, METHOD_RETURN, ERROR = 1, 2, 3
+# Header field codes and the type of their value
+PATH, INTERFACE, MEMBER, ERROR_NAME, REPLY_SERIAL, DESTINATION, SIGNATURE = 1, 2, 3, 4, 5, 6, 8
+FIELD_TYPES = {PATH: 'o', INTERFACE: 's', MEMBER: 's', DESTINATION: 's', SIGNATURE: 'g'}
+
+_notifiers = {}
+_notifiers_lock = threading.Lock()
+
+
+class DBusError(Exception):
+    pass
+
+
+def default_bus_address() -> str:
+    '''
+    $DBUS_SESSION_BUS_ADDRESS, or the bus systemd starts for the user.
+    '''
+    address = os.environ.get('DBUS_SESSION_BUS_ADDRESS')
+    if not address and hasattr(os, 'getuid') and os.path.exists('/run/user/%d/bus' % os.getuid()):
+        address = 'unix:path=/run/user/%d/bus' % os.getuid()
+    return address
+
+
+class _Writer:
+    '''
+    Marshal values in the little-endian D-Bus wire format, alignment is relative to the start of the buffer.
+    '''
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def align(self, n: int):
+        self.data.extend(b'\0' * (-len(self.data) % n))
+
+    def byte(self, value: int):
+        self.data.append(value)
+
+    def uint32(self, value: int, code: str = 'I'):
+        self.align(4)
+        self.data.extend(struct.pack('<' + code, value))
+
+    def string(self, value: str):
+        encoded = value.encode('utf-8')
+        self.uint32(len(encoded))
+        self.data.extend(encoded + b'\0')
+
+    def signature(self, value: str):
+        self.byte(len(value))
+        self.data.extend(value.encode('ascii') + b'\0')
+
+    def empty_array(self, element_alignment: int):
+        self.uint32(0)
+        # The padding to the first element is there even if the array is empty
+        self.align(element_alignment)
+
+
+def _message(serial: int, fields: dict, body: bytes = b'', flags: int = 0) -> bytes:
+    header = _Writer()
+    header.data.extend(struct.pack('<cBBBII', b'l', METHOD_CALL, flags, 1, len(body), serial))
+    header.uint32(0)
+    start = len(header.data)
+    for code, value in fields.items():
+        header.align(8)
+        header.byte(code)
+        header.signature(FIELD_TYPES[code])
+        if FIELD_TYPES[code] == 'g':
+            header.signature(value)
+        else:
+            header.string(value)
+    header.data[12:16] = struct.pack('<I', len(header.data) - start)
+    header.align(8)
+    return bytes(header.data) + body
+
+
+class SessionBus:
+    def __init__(self, address: str = None, timeout: float = CALL_TIMEOUT):
+        '''
+        A minimal D-Bus client: it connects to a unix socket, authenticates with EXTERNAL and calls methods.
+        :param address: bus address such as unix:path=/run/user/1000/bus, defaults to the session bus
+        :param timeout: seconds to wait for the bus to answer
+        '''
+        self.address = address or default_bus_address()
+        self.timeout = timeout
+        self._serial = 0
+        self._buffer = b''
+        self._sock = self._connect()
+        try:
+            self._authenticate()
+            self.call('org.freedesktop.DBus', '/org/freedesktop/DBus', 'org.freedesktop.DBus', 'Hello')
+        except:
+            self.close()
+            raise
+
+    def _connect(self):
+        import socket
+        if not self.address:
+            raise DBusError('No session bus address')
+        for address in self.address.split(';'):
+            transport, _, options = address.partition(':')
+            if transport != 'unix':
+                continue
+            options = dict(option.split('=', 1) for option in options.split(',') if '=' in option)
+            if 'path' in options:
+                target = unquote(options['path'])
+            elif 'abstract' in options:
+                target = '\0' + unquote(options['abstract'])
+            else:
+                continue
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(target)
+            except OSError:
+                sock.close()
+                continue
+            return sock
+        raise DBusError('Unable to connect to the bus at %s' % self.address)
+
+    def _authenticate(self):
+        uid = str(os.getuid()).encode('ascii')
+        self._sock.sendall(b'\0AUTH EXTERNAL ' + uid.hex().encode('ascii') + b'\r\n')
+        line = self._read_line()
+        if not line.startswith(b'OK'):
+            raise DBusError('The bus refused the authentication: %r' % line)
+        self._sock.sendall(b'BEGIN\r\n')
+
+    def _read_line(self) -> bytes:
+        while b'\r\n' not in self._buffer:
+            self._buffer += self._recv()
+        line, self._buffer = self._buffer.split(b'\r\n', 1)
+        return line
+
+    def _recv(self) -> bytes:
+        data = self._sock.recv(4096)
+        if not data:
+            raise DBusError('The bus closed the connection')
+        return data
+
+    def _read_exactly(self, n: int) -> bytes:
+        while len(self._buffer) < n:
+            self._buffer += self._recv()
+        data, self._buffer = self._buffer[:n], self._buffer[n:]
+        return data
+
+    def _read_message(self):
+        '''
+        :return: the type and the serial of the next message, its header fields, its body and its byte order
+        '''
+        fixed = self._read_exactly(16)
+        order = '<' if fixed[:1] == b'l' else '>'
+        message_type = fixed[1]
+        body_length, serial, fields_length = struct.unpack(order + 'III', fixed[4:16])
+        header_length = 16 + fields_length + (-fields_length % 8)
+        header = fixed + self._read_exactly(header_length - 16)
+        body = self._read_exactly(body_length)
+        fields = {}
+        pos = 16
+        while pos < 16 + fields_length:
+            pos += -pos % 8
+            code, signature_length = header[pos], header[pos + 1]
+            kind = header[pos + 2:pos + 2 + signature_length].decode('ascii')
+            pos += 3 + signature_length
+            if kind == 'g':
+                length = header[pos]
+                fields[code] = header[pos + 1:pos + 1 + length].decode('ascii')
+                pos += length + 2
+            elif kind in ('s', 'o'):
+                pos += -pos % 4
+                length, = struct.unpack(order + 'I', header[pos:pos + 4])
+                fields[code] = header[pos + 4:pos + 4 + length].decode('utf-8')
+                pos += length + 5
+            else:
+                pos += -pos % 4
+                fields[code], = struct.unpack(order + 'I', header[pos:pos + 4])
+                pos += 4
+        return message_type, serial, fields, body, order
+
+    def call(self, destination: str, path: str, interface: str, member: str, signature: str = None,
+             body: bytes = b''):
+        '''
+        Call a method and wait for its reply, the messages received in between are skipped.
+        :return: the body of the reply and its byte order
+        '''
+        self._serial += 1
+        fields = {PATH: path, INTERFACE: interface, MEMBER: member, DESTINATION: destination}
+        if signature:
+            fields[SIGNATURE] = signature
+        self._sock.sendall(_message(self._serial, fields, body))
+        while True:
+            message_type, _, fields, reply, order = self._read_message()
+            if fields.get(REPLY_SERIAL) != self._serial:
+                continue
+            if message_type == ERROR:
+                raise DBusError(fields.get(ERROR_NAME, 'Error'))
+            return reply, order
+
+    def notify(self, summary: str, body: str, app_name: str = 'dongdong', replaces_id: int = 0,
+               expire_timeout: int = -1) -> int:
+        '''
+        Show a notification through org.freedesktop.Notifications.
+        :param replaces_id: id of a notification to update instead of showing a new one
+        :return: id of the notification
+        '''
+        writer = _Writer()
+        writer.string(app_name)
+        writer.uint32(replaces_id)
+        writer.string('')
+        writer.string(summary)
+        writer.string(body)
+        writer.empty_array(4)
+        writer.empty_array(8)
+        writer.uint32(expire_timeout, 'i')
+        reply, order = self.call(NOTIFICATIONS, '/org/freedesktop/Notifications', NOTIFICATIONS, 'Notify',
+                                 'susssasa{sv}i', bytes(writer.data))
+        return struct.unpack(order + 'I', reply[:4])[0] if len(reply) >= 4 else 0
+
+    def close(self):
+        try:
+            self._sock.close()
+        except:
+            pass
+
+
+class DBusNotifier:
+    def __init__(self, address: str = None):
+        '''
+        Notifications submitted here are shown by a background thread over one bus connection,
+        so submit() never waits and no process is started per message. Notifications submitted in a burst
+        are merged into one per title. While the bus cannot be reached they are handed to the fallback.
+        :param address: bus address, defaults to the session bus
+        '''
+        self.address = address
+        self._reset()
+        register_flush(self)
+
+    def _reset(self):
+        # A forked child must neither share the connection nor wait for the worker of its parent
+        self._pid = os.getpid()
+        self._pending = deque()
+        self._unfinished = 0
+        self._cond = threading.Condition()
+        self._worker = None
+        self._bus = None
+        self._retry_at = 0
+
+    def submit(self, title: str, message: str, fallback, done=None):
+        '''
+        :param fallback: callable taking (title, message), used when the bus cannot be reached
+        :param done: callable taking (shown, seconds), called once the notification server replied, or the fallback
+            returned or failed, with the seconds since submit()
+        '''
+        if self._pid != os.getpid():
+            self._reset()
+        with self._cond:
+            self._pending.append((title, message, fallback, done, time.perf_counter()))
+            self._unfinished += 1
+            self._cond.notify_all()
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='dongdong-dbus', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            time.sleep(BURST_WINDOW)
+            with self._cond:
+                batch = list(self._pending)
+                self._pending.clear()
+            try:
+                self._show(batch)
+            finally:
+                with self._cond:
+                    self._unfinished -= len(batch)
+                    self._cond.notify_all()
+
+    def _show(self, batch: list):
+        merged = {}
+        for title, message, fallback, done, submitted in batch:
+            if title in merged:
+                merged[title][0].append(message)
+                merged[title][2].append((done, submitted))
+            else:
+                merged[title] = ([message], fallback, [(done, submitted)])
+        for title, (messages, fallback, callbacks) in merged.items():
+            message = '\n'.join(messages)
+            shown = True
+            try:
+                self._get_bus().notify(title, message)
+            except:
+                if self._bus is not None:
+                    self._bus.close()
+                    self._bus = None
+                    self._retry_at = time.monotonic() + RETRY_INTERVAL
+                try:
+                    fallback(title, message)
+                except:
+                    shown = False
+                    print('Unable to push message, please check network or configuration file')
+            now = time.perf_counter()
+            for done, submitted in callbacks:
+                if done is not None:
+                    try:
+                        done(shown, now - submitted)
+                    except:
+                        print('Unable to count the notification')
+
+    def _get_bus(self) -> SessionBus:
+        if self._bus is None:
+            if time.monotonic() < self._retry_at:
+                raise DBusError('The bus could not be reached recently')
+            self._retry_at = time.monotonic() + RETRY_INTERVAL
+            self._bus = SessionBus(self.address)
+        return self._bus
+
+    def flush(self, timeout: float = None) -> bool:
+        '''
+        Wait until every submitted notification has been shown.
+        :param timeout: seconds to wait at most, None waits forever
+        :return: True if nothing is left to show
+        '''
+        if self._pid != os.getpid():
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._unfinished:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+
+def get_notifier(address: str = None) -> DBusNotifier:
+    '''
+    The notifier of a bus address, shared by every DesktopNotificator of the process.
+    '''
+    address = address or default_bus_address()
+    notifier = _notifiers.get(address)
+    if notifier is None:
+        with _notifiers_lock:
+            notifier = _notifiers.get(address)
+            if notifier is None:
+                notifier = _notifiers[address] = DBusNotifier(address)
+    return notifier
@@ -0,0 +1,186 @@
+'''
+@Project : dongdong
+@File : DeliveryQueue.py
+@Description : Bounded in-memory queue drained by a background thread, flushed at exit
+'''
+import os
+import time
+import atexit
+import weakref
+import threading
+from collections import deque
+
+OVERFLOW_POLICIES = ('drop-oldest', 'block', 'drop-new')
+ATEXIT_FLUSH_TIMEOUT = 10
+
+_flushables = weakref.WeakSet()
+# Set by the shutdown handlers once the process is told to stop
+_exit_deadline = None
+
+
+class DeliveryQueue:
+    def __init__(self, deliver, maxsize: int = 1000, overflow: str = 'drop-oldest', on_drop=None):
+        '''
+        Messages put into this queue are handed to `deliver` one by one, in order, by a daemon worker thread.
+        :param deliver: callable taking one queued item, it should not raise, if it does the error is printed
+            and the next item is delivered
+        :param maxsize: maximum number of pending items
+        :param overflow: what to do when the queue is full
+            drop-oldest: discard the oldest pending item to make room
+            block: wait in put() until the worker makes room
+            drop-new: discard the item being put
+        :param on_drop: callable without arguments, called for every dropped item
+        '''
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError('overflow must be one of %s, got %r' % (', '.join(OVERFLOW_POLICIES), overflow))
+        self.deliver = deliver
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.dropped = 0
+        self.on_drop = on_drop
+        self._reset()
+
+    def _reset(self):
+        # A forked child inherits the queue but not the worker thread, so it starts from scratch
+        self._pid = os.getpid()
+        self._urgent = deque()
+        self._items = deque()
+        self._unfinished = 0
+        self._cond = threading.Condition()
+        self._worker = None
+
+    def __len__(self):
+        return len(self._urgent) + len(self._items)
+
+    def put(self, item, urgent: bool = False) -> bool:
+        '''
+        Enqueue an item without waiting for it to be delivered.
+        :param item: the item passed to deliver
+        :param urgent: put the item in the priority lane, it is delivered before every regular item,
+            it is always enqueued, even if the queue is full, and never dropped
+        :return: False if the item was dropped
+        '''
+        if self._pid != os.getpid():
+            self._reset()
+        with self._cond:
+            if urgent:
+                self._urgent.append(item)
+            elif self._full():
+                if self.overflow == 'drop-new':
+                    self._dropped()
+                    return False
+                elif self.overflow == 'drop-oldest':
+                    self._drop_oldest()
+                else:
+                    while self._full():
+                        self._cond.wait()
+            if not urgent:
+                self._items.append(item)
+            self._unfinished += 1
+            self._cond.notify_all()
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='dongdong-delivery', daemon=True)
+                self._worker.start()
+        return True
+
+    def _full(self):
+        return len(self._items) >= self.maxsize
+
+    def _drop_oldest(self):
+        self._items.popleft()
+        self._unfinished -= 1
+        self._dropped()
+
+    def _dropped(self):
+        self.dropped += 1
+        if self.on_drop is not None:
+            self.on_drop()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._urgent and not self._items:
+                    self._cond.wait()
+                item = self._urgent.popleft() if self._urgent else self._items.popleft()
+                self._cond.notify_all()
+            try:
+                self.deliver(item)
+            except:
+                # The worker must survive, no other worker is started while it is set
+                print('Unable to deliver a queued message')
+            finally:
+                with self._cond:
+                    self._unfinished -= 1
+                    self._cond.notify_all()
+
+    def flush(self, timeout: float = None) -> bool:
+        '''
+        Wait until every item put so far has been delivered.
+        :param timeout: seconds to wait at most, None waits forever
+        :return: True if the queue was drained in time
+        '''
+        if self._pid != os.getpid():
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._unfinished:
+                if deadline is None:
+                    self._cond.wait()
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+        return True
+
+
+def register_flush(obj):
+    '''
+    Make sure obj.flush(timeout) is called before the interpreter exits.
+    Objects are held weakly, so registering does not keep them alive.
+    '''
+    _flushables.add(obj)
+
+
+def flush_all(timeout: float) -> bool:
+    '''
+    Flush every registered object in parallel, each one in its own thread, giving up after timeout seconds.
+    :return: True if everything was flushed in time
+    '''
+    deadline = time.monotonic() + timeout
+    results = []
+
+    def flush_one(obj):
+        try:
+            results.append(bool(obj.flush(max(deadline - time.monotonic(), 0))))
+        except:
+            results.append(False)
+
+    objs = list(_flushables)
+    # Objects reporting on the others, such as the statistics exporters, are flushed once the others are
+    threads = [threading.Thread(target=flush_one, args=(obj,), name='dongdong-flush', daemon=True)
+               for obj in objs if not getattr(obj, 'FLUSH_LAST', False)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(max(deadline - time.monotonic(), 0))
+    for obj in objs:
+        if getattr(obj, 'FLUSH_LAST', False) and time.monotonic() < deadline:
+            flush_one(obj)
+    return len(results) == len(objs) and all(results)
+
+
+def set_exit_deadline(deadline: float):
+    '''
+    Make the flush at exit give up at this time.monotonic() deadline, instead of ATEXIT_FLUSH_TIMEOUT after it starts.
+    '''
+    global _exit_deadline
+    _exit_deadline = deadline
+
+
+@atexit.register
+def _flush_at_exit(timeout: float = None):
+    if timeout is None:
+        timeout = ATEXIT_FLUSH_TIMEOUT if _exit_deadline is None else _exit_deadline - time.monotonic()
+    if timeout > 0:
+        flush_all(timeout)
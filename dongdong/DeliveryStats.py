@@ -0,0 +1,240 @@
+'''
+@Project : dongdong
+@File : DeliveryStats.py
+@Description : Counters and latency histograms of the deliveries of every notificator, and their Prometheus export
+'''
+import os
+import bisect
+import weakref
+import threading
+from array import array
+
+# Upper bounds in seconds of the latency histogram buckets, the last bucket is +Inf
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNTERS = ('sent', 'failed', 'dropped', 'retried', 'relayed')
+COUNTER_HELP = {
+    'sent': 'Messages delivered to the backend',
+    'failed': 'Messages the backend could not be reached for',
+    'dropped': 'Messages dropped by a full queue or the rate limit',
+    'retried': 'Deliveries attempted again, from the outbox or by the relay',
+    'relayed': 'Messages handed to the relay of the host',
+}
+
+_stats = {}
+_stats_lock = threading.Lock()
+# Queues whose depth is reported, by backend, held weakly so a discarded notificator is not kept alive
+_queues = weakref.WeakKeyDictionary()
+
+
+def backend_name(notificator_class) -> str:
+    '''
+    bark for BarkNotificator, dingtalk for DingTalkNotificator, ...
+    '''
+    name = notificator_class.__name__
+    if name.endswith('Notificator'):
+        name = name[:-len('Notificator')]
+    return name.lower()
+
+
+class BackendStats:
+    def __init__(self, backend: str):
+        '''
+        The counters and the latency histogram of one backend, shared by all its notificators in the process.
+        '''
+        self.backend = backend
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        self.buckets = array('q', bytes(8 * (len(LATENCY_BUCKETS) + 1)))
+        self.latency_sum = 0.0
+        self._lock = threading.Lock()
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counts[name] += n
+
+    def observe(self, seconds: float):
+        '''
+        Record a successful delivery and how long it took.
+        '''
+        with self._lock:
+            self.counts['sent'] += 1
+            self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            self.latency_sum += seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            snapshot = dict(self.counts)
+            buckets = list(self.buckets)
+            latency_sum = self.latency_sum
+        total = sum(buckets)
+        snapshot['queued'] = sum(len(queue) for queue, backend in list(_queues.items()) if backend == self.backend)
+        snapshot['latency'] = {
+            'count': total,
+            'sum': latency_sum,
+            'mean': latency_sum / total if total else None,
+            'p50': _quantile(buckets, total, 0.5),
+            'p99': _quantile(buckets, total, 0.99),
+            # Cumulative, as in Prometheus
+            'buckets': dict(zip(LATENCY_BUCKETS + (float('inf'),), _cumulative(buckets))),
+        }
+        return snapshot
+
+
+def _cumulative(buckets: list) -> list:
+    total, result = 0, []
+    for count in buckets:
+        total += count
+        result.append(total)
+    return result
+
+
+def _quantile(buckets: list, total: int, q: float) -> float:
+    '''
+    Upper bound of the bucket holding the q quantile, None if nothing was observed, inf beyond the last bound.
+    '''
+    if not total:
+        return None
+    rank = q * total
+    for bound, count in zip(LATENCY_BUCKETS + (float('inf'),), _cumulative(buckets)):
+        if count >= rank:
+            return bound
+
+
+def get_stats(backend: str) -> BackendStats:
+    stats = _stats.get(backend)
+    if stats is None:
+        with _stats_lock:
+            stats = _stats.get(backend)
+            if stats is None:
+                stats = _stats[backend] = BackendStats(backend)
+    return stats
+
+
+def watch_queue(backend: str, queue):
+    '''
+    Report the number of items pending in queue as the queue depth of backend.
+    '''
+    _queues[queue] = backend
+
+
+def stats() -> dict:
+    '''
+    Delivery statistics of the process, by backend: counters of sent, failed, dropped, retried and relayed
+    messages, the number of messages queued right now, and the latency of the deliveries in seconds.
+    '''
+    return {backend: _stats[backend].snapshot() for backend in sorted(_stats)}
+
+
+def prometheus_text() -> str:
+    '''
+    stats() in the Prometheus text exposition format.
+    '''
+    snapshots = stats()
+    lines = []
+    for name in COUNTERS:
+        lines.append('# HELP dongdong_messages_%s_total %s' % (name, COUNTER_HELP[name]))
+        lines.append('# TYPE dongdong_messages_%s_total counter' % name)
+        for backend, snapshot in snapshots.items():
+            lines.append('dongdong_messages_%s_total{backend="%s"} %d' % (name, backend, snapshot[name]))
+    lines.append('# HELP dongdong_queue_depth Messages waiting to be delivered')
+    lines.append('# TYPE dongdong_queue_depth gauge')
+    for backend, snapshot in snapshots.items():
+        lines.append('dongdong_queue_depth{backend="%s"} %d' % (backend, snapshot['queued']))
+    lines.append('# HELP dongdong_delivery_seconds Time taken to deliver a message')
+    lines.append('# TYPE dongdong_delivery_seconds histogram')
+    for backend, snapshot in snapshots.items():
+        latency = snapshot['latency']
+        for bound, count in latency['buckets'].items():
+            le = '+Inf' if bound == float('inf') else repr(float(bound))
+            lines.append('dongdong_delivery_seconds_bucket{backend="%s",le="%s"} %d' % (backend, le, count))
+        lines.append('dongdong_delivery_seconds_sum{backend="%s"} %r' % (backend, latency['sum']))
+        lines.append('dongdong_delivery_seconds_count{backend="%s"} %d' % (backend, latency['count']))
+    return '\n'.join(lines) + '\n'
+
+
+def write_prometheus(path: str):
+    '''
+    Write prometheus_text() to path atomically, for the textfile collector of the node exporter.
+    '''
+    directory = os.path.dirname(os.path.abspath(path))
+    tmp_path = os.path.join(directory, '.%s.%d' % (os.path.basename(path), os.getpid()))
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(prometheus_text())
+    os.replace(tmp_path, path)
+
+
+class PrometheusExporter:
+    FLUSH_LAST = True
+
+    def __init__(self, path: str, interval: float = 15):
+        '''
+        Write the statistics to path every interval seconds from a daemon thread, and once more at exit.
+        :param path: a .prom file in the directory of the textfile collector, {pid} is replaced by the process id,
+            so that the processes of a host do not overwrite each other's file. Such a file is removed at exit,
+            the node exporter would report the process forever otherwise.
+        :param interval: seconds between two writes
+        '''
+        self.path = path.replace('{pid}', str(os.getpid()))
+        self.per_process = '{pid}' in path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._removed = False
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='dongdong-prometheus', daemon=True)
+        self._thread.start()
+        if self.per_process:
+            import atexit
+            atexit.register(self.stop)
+        else:
+            # Written a last time once the queues are flushed, so the file holds the final counts
+            from .DeliveryQueue import register_flush
+            register_flush(self)
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def stop(self):
+        '''
+        Stop writing, remove the file if it is the file of this process, else write it a last time.
+        '''
+        self._stop.set()
+        if not self.per_process:
+            self.flush()
+            return
+        with self._lock:
+            self._removed = True
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            except:
+                print('Unable to remove %s' % self.path)
+
+    def flush(self, timeout: float = None) -> bool:
+        with self._lock:
+            if self._removed:
+                return True
+            try:
+                write_prometheus(self.path)
+            except:
+                print('Unable to write the statistics to %s' % self.path)
+                return False
+        return True
+
+
+_exporters = []
+
+
+def export_prometheus(path: str, interval: float = 15) -> PrometheusExporter:
+    '''
+    Write the delivery statistics of the process to path in the Prometheus text format every interval seconds,
+    e.g. export_prometheus('/var/lib/node_exporter/textfile/dongdong_{pid}.prom'), see PrometheusExporter.
+    '''
+    exporter = PrometheusExporter(path, interval).start()
+    # register_flush holds exporters weakly, this keeps them running
+    _exporters.append(exporter)
+    return exporter
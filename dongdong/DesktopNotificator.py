@@ -6,114 +6,40 @@
 @Email : Chenglongli@cug.edu.cn
 @Description : 
 '''
-import functools
-import os
-import datetime
-import socket
-import traceback
-import platform
-import subprocess
-from .configure import DATE_FORMAT
+import time
+from .BaseNotificator import BaseNotificator, DEFERRED
 
 
-class DesktopNotificator:
-    def __init__(self, taskname=None, title='RingRingRing'):
+class DesktopNotificator(BaseNotificator):
+    def __init__(self, taskname=None, title='RingRingRing', bus_address=None, **kwargs):
         '''
         This class will configure the settings for desktop notification.
         :param taskname:
         :param title: title of the message
+        :param bus_address: on Linux, messages are sent over one connection to this D-Bus bus by a background
+            thread instead of starting notify-send for each message, notify-send is used if the bus cannot be reached.
+            Defaults to $DBUS_SESSION_BUS_ADDRESS, False always uses notify-send.
+        :param kwargs: delivery options such as async_delivery, see BaseNotificator
 
         You can set self.startmsg，self.completemsg and self.crashmsg via a string list to change the push information of the monitor
         '''
+        super().__init__(**kwargs)
         self.taskname = taskname
         self.title = title
+        self.bus_address = bus_address
         self.startmsg = None
         self.completemsg = None
         self.crashmsg = None
 
-    def monitor(self):
-        def decorator_sender(func):
-            @functools.wraps(func)
-            def wrapper_sender(*args, **kwargs):
-
-                start_time = datetime.datetime.now()
-                host_name = socket.gethostname()
-
-                if 'RANK' in os.environ:
-                    master_process = (int(os.environ['RANK']) == 0)
-                    host_name += ' - RANK: %s' % os.environ['RANK']
-                else:
-                    master_process = True
-
-                if master_process:
-                    if self.startmsg:
-                        title = self.title
-                        contents = self.startmsg
-                    else:
-                        title = 'The script starts running 🎬'
-                        contents = [f'Machine name: {host_name}\n',
-                                    f'Task name: {self.taskname}\n',
-                                    f'Starting date: {start_time.strftime(DATE_FORMAT)}']
-                    message = '\n'.join(contents)
-                    try:
-                        self.push(title, message)
-                    except:
-                        print('Unable to push message, please check network or configuration file')
-                try:
-                    value = func(*args, **kwargs)
-
-                    if master_process:
-                        end_time = datetime.datetime.now()
-                        elapsed_time = end_time - start_time
-                        if self.completemsg:
-                            title = self.title
-                            contents = self.completemsg
-                        else:
-                            title='The script is complete 🎉'
-                            contents = [f'Machine name: {host_name}\n',
-                                        f'Task name: {self.taskname}\n',
-                                        f'Starting date: {start_time.strftime(DATE_FORMAT)}\n',
-                                        f'End date: {end_time.strftime(DATE_FORMAT)}\n'
-                                        f'Running duration: {str(elapsed_time)}']
-                        try:
-                            str_value = str(value)
-                            contents.append(
-                                '\nMain call returned value: %s' % str_value)
-                        except:
-                            contents.append("\nMain call returned value: ERROR - Couldn't str the returned value.")
-                        message = '\n'.join(contents)
-                        try:
-                            self.push(title, message)
-                        except:
-                            print('Unable to push message, please check network or configuration file')
-
-                    return value
-
-                except Exception as ex:
-                    end_time = datetime.datetime.now()
-                    elapsed_time = end_time - start_time
-                    if self.crashmsg:
-                        title = self.title
-                        contents = self.crashmsg
-                    else:
-                        title='The script has crashed ☠️'
-                        contents = [f'Machine name: {host_name}\n',
-                                    f'Task name: {self.taskname}\n',
-                                    f'Starting date: {start_time.strftime(DATE_FORMAT)}\n',
-                                    f'Crash date: {end_time.strftime(DATE_FORMAT)}\n',
-                                    f'Crashed running duration: {str(elapsed_time)}\n\n',
-                                    f'Here is the error:\n\n{ex}\n\n',
-                                    f'{traceback.format_exc()}']
-                    message = '\n'.join(contents)
-                    try:
-                        self.push(title, message)
-                    except:
-                        print('Unable to push message, please check network or configuration file')
-                    raise ex
-
-            return wrapper_sender
-
-        return decorator_sender
+    def _event_payload(self, kind, event):
+        custom = self._custom_message(kind)
+        if custom:
+            title, contents = self.title, list(custom)
+        else:
+            title, contents = self._default_contents(kind, event)
+        if kind == 'complete':
+            contents.append(self._returned_value_line(event))
+        return self._payload(self._fit('\n'.join(contents)), title=title)
 
     def push(self, title, message):
         '''
@@ -122,6 +48,56 @@ class DesktopNotificator:
         :param message:
         :return:
         '''
+        self._submit(message, title=title)
+
+    def _payload(self, message, title=None):
+        return title, message
+
+    def _text_options(self, text, title=None):
+        return text, {'title': title or self.title}
+
+    def _notifier(self):
+        import platform
+        if self.bus_address is False or platform.system() != 'Linux':
+            return None
+        from .DBusNotifier import get_notifier
+        return get_notifier(self.bus_address)
+
+    def _deliver(self, payload):
+        title, message = payload
+        notifier = self._notifier()
+        if notifier is None:
+            self._spawn(title, message)
+        else:
+            notifier.submit(title, message, self._spawn, self._shown)
+            return DEFERRED
+
+    def _shown(self, shown: bool, seconds: float):
+        '''
+        Count a message handed to the D-Bus notifier, once it is shown, over the bus or by the fallback.
+        '''
+        if shown:
+            self._stats.observe(seconds)
+        else:
+            self._stats.count('failed')
+
+    def flush(self, timeout: float = None) -> bool:
+        '''
+        Wait until every pending message has been shown.
+        :param timeout: seconds to wait at most, None waits forever
+        :return: True if nothing is left to show
+        '''
+        deadline = None if timeout is None else time.monotonic() + timeout
+        done = super().flush(timeout)
+        notifier = self._notifier()
+        if notifier is not None:
+            done = notifier.flush(None if deadline is None else max(deadline - time.monotonic(), 0)) and done
+        return done
+
+    @staticmethod
+    def _spawn(title, message):
+        import platform
+        import subprocess
         # Check the OS
         if platform.system() == "Darwin":
             subprocess.run(["sh", "-c", f"osascript -e 'display notification \"{message}\" with title \"{title}\"'"])
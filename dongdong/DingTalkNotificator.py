@@ -6,22 +6,24 @@
 @Email : Chenglongli@cug.edu.cn
 @Description : 
 '''
-import functools
-import os
+import copy
 import datetime
-import socket
 import hmac
 import base64
-import urllib
+import urllib.parse
 import hashlib
-import traceback
-import requests
-from .configure import dingtalk_webhook, dingtalk_user_mentions, DATE_FORMAT
+from .UserConfig import load_config
+from .BaseNotificator import BaseNotificator
 
 
-class DingTalkNotificator:
+class DingTalkNotificator(BaseNotificator):
+    # https://open.dingtalk.com/document/robots/custom-robot-access
+    RATE_LIMIT = (20, 60)
+    # Mentions and keywords are appended after the text, the message may hold 20000 bytes
+    MAX_BYTES = 19000
+
     def __init__(self, webhook: str = None, taskname=None, user_mentions: [str] = [], secret: str = '',
-                 keywords: [str] = []):
+                 keywords: [str] = [], profile: str = None, **kwargs):
         '''
         This class will configure the settings for dingtalk notification.
         :param webhook: str
@@ -39,13 +41,16 @@ class DingTalkNotificator:
                 are posted through a encrypting way (secret).
             Vist https://ding-doc.dingtalk.com/doc#/serverapi2/qf2nxq from more details.
         :param keywords: see `secret`
+        :param profile: section of the config file to read the missing settings from, see setconfigures
+        :param kwargs: delivery options such as async_delivery, see BaseNotificator
 
         You can set self.startmsg，self.completemsg and self.crashmsg via a string list to change the push information of the monitor
         '''
-        if not webhook:
-            webhook = dingtalk_webhook
-        if not user_mentions:
-            user_mentions = dingtalk_user_mentions
+        super().__init__(**kwargs)
+        if not webhook or not user_mentions:
+            config = load_config(profile)
+            webhook = webhook or config['dingtalk_webhook']
+            user_mentions = user_mentions or config['dingtalk_user_mentions']
         self.webhook = webhook
         self.user_mentions = user_mentions
         self.secret = secret
@@ -79,104 +84,17 @@ class DingTalkNotificator:
                         + '&sign={}'.format(sign)
         return encrypted_url
 
-    def monitor(self):
-        def decorator_sender(func):
-            @functools.wraps(func)
-            def wrapper_sender(*args, **kwargs):
-
-                start_time = datetime.datetime.now()
-                host_name = socket.gethostname()
-
-                if 'RANK' in os.environ:
-                    master_process = (int(os.environ['RANK']) == 0)
-                    host_name += ' - RANK: %s' % os.environ['RANK']
-                else:
-                    master_process = True
-
-                if master_process:
-                    if self.startmsg:
-                        contents = self.startmsg
-                    else:
-                        contents = ['The script starts running 🎬\n',
-                                    f'Machine name: {host_name}\n',
-                                    f'Task name: {self.taskname}\n',
-                                    f'Starting date: {start_time.strftime(DATE_FORMAT)}']
-                    contents.extend(['@{}'.format(i) for i in self.user_mentions])
-                    contents.extend(self.keywords)
-                    self.msg['text']['content'] = '\n'.join(contents)
-                    try:
-                        if self.secret:
-                            postto = self._construct_encrypted_url()
-                            requests.post(postto, json=self.msg)
-                        else:
-                            requests.post(self.webhook, json=self.msg)
-                    except:
-                        print('Unable to push message, please check network or configuration file')
-                try:
-                    value = func(*args, **kwargs)
-
-                    if master_process:
-                        end_time = datetime.datetime.now()
-                        elapsed_time = end_time - start_time
-                        if self.completemsg:
-                            contents = self.completemsg
-                        else:
-                            contents = ['The script is complete 🎉\n',
-                                        f'Machine name: {host_name}\n',
-                                        f'Task name: {self.taskname}\n',
-                                        f'Starting date: {start_time.strftime(DATE_FORMAT)}\n',
-                                        f'End date: {end_time.strftime(DATE_FORMAT)}\n'
-                                        f'Running duration: {str(elapsed_time)}']
-                        try:
-                            str_value = str(value)
-                            contents.append(
-                                '\nMain call returned value: %s' % str_value)
-                        except:
-                            contents.append("\nMain call returned value: ERROR - Couldn't str the returned value.")
-                        contents.extend(['@{}'.format(i) for i in self.user_mentions])
-                        contents.extend(self.keywords)
-                        self.msg['text']['content'] = '\n'.join(contents)
-                        try:
-                            if self.secret:
-                                postto = self._construct_encrypted_url()
-                                requests.post(postto, json=self.msg)
-                            else:
-                                requests.post(self.webhook, json=self.msg)
-                        except:
-                            print('Unable to push message, please check network or configuration file')
+    def _event_payload(self, kind, event):
+        return self._payload(self._fit('\n'.join(self._event_contents(kind, event))), isAtAll=self.msg['at']['isAtAll'])
 
-                    return value
+    def _rate_limit_key(self):
+        return self.webhook
 
-                except Exception as ex:
-                    end_time = datetime.datetime.now()
-                    elapsed_time = end_time - start_time
-                    if self.crashmsg:
-                        contents = self.crashmsg
-                    else:
-                        contents = ['The script has crashed ☠️\n',
-                                    f'Machine name: {host_name}\n',
-                                    f'Task name: {self.taskname}\n',
-                                    f'Starting date: {start_time.strftime(DATE_FORMAT)}\n',
-                                    f'Crash date: {end_time.strftime(DATE_FORMAT)}\n',
-                                    f'Crashed running duration: {str(elapsed_time)}\n\n',
-                                    f'Here is the error:\n\n{ex}\n\n',
-                                    f'{traceback.format_exc()}']
-                    contents.extend(['@{}'.format(i) for i in self.user_mentions])
-                    contents.extend(self.keywords)
-                    self.msg['text']['content'] = '\n'.join(contents)
-                    try:
-                        if self.secret:
-                            postto = self._construct_encrypted_url()
-                            requests.post(postto, json=self.msg)
-                        else:
-                            requests.post(self.webhook, json=self.msg)
-                    except:
-                        print('Unable to push message, please check network or configuration file')
-                    raise ex
-
-            return wrapper_sender
-
-        return decorator_sender
+    def _request(self, payload):
+        # Sign at delivery time, a queued message may be sent long after it was created
+        if self.secret:
+            return self._construct_encrypted_url(), {'json': payload}
+        return self.webhook, {'json': payload}
 
     def push(self, contents, isAtAll=False):
         '''
@@ -185,15 +103,14 @@ class DingTalkNotificator:
         :param isAtAll:
         :return:
         '''
+        self.msg['at']['isAtAll'] = isAtAll
+        self._submit('\n'.join(contents), isAtAll=isAtAll)
+
+    def _payload(self, text, isAtAll=False):
+        contents = [text]
         contents.extend(['@{}'.format(i) for i in self.user_mentions])
         contents.extend(self.keywords)
-        self.msg['text']['content'] = '\n'.join(contents)
-        self.msg['at']['isAtAll'] = isAtAll
-        try:
-            if self.secret:
-                postto = self._construct_encrypted_url()
-                requests.post(postto, json=self.msg)
-            else:
-                requests.post(self.webhook, json=self.msg)
-        except:
-            print('Unable to push message, please check network or configuration file')
+        payload = copy.deepcopy(self.msg)
+        payload['text']['content'] = '\n'.join(contents)
+        payload['at']['isAtAll'] = isAtAll
+        return payload
@@ -0,0 +1,166 @@
+'''
+@Project : dongdong
+@File : DongdongHandler.py
+@Description : logging handler sending the warnings and errors of a program as periodic digests
+'''
+import os
+import copy
+import time
+import logging
+import threading
+from .BoundedRepr import truncate
+
+TIME_FORMAT = '%H:%M:%S'
+# Bytes of one record in a digest, its traceback included
+MAX_RECORD_BYTES = 2000
+
+_sending = threading.local()
+
+
+class DongdongHandler(logging.Handler):
+    def __init__(self, notificator, level=logging.WARNING, interval: float = 60, urgent_level=logging.CRITICAL,
+                 max_records: int = 1000, max_digest_records: int = 30, title: str = 'Log records'):
+        '''
+        Records are only counted in emit(), a background thread formats and pushes them every interval seconds,
+        so a log call never waits for the network. Records with the same logger, level, location and message
+        template are shown once with how many times they were logged.
+        logging.getLogger().addHandler(DongdongHandler(DingTalkNotificator()))
+        :param notificator: any notificator, or a MultiNotificator
+        :param level: records below this level are ignored
+        :param interval: seconds between two digests
+        :param urgent_level: a record at this level or above has the pending digest pushed right away
+        :param max_records: distinct records kept until the next digest, new ones are only counted beyond that
+        :param max_digest_records: distinct records shown in a digest, the most severe and frequent first,
+            the others are counted
+        :param title: title of the digests
+        '''
+        super().__init__(level)
+        self.notificator = notificator
+        self.interval = interval
+        self.urgent_level = urgent_level
+        self.max_records = max_records
+        self.max_digest_records = max_digest_records
+        self.title = title
+        self.setFormatter(logging.Formatter('%(levelname)s %(name)s: %(message)s'))
+        self._reset()
+
+    def _reset(self):
+        # A forked child does not inherit the worker thread, nor the records of its parent
+        self._pid = os.getpid()
+        self._pending = {}
+        self._dropped = 0
+        self._wake = threading.Event()
+        self._closed = False
+        self._worker = None
+
+    def emit(self, record: logging.LogRecord):
+        '''
+        Called with the handler lock held. Only the first record of a kind is kept, see _prepare,
+        the others are counted.
+        '''
+        # The notificators may log while a digest is being sent, those records must not come back here
+        if getattr(_sending, 'active', False):
+            return
+        if self._pid != os.getpid():
+            self._reset()
+        key = (record.name, record.levelno, record.pathname, record.lineno, str(record.msg))
+        entry = self._pending.get(key)
+        if entry is not None:
+            entry[1] += 1
+            entry[2] = record.created
+        elif len(self._pending) < self.max_records:
+            self._pending[key] = [self._prepare(record), 1, record.created]
+        else:
+            self._dropped += 1
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, name='dongdong-logging', daemon=True)
+            self._worker.start()
+        if record.levelno >= self.urgent_level:
+            self._wake.set()
+
+    def _prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        '''
+        A copy of record with its message merged with its arguments and its traceback formatted,
+        as logging.handlers.QueueHandler does: a pending record must neither keep the frames of an exception
+        and their locals alive, nor show arguments modified after the call.
+        '''
+        record = copy.copy(record)
+        try:
+            record.msg = record.getMessage()
+        except:
+            record.msg = str(record.msg)
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                try:
+                    record.exc_text = truncate(self.formatter.formatException(record.exc_info), MAX_RECORD_BYTES)
+                except:
+                    record.exc_text = None
+            record.exc_info = None
+        return record
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self._send_digest()
+
+    def _take(self):
+        self.acquire()
+        try:
+            entries, dropped = list(self._pending.values()), self._dropped
+            self._pending, self._dropped = {}, 0
+        finally:
+            self.release()
+        return entries, dropped
+
+    def _send_digest(self):
+        entries, dropped = self._take()
+        if not entries and not dropped:
+            return
+        _sending.active = True
+        try:
+            self.notificator._push_text(self.digest(entries, dropped), title=self.title)
+        except:
+            print('Unable to push the log records')
+        finally:
+            _sending.active = False
+
+    def digest(self, entries: list, dropped: int = 0) -> str:
+        '''
+        The text of a digest, the most severe and frequent records first, each with its count
+        and the time it was last seen.
+        :param entries: [record, count, time of the last one]
+        :param dropped: records that were not kept because max_records was reached
+        '''
+        entries = sorted(entries, key=lambda entry: (-entry[0].levelno, -entry[1], entry[0].created))
+        lines = []
+        for record, count, last in entries[:self.max_digest_records]:
+            try:
+                text = truncate(self.format(record), MAX_RECORD_BYTES)
+            except:
+                text = '%s %s: %s' % (record.levelname, record.name, record.msg)
+            line = '[%s] %s' % (time.strftime(TIME_FORMAT, time.localtime(record.created)), text)
+            if count > 1:
+                line += ' (x%d, last at %s)' % (count, time.strftime(TIME_FORMAT, time.localtime(last)))
+            lines.append(line)
+        skipped = entries[self.max_digest_records:]
+        if skipped:
+            lines.append('... and %d other records logged %d times' % (len(skipped),
+                                                                        sum(entry[1] for entry in skipped)))
+        if dropped:
+            lines.append('%d records were dropped, too many distinct records were logged' % dropped)
+        return '\n'.join(lines)
+
+    def flush(self):
+        '''
+        Push the pending records now, called by logging.shutdown() when the program exits.
+        '''
+        if self._pid == os.getpid() and self._worker is not None:
+            self._send_digest()
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        self.flush()
+        super().close()
@@ -0,0 +1,185 @@
+'''
+@Project : dongdong
+@File : Event.py
+@Description : The event of a monitored run, and the formatter turning it into the lines of the default messages
+'''
+import os
+import datetime
+import contextvars
+from .configure import DATE_FORMAT
+
+TITLES = {
+    'start': 'The script starts running 🎬',
+    'complete': 'The script is complete 🎉',
+    'crash': 'The script has crashed ☠️',
+    'interrupt': 'The script was stopped 🛑',
+    'stall': 'The script has stopped making progress ⏳',
+    'resume': 'The script is making progress again ▶️',
+}
+
+_host_metadata = None
+# The event of the monitored function running in this thread or asyncio task, progress trackers and metrics attach to it
+_current = contextvars.ContextVar('dongdong_event', default=None)
+
+
+def host_metadata() -> dict:
+    '''
+    Host name and rank of the process, they do not change while it runs so they are only read once.
+    The returned dict is shared, do not modify it.
+    '''
+    global _host_metadata
+    if _host_metadata is None:
+        import socket
+        host = socket.gethostname()
+        metadata = {'host': host, 'host_name': host, 'master_process': True}
+        if 'RANK' in os.environ:
+            metadata['master_process'] = (int(os.environ['RANK']) == 0)
+            metadata['host_name'] += ' - RANK: %s' % os.environ['RANK']
+        _host_metadata = metadata
+    return _host_metadata
+
+
+class Event:
+    __slots__ = ('start_time', 'end_time', 'host', 'host_name', 'master_process', 'value', 'value_text', 'error',
+                 'traceback', 'ranks', 'rendezvous', 'sampler', 'watchdog', 'trackers', 'resources', 'rank_summary',
+                 'metrics', 'command', 'output', 'repeat_window', 'suppressed', 'repeats', '_dates', '_token')
+
+    def __init__(self):
+        '''
+        Everything known about one run of a monitored function, built once and read by every notificator.
+        '''
+        metadata = host_metadata()
+        self.start_time = datetime.datetime.now()
+        self.end_time = None
+        self.host = metadata['host']
+        self.host_name = metadata['host_name']
+        self.master_process = metadata['master_process']
+        self.value = None
+        self.value_text = None
+        self.error = None
+        self.traceback = None
+        self.ranks = None
+        self.rendezvous = None
+        self.sampler = None
+        self.watchdog = None
+        self.trackers = []
+        # {notificator: MetricsHistory} of the metrics logged during the run
+        self.metrics = {}
+        self.resources = []
+        self.rank_summary = []
+        # Set when the run is a command started by `dongdong run`, output holds the last lines it printed
+        self.command = None
+        self.output = None
+        # Crash deduplication: repeats is (times the crash was suppressed, timestamp of its last report)
+        self.repeat_window = None
+        self.suppressed = False
+        self.repeats = None
+        self._dates = {}
+        self._token = None
+
+    def begin(self):
+        '''
+        Make the event the current one of the calling thread or asyncio task, until end() is called.
+        '''
+        self._token = _current.set(self)
+
+    def end(self):
+        self.end_time = datetime.datetime.now()
+        if self._token is not None:
+            try:
+                _current.reset(self._token)
+            except ValueError:
+                # Ended from another context, e.g. the event of install_shutdown at exit, there is nothing to restore
+                pass
+            self._token = None
+
+    @staticmethod
+    def current():
+        '''
+        The event of the innermost monitored function running in this thread or asyncio task, None if there is none.
+        Threads started by the function do not see it, tasks it creates do.
+        '''
+        return _current.get()
+
+    @property
+    def elapsed_time(self) -> datetime.timedelta:
+        return self.end_time - self.start_time
+
+    def date(self, name: str) -> str:
+        '''
+        start_time or end_time formatted with DATE_FORMAT, formatted once even if several notificators ask.
+        '''
+        text = self._dates.get(name)
+        if text is None:
+            text = self._dates[name] = getattr(self, name).strftime(DATE_FORMAT)
+        return text
+
+
+class EventFormatter:
+    def __init__(self, taskname: str = None):
+        '''
+        The lines that are the same for every event of a notificator are built here once,
+        contents() only formats the fields of the event.
+        :param taskname: task name of the notificator
+        '''
+        self.taskname = taskname
+        self._header = (f'Machine name: {host_metadata()["host_name"]}\n', f'Task name: {taskname}\n')
+
+    def contents(self, kind: str, event: Event):
+        '''
+        The title and the lines of the default start, complete, crash or interrupt message.
+        '''
+        lines = list(self._header)
+        if event.command is not None:
+            lines.append(f'Command: {event.command}\n')
+        lines.append(f'Starting date: {event.date("start_time")}')
+        if event.ranks is not None:
+            lines[-1] += '\n'
+            lines.append(f'World size: {event.ranks["world_size"]}')
+        if kind == 'start':
+            return TITLES[kind], lines
+        lines[-1] += '\n'
+        lines.extend(event.rank_summary)
+        progress = [tracker.summary_line() for tracker in event.trackers]
+        for history in event.metrics.values():
+            progress.extend(history.summary_lines())
+        if kind == 'complete':
+            lines.append(f'End date: {event.date("end_time")}\n'
+                         f'Running duration: {str(event.elapsed_time)}')
+            if progress or event.resources:
+                lines[-1] += '\n'
+                lines.extend(progress + event.resources)
+            return TITLES[kind], lines
+        if kind == 'interrupt':
+            lines.extend([f'Stop date: {event.date("end_time")}\n',
+                          f'Running duration: {str(event.elapsed_time)}\n\n'])
+            if progress or event.resources:
+                lines.extend(progress + event.resources)
+                lines[-1] += '\n'
+            lines.extend([f'Stopped by: {event.error}\n\n',
+                          f'It was running:\n\n{event.traceback}'])
+            return TITLES[kind], lines
+        lines.extend([f'Crash date: {event.date("end_time")}\n',
+                      f'Crashed running duration: {str(event.elapsed_time)}\n\n'])
+        if event.repeats is not None:
+            since = datetime.datetime.fromtimestamp(event.repeats[1]).strftime(DATE_FORMAT)
+            lines.append(f'Seen {event.repeats[0]} times since {since} without being reported\n\n')
+        if progress or event.resources:
+            lines.extend(progress + event.resources)
+            lines[-1] += '\n'
+        lines.extend([f'Here is the error:\n\n{event.error}\n\n',
+                      f'{event.traceback}'])
+        return TITLES[kind], lines
+
+    def stall_contents(self, event: Event, stalled: float, resumed: bool = False):
+        '''
+        The title and the lines of the watchdog messages, when the job stalls and when it resumes.
+        '''
+        lines = list(self._header)
+        lines.append(f'Starting date: {event.date("start_time")}\n')
+        duration = str(datetime.timedelta(seconds=round(stalled)))
+        if resumed:
+            lines.append(f'Stalled for: {duration}\n')
+            return TITLES['resume'], lines
+        lines.append(f'No heartbeat for: {duration}\n')
+        return TITLES['stall'], lines
@@ -0,0 +1,103 @@
+'''
+@Project : dongdong
+@File : HttpTransport.py
+@Description : Keep-alive HTTP sessions shared by every notificator in the process
+'''
+import os
+import threading
+from urllib.parse import urlsplit
+
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 10
+
+
+class HttpTransport:
+    def __init__(self, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT, read_timeout: float = DEFAULT_READ_TIMEOUT,
+                 pool_maxsize: int = 4):
+        '''
+        One requests.Session per scheme and host, so consecutive messages reuse the same TCP/TLS connection.
+        :param connect_timeout: seconds to wait for the connection to be established
+        :param read_timeout: seconds to wait for the server to answer
+        :param pool_maxsize: number of connections kept alive per host
+        '''
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.pool_maxsize = pool_maxsize
+        self._reset()
+
+    def _reset(self):
+        # Sockets must not be shared with the parent after a fork
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._sessions = {}
+
+    def session(self, url: str):
+        '''
+        The requests.Session of the host of url, requests is imported on first use.
+        '''
+        if self._pid != os.getpid():
+            self._reset()
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        session = self._sessions.get(key)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(key)
+                if session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+                    session = requests.Session()
+                    session.mount(parts.scheme + '://',
+                                  HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize))
+                    self._sessions[key] = session
+        return session
+
+    def post(self, url: str, data=None, json=None, headers: dict = None, timeout=None):
+        '''
+        Post to url through the pooled session of its host.
+        :param timeout: seconds, or a (connect, read) tuple, defaults to the timeouts of this transport
+        :return: the response, an exception is raised if the request failed or the status is not 2xx
+        '''
+        if timeout is None:
+            timeout = (self.connect_timeout, self.read_timeout)
+        response = self.session(url).post(url, data=data, json=json, headers=headers, timeout=timeout)
+        response.raise_for_status()
+        return response
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport() -> HttpTransport:
+    '''
+    The transport shared by every notificator in the process.
+    '''
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                _transport = HttpTransport()
+    return _transport
+
+
+def configure_transport(connect_timeout: float = None, read_timeout: float = None, pool_maxsize: int = None):
+    '''
+    Change the default timeouts and pool size of the shared transport.
+    :param connect_timeout: seconds to wait for the connection to be established
+    :param read_timeout: seconds to wait for the server to answer
+    :param pool_maxsize: number of connections kept alive per host, only applies to hosts not contacted yet
+    '''
+    transport = get_transport()
+    if connect_timeout is not None:
+        transport.connect_timeout = connect_timeout
+    if read_timeout is not None:
+        transport.read_timeout = read_timeout
+    if pool_maxsize is not None:
+        transport.pool_maxsize = pool_maxsize
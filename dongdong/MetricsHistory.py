@@ -0,0 +1,141 @@
+'''
+@Project : dongdong
+@File : MetricsHistory.py
+@Description : Scalar metrics logged per step, kept in typed arrays and summarized into a few lines
+'''
+import re
+import math
+import threading
+from array import array
+
+SPARK_CHARS = '▁▂▃▄▅▆▇█'
+SPARK_WIDTH = 24
+# Points kept per metric, beyond that neighbouring points are averaged two by two
+DEFAULT_CAPACITY = 4096
+# Metrics with one of these words in their name are better when lower, the others when higher
+MINIMIZED = frozenset(('loss', 'losses', 'err', 'error', 'errors', 'perplexity', 'ppl', 'mse', 'mae', 'rmse',
+                       'cer', 'wer'))
+
+
+def default_goal(name: str) -> str:
+    '''
+    'min' if a word of name is in MINIMIZED, e.g. val_loss, valLoss or top1-error, 'max' otherwise, e.g. power.
+    '''
+    # Words are split at anything but letters and at case changes, MSELoss gives MSE and Loss
+    words = re.findall(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+', name)
+    return 'min' if any(word.lower() in MINIMIZED for word in words) else 'max'
+
+
+def sparkline(values, width: int = SPARK_WIDTH) -> str:
+    '''
+    The values as a line of block characters, averaged into at most width buckets. NaN and inf are skipped.
+    '''
+    values = [value for value in values if math.isfinite(value)]
+    if not values:
+        return ''
+    if len(values) > width:
+        size = len(values) / width
+        values = [sum(values[int(i * size):int((i + 1) * size)]) / (int((i + 1) * size) - int(i * size))
+                  for i in range(width)]
+    low, high = min(values), max(values)
+    if high == low:
+        return SPARK_CHARS[len(SPARK_CHARS) // 2] * len(values)
+    scale = (len(SPARK_CHARS) - 1) / (high - low)
+    return ''.join(SPARK_CHARS[int((value - low) * scale + 0.5)] for value in values)
+
+
+def _number(value: float) -> str:
+    return '%.4g' % value
+
+
+class MetricSeries:
+    def __init__(self, name: str, goal: str = None, capacity: int = DEFAULT_CAPACITY):
+        '''
+        The steps and values of one metric in two typed arrays, 16 bytes per point and at most capacity points:
+        when full, neighbouring points are averaged two by two and later points are averaged by as many.
+        Last, min, max and best are tracked exactly over every point.
+        :param goal: 'min' or 'max', which values are best, see default_goal
+        '''
+        self.name = name
+        self.goal = goal or default_goal(name)
+        self.capacity = capacity
+        self.steps = array('q')
+        self.values = array('d')
+        self.count = 0
+        self.last = self.last_step = None
+        self.min = self.max = None
+        self.best = self.best_step = None
+        # Points averaged into one kept point, and the points of the one being averaged
+        self._stride = 1
+        self._pending = 0
+        self._pending_sum = 0.0
+
+    def add(self, step: int, value: float):
+        self.count += 1
+        self.last, self.last_step = value, step
+        if value == value:
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+            if self.best is None or (value < self.best if self.goal == 'min' else value > self.best):
+                self.best, self.best_step = value, step
+        self._pending += 1
+        self._pending_sum += value
+        if self._pending < self._stride:
+            return
+        self.steps.append(step)
+        self.values.append(self._pending_sum / self._pending)
+        self._pending, self._pending_sum = 0, 0.0
+        if len(self.values) >= self.capacity:
+            self._halve()
+
+    def _halve(self):
+        self.values = array('d', [(self.values[i] + self.values[i + 1]) / 2
+                                  for i in range(0, len(self.values) - 1, 2)])
+        self.steps = array('q', self.steps[1::2])
+        self._stride *= 2
+
+    def summary_line(self) -> str:
+        if self.best is None:
+            return f'{self.name}: last {_number(self.last)} (step {self.last_step})\n'
+        return (f'{self.name}: last {_number(self.last)} (step {self.last_step}), '
+                f'best {_number(self.best)} (step {self.best_step}), '
+                f'min {_number(self.min)}, max {_number(self.max)} {sparkline(self.values)}\n')
+
+
+class MetricsHistory:
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        '''
+        The series of every metric given to log(), by name.
+        :param capacity: points kept per metric
+        '''
+        self.capacity = capacity
+        self.series = {}
+        # {name: 'min' or 'max'} for the metrics whose name does not tell which values are best
+        self.goals = {}
+        # time.monotonic() of the last summary pushed every metrics_interval seconds
+        self.pushed = None
+        self._lock = threading.Lock()
+
+    def log(self, step: int, scalars: dict):
+        '''
+        :param scalars: {name: value}, values can be Python or NumPy numbers, or 0-d tensors
+        '''
+        with self._lock:
+            for name, value in scalars.items():
+                series = self.series.get(name)
+                if series is None:
+                    series = self.series[name] = MetricSeries(name, self.goals.get(name), self.capacity)
+                series.add(int(step), float(value))
+
+    def summary_lines(self) -> list:
+        with self._lock:
+            return [series.summary_line() for series in self.series.values()]
+
+    def nbytes(self) -> int:
+        '''
+        Memory used by the arrays of every series.
+        '''
+        return sum(series.steps.itemsize * len(series.steps) + series.values.itemsize * len(series.values)
+                   for series in self.series.values())
@@ -0,0 +1,119 @@
+'''
+@Project : dongdong
+@File : MultiNotificator.py
+@Description : Send the same messages to several notificators at once
+'''
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from .BaseNotificator import BaseNotificator
+
+
+def _map_threads(function, notificators: list) -> list:
+    '''
+    Call function(notificator) for every notificator, each in its own thread, and wait for all of them.
+    '''
+    results = [None] * len(notificators)
+    errors = [None] * len(notificators)
+
+    def call(index):
+        try:
+            results[index] = function(notificators[index])
+        except BaseException as ex:
+            errors[index] = ex
+
+    threads = [threading.Thread(target=call, args=(index,), name='dongdong-multi', daemon=True)
+               for index in range(len(notificators))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for error in errors:
+        if error is not None:
+            raise error
+    return results
+
+
+class MultiNotificator(BaseNotificator):
+    # The notificators count their own deliveries, there is no multi backend
+    COUNTED = False
+
+    def __init__(self, *notificators):
+        '''
+        This class sends every message to all the given notificators, in parallel,
+        so a message takes as long as the slowest channel instead of the sum of all channels.
+        :param notificators: notificator instances, e.g. BarkNotificator(), DingTalkNotificator()
+
+        The monitor() event (dates, duration, traceback) is built once and each notificator formats it,
+        so their own startmsg, completemsg and crashmsg still apply.
+        '''
+        super().__init__()
+        self.notificators = list(notificators)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _map(self, function):
+        '''
+        Call function(notificator) for every notificator on a thread pool and wait for all of them.
+        '''
+        if len(self.notificators) == 1:
+            return [function(self.notificators[0])]
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=len(self.notificators),
+                                                        thread_name_prefix='dongdong-multi')
+        futures = []
+        try:
+            for notificator in self.notificators:
+                futures.append(self._executor.submit(function, notificator))
+        except RuntimeError:
+            # The pool takes no work once the interpreter is shutting down, e.g. for messages sent at exit
+            rest = _map_threads(function, self.notificators[len(futures):])
+            wait(futures)
+            return [future.result() for future in futures] + rest
+        wait(futures)
+        return [future.result() for future in futures]
+
+    def _notify(self, kind, event):
+        self._map(lambda notificator: notificator._notify(kind, event))
+
+    def _stall_alert(self, event, stalled, stacks):
+        self._map(lambda notificator: notificator._stall_alert(event, stalled, stacks))
+
+    def _stall_resumed(self, event, stalled):
+        self._map(lambda notificator: notificator._stall_resumed(event, stalled))
+
+    def _push_text(self, text, title=None, important=False):
+        self._map(lambda notificator: notificator._push_text(text, title=title, important=important))
+
+    def push(self, contents, title: str = None):
+        '''
+        This function is used to push the same message to every notificator
+        :param contents: the message to push, str or string list
+        :param title: title of the push, notificators without titles show it on the first line
+        :return:
+        '''
+        if not isinstance(contents, str):
+            contents = '\n'.join(contents)
+        self._push_text(contents, title=title)
+
+    def stats(self) -> dict:
+        '''
+        Delivery statistics of the backends of the notificators, by backend, see dongdong.stats.
+        '''
+        return {notificator._stats.backend: notificator.stats() for notificator in self.notificators}
+
+    def flush(self, timeout: float = None) -> bool:
+        '''
+        Wait until every notificator has sent its pending messages.
+        :param timeout: seconds to wait at most, shared by all notificators
+        :return: True if nothing is left to send
+        '''
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        def flush_one(notificator):
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            return notificator.flush(remaining)
+
+        return all(self._map(flush_one))
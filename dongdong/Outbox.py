@@ -0,0 +1,135 @@
+'''
+@Project : dongdong
+@File : Outbox.py
+@Description : SQLite outbox keeping the messages that could not be sent, until they can be replayed
+'''
+import os
+import json
+import time
+import sqlite3
+import threading
+from contextlib import closing
+
+DEFAULT_MAX_MESSAGES = 10000
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+DEFAULT_MAX_AGE = 7 * 24 * 3600
+# Seconds a process owns the messages it is replaying before another process may take them over
+LEASE = 60
+
+_outboxes = {}
+_outboxes_lock = threading.Lock()
+
+
+def default_outbox_path() -> str:
+    cache = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache, 'dongdong', 'outbox.sqlite')
+
+
+class Outbox:
+    def __init__(self, path: str = None, max_messages: int = DEFAULT_MAX_MESSAGES, max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_age: float = DEFAULT_MAX_AGE):
+        '''
+        Unsent messages are stored with their backend and target, and replayed oldest first.
+        The file can be shared by many processes. When the limits are exceeded the oldest push() messages
+        are deleted first, then the oldest monitor() messages, and the freed pages are given back to the disk.
+        :param path: SQLite file, defaults to ~/.cache/dongdong/outbox.sqlite
+        :param max_messages: maximum number of stored messages
+        :param max_bytes: maximum total size of the stored payloads
+        :param max_age: seconds after which a stored message is discarded
+        '''
+        self.path = path or default_outbox_path()
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with closing(sqlite3.connect(self.path, timeout=30, isolation_level=None)) as conn:
+            # auto_vacuum only takes effect if it is set before the first table is created and before WAL is on
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS messages ('
+                         'id INTEGER PRIMARY KEY AUTOINCREMENT, backend TEXT NOT NULL, target TEXT NOT NULL, '
+                         'payload TEXT NOT NULL, important INTEGER NOT NULL, created REAL NOT NULL, '
+                         'attempts INTEGER NOT NULL DEFAULT 0, leased_until REAL NOT NULL DEFAULT 0)')
+            conn.execute('CREATE INDEX IF NOT EXISTS messages_target ON messages (backend, target, id)')
+            conn.execute('PRAGMA journal_mode = WAL')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def add(self, backend: str, target: str, payload, important: bool = False):
+        '''
+        Store a message that could not be sent.
+        :param backend: name of the notificator class
+        :param target: the webhook or URL the message is for
+        :param payload: JSON serializable payload, as passed to _deliver
+        :param important: the message comes from monitor(), it is kept longer when the outbox is full
+        '''
+        with closing(self._connect()) as conn:
+            conn.execute('INSERT INTO messages (backend, target, payload, important, created) VALUES (?, ?, ?, ?, ?)',
+                         (backend, target, json.dumps(payload), int(important), time.time()))
+            self._compact(conn)
+
+    def _compact(self, conn):
+        deleted = conn.execute('DELETE FROM messages WHERE created < ?', (time.time() - self.max_age,)).rowcount
+        count, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(LENGTH(payload)), 0) FROM messages').fetchone()
+        while count > self.max_messages or size > self.max_bytes:
+            excess = max(count - self.max_messages, count // 10, 1)
+            deleted += conn.execute('DELETE FROM messages WHERE id IN '
+                                    '(SELECT id FROM messages ORDER BY important, id LIMIT ?)', (excess,)).rowcount
+            count, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(LENGTH(payload)), 0) FROM messages').fetchone()
+        if deleted:
+            conn.execute('PRAGMA incremental_vacuum')
+
+    def claim(self, backend: str, target: str, limit: int = 100) -> list:
+        '''
+        Take the oldest messages of a target for replay, other processes will not get them until the lease expires.
+        :return: list of (id, payload, important)
+        '''
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = conn.execute('SELECT id, payload, important FROM messages '
+                                    'WHERE backend = ? AND target = ? AND leased_until < ? AND created >= ? '
+                                    'ORDER BY id LIMIT ?',
+                                    (backend, target, now, now - self.max_age, limit)).fetchall()
+                conn.executemany('UPDATE messages SET leased_until = ? WHERE id = ?',
+                                 [(now + LEASE, row[0]) for row in rows])
+                conn.execute('COMMIT')
+            except:
+                conn.execute('ROLLBACK')
+                raise
+        return [(id_, json.loads(payload), bool(important)) for id_, payload, important in rows]
+
+    def remove(self, id_: int):
+        with closing(self._connect()) as conn:
+            conn.execute('DELETE FROM messages WHERE id = ?', (id_,))
+
+    def release(self, ids: list):
+        '''
+        Give back messages that could not be replayed, counting the failed attempt.
+        '''
+        with closing(self._connect()) as conn:
+            conn.executemany('UPDATE messages SET leased_until = 0, attempts = attempts + 1 WHERE id = ?',
+                             [(id_,) for id_ in ids])
+
+    def count(self, backend: str = None, target: str = None) -> int:
+        query, params = 'SELECT COUNT(*) FROM messages', ()
+        if backend is not None:
+            query, params = query + ' WHERE backend = ? AND target = ?', (backend, target)
+        with closing(self._connect()) as conn:
+            return conn.execute(query, params).fetchone()[0]
+
+
+def get_outbox(path: str = None) -> Outbox:
+    '''
+    The outbox stored in path, shared by every notificator of the process.
+    '''
+    path = os.path.abspath(path or default_outbox_path())
+    outbox = _outboxes.get(path)
+    if outbox is None:
+        with _outboxes_lock:
+            outbox = _outboxes.get(path)
+            if outbox is None:
+                outbox = _outboxes[path] = Outbox(path)
+    return outbox
@@ -0,0 +1,170 @@
+'''
+@Project : dongdong
+@File : ProgressTracker.py
+@Description : Iterable wrapper measuring throughput and ETA, and pushing progress now and then
+'''
+import math
+import time
+import datetime
+
+# Seconds between two reads of the clock, the number of items between them adapts to the rate
+CHECK_INTERVAL = 0.5
+DEFAULT_EVERY_SECONDS = 600
+DEFAULT_EVERY_PERCENT = 10
+
+
+def format_rate(rate: float) -> str:
+    if rate >= 100:
+        return '%.0f' % rate
+    if rate >= 1:
+        return '%.1f' % rate
+    return '%.3f' % rate
+
+
+def _duration(seconds: float) -> str:
+    return str(datetime.timedelta(seconds=round(seconds)))
+
+
+class ProgressTracker:
+    def __init__(self, iterable, report, total: int = None, every=None, desc: str = None, smoothing: float = 0.3):
+        '''
+        Iterating over the tracker iterates over iterable. The clock is only read every few items,
+        as many as are expected in CHECK_INTERVAL seconds, so the cost per item is a counter increment.
+        :param report: callable taking the tracker, called when a progress message is due
+        :param total: number of items, defaults to len(iterable) if it has one
+        :param every: seconds between two progress messages, or a string such as '10%' for one message
+            every 10% of total. Defaults to every 10% if the total is known, every 10 minutes otherwise.
+        :param desc: name of the loop, shown in the messages
+        :param smoothing: weight of the latest measurement in the exponentially weighted rate
+        '''
+        self.iterable = iterable
+        self.report = report
+        if total is None:
+            try:
+                total = len(iterable)
+            except:
+                total = None
+        self.total = total
+        if every is None:
+            every = '%d%%' % DEFAULT_EVERY_PERCENT if total else DEFAULT_EVERY_SECONDS
+        self.every_percent = None
+        self.every_seconds = None
+        if isinstance(every, str) and every.endswith('%'):
+            if not total:
+                raise ValueError('every=%r needs the total number of items' % every)
+            self.every_percent = float(every[:-1])
+        else:
+            self.every_seconds = float(every)
+        self.desc = desc
+        self.smoothing = smoothing
+        self.n = 0
+        self.rate = None
+        self.start_time = None
+        self.end_time = None
+        self._last_time = None
+        self._last_n = 0
+        self._last_report = None
+        self._next_report_n = None
+        self._stride = 1
+
+    def __len__(self):
+        # list() and the like only ask for a hint, they ignore a TypeError and size themselves as they go
+        if self.total is None:
+            raise TypeError('the number of items tracked is unknown, pass total')
+        return self.total
+
+    def __bool__(self):
+        # Not from __len__, a tracker is true even if its length is unknown, or 0
+        return True
+
+    def __iter__(self):
+        self.start_time = self._last_time = self._last_report = time.monotonic()
+        self._next_report_n = self._percent_target(0)
+        n = self.n
+        next_check = n + 1
+        try:
+            for item in self.iterable:
+                yield item
+                n += 1
+                if n >= next_check:
+                    self.n = n
+                    next_check = self._check()
+        finally:
+            self.n = n
+            self.end_time = time.monotonic()
+
+    def _percent_target(self, n: int) -> int:
+        '''
+        The item count of the next percent step after n, None if messages are time based.
+        '''
+        if self.every_percent is None:
+            return None
+        if n >= self.total:
+            return math.inf
+        step = self.total * self.every_percent / 100
+        return min(math.ceil((math.floor(n / step) + 1) * step), self.total)
+
+    def _check(self) -> int:
+        '''
+        Update the rate, report if it is time, and return the item count of the next check.
+        '''
+        now = time.monotonic()
+        elapsed = now - self._last_time
+        if elapsed > 0:
+            rate = (self.n - self._last_n) / elapsed
+            self.rate = rate if self.rate is None else self.smoothing * rate + (1 - self.smoothing) * self.rate
+            self._last_time = now
+            self._last_n = self.n
+        if self._next_report_n is not None:
+            if self.n >= self._next_report_n:
+                self._report(now)
+                self._next_report_n = self._percent_target(self.n)
+        elif now - self._last_report >= self.every_seconds:
+            self._report(now)
+        # Items expected in CHECK_INTERVAL seconds, growing at most twofold so a fast start cannot hide a slowdown
+        self._stride = min(max(int((self.rate or 0) * CHECK_INTERVAL), 1), 2 * self._stride)
+        next_check = self.n + self._stride
+        if self._next_report_n is not None and self._next_report_n > self.n:
+            next_check = min(next_check, self._next_report_n)
+        return next_check
+
+    def _report(self, now: float):
+        self._last_report = now
+        try:
+            self.report(self)
+        except:
+            print('Unable to push the progress message')
+
+    @property
+    def elapsed(self) -> float:
+        if self.start_time is None:
+            return 0.0
+        return (self.end_time or time.monotonic()) - self.start_time
+
+    @property
+    def eta(self) -> float:
+        '''
+        Seconds left according to the smoothed rate, None if unknown.
+        '''
+        if not self.total or not self.rate:
+            return None
+        return max(self.total - self.n, 0) / self.rate
+
+    def progress_line(self) -> str:
+        if self.total:
+            line = f'{self.n}/{self.total} ({self.n / self.total:.0%})'
+        else:
+            line = f'{self.n} items'
+        line += f', {format_rate(self.rate or 0)} items/s, elapsed {_duration(self.elapsed)}'
+        if self.eta is not None:
+            line += f', ETA {_duration(self.eta)}'
+        return line
+
+    def summary_line(self) -> str:
+        '''
+        Average throughput over the whole loop, for the complete and crash messages of monitor().
+        '''
+        name = f' of {self.desc}' if self.desc else ''
+        rate = self.n / self.elapsed if self.elapsed > 0 else 0
+        total = f'/{self.total}' if self.total and self.n != self.total else ''
+        return f'Throughput{name}: {format_rate(rate)} items/s over {self.n}{total} items\n'
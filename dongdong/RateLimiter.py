@@ -0,0 +1,98 @@
+'''
+@Project : dongdong
+@File : RateLimiter.py
+@Description : Token buckets keyed by endpoint, shared by every notificator in the process
+'''
+import time
+import threading
+
+NORMAL = 0
+HIGH = 1
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+class TokenBucket:
+    def __init__(self, rate: int, per: float, reserve: int = 1):
+        '''
+        Allow `rate` messages every `per` seconds, with bursts up to `rate` messages.
+        :param rate: number of messages
+        :param per: length of the period in seconds
+        :param reserve: tokens that only HIGH priority messages may use,
+            so a burst of pushes never leaves the crash message waiting
+        '''
+        self._cond = threading.Condition()
+        self._high_waiting = 0
+        self.configure(rate, per, reserve)
+        self._tokens = float(self.capacity)
+
+    def configure(self, rate: int, per: float, reserve: int = 1):
+        with self._cond:
+            self.capacity = max(int(rate), 1)
+            self.per = per
+            self.reserve = min(reserve, self.capacity - 1)
+            self._fill_rate = self.capacity / per
+            self._updated = time.monotonic()
+            self._cond.notify_all()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self._fill_rate)
+        self._updated = now
+
+    def acquire(self, priority: int = NORMAL, timeout: float = None) -> bool:
+        '''
+        Wait until a message may be sent.
+        HIGH priority callers are served before every NORMAL caller and may use the reserved tokens.
+        :param priority: NORMAL or HIGH
+        :param timeout: seconds to wait at most, None waits as long as needed
+        :return: False if no token was available in time
+        '''
+        deadline = None if timeout is None else time.monotonic() + timeout
+        floor = 0 if priority == HIGH else self.reserve
+        with self._cond:
+            if priority == HIGH:
+                self._high_waiting += 1
+            try:
+                while True:
+                    self._refill()
+                    blocked = priority != HIGH and self._high_waiting
+                    if not blocked and self._tokens - 1 >= floor:
+                        self._tokens -= 1
+                        return True
+                    # A blocked caller is woken up when the HIGH caller leaves
+                    wait = None if blocked else (floor + 1 - self._tokens) / self._fill_rate
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return False
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._cond.wait(wait)
+            finally:
+                if priority == HIGH:
+                    self._high_waiting -= 1
+                    self._cond.notify_all()
+
+
+def get_limiter(key: str, rate: int, per: float) -> TokenBucket:
+    '''
+    The bucket of an endpoint, created on first use, every notificator posting to `key` shares it.
+    '''
+    limiter = _limiters.get(key)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(key)
+            if limiter is None:
+                limiter = _limiters[key] = TokenBucket(rate, per)
+    return limiter
+
+
+def set_rate_limit(key: str, rate: int, per: float):
+    '''
+    Change the limit of an endpoint for the whole process.
+    :param key: the webhook URL, or the Bark URL https://api.day.app/yourtoken
+    :param rate: number of messages
+    :param per: length of the period in seconds
+    '''
+    get_limiter(key, rate, per).configure(rate, per)
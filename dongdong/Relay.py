@@ -0,0 +1,255 @@
+'''
+@Project : dongdong
+@File : Relay.py
+@Description : Relay daemon sending the messages of every process of a host, and the client handing them to it
+'''
+import os
+import time
+import functools
+import threading
+
+# Seconds before trying the relay again once it could not be reached, messages are sent directly meanwhile
+RELAY_RETRY = 10
+# Larger messages are sent directly, a datagram has to fit in the socket buffer
+MAX_DATAGRAM = 200 * 1024
+# Seconds a message waits for room in the queue of the relay socket, which only holds a few datagrams
+SEND_TIMEOUT = 0.05
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 2
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def default_relay_path(fallback: bool = True) -> str:
+    '''
+    $DONGDONG_RELAY, or dongdong-relay.sock in $XDG_RUNTIME_DIR, or a socket of the user in the temp directory.
+    :param fallback: if False, None instead of the socket in the temp directory, where any user can create it first
+    '''
+    if os.environ.get('DONGDONG_RELAY'):
+        return os.environ['DONGDONG_RELAY']
+    if os.environ.get('XDG_RUNTIME_DIR'):
+        return os.path.join(os.environ['XDG_RUNTIME_DIR'], 'dongdong-relay.sock')
+    if not fallback:
+        return None
+    import tempfile
+    uid = os.getuid() if hasattr(os, 'getuid') else 0
+    return os.path.join(tempfile.gettempdir(), 'dongdong-relay-%d.sock' % uid)
+
+
+class RelayClient:
+    def __init__(self, path: str = None):
+        '''
+        Hand messages to the relay listening on path, one datagram each, without waiting for it to send them.
+        :param path: socket of the relay, see default_relay_path
+        '''
+        self.path = path or default_relay_path()
+        self._reset()
+
+    def _reset(self):
+        # A forked child opens its own socket
+        self._pid = os.getpid()
+        self._sock = None
+        self._retry_at = 0
+        self._warned = False
+
+    def submit(self, request: dict) -> bool:
+        '''
+        :param request: url, data, json, headers and timeout of the POST, the key and rate_limit of the endpoint,
+            and important for the monitor() messages
+        :return: False if the relay did not take the message, it has to be sent directly
+        '''
+        if self._pid != os.getpid():
+            self._reset()
+        if time.monotonic() < self._retry_at:
+            return False
+        import json
+        try:
+            data = json.dumps(request).encode('utf-8')
+        except (TypeError, ValueError):
+            return False
+        if len(data) > MAX_DATAGRAM:
+            return False
+        if not self._trusted():
+            self._retry_at = time.monotonic() + RELAY_RETRY
+            return False
+        import socket
+        try:
+            if self._sock is None:
+                self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+                self._sock.settimeout(SEND_TIMEOUT)
+            self._sock.sendto(data, self.path)
+        except (BlockingIOError, socket.timeout):
+            # The relay is behind, this one message is sent directly
+            return False
+        except OSError:
+            self._retry_at = time.monotonic() + RELAY_RETRY
+            return False
+        return True
+
+    def _trusted(self) -> bool:
+        '''
+        Whether the socket was created by this user and only this user can write to it:
+        the messages hold the webhook tokens, they must not go to a socket another user put there.
+        '''
+        import stat
+        try:
+            st = os.lstat(self.path)
+        except OSError:
+            return False
+        if not stat.S_ISSOCK(st.st_mode):
+            return False
+        if (hasattr(os, 'getuid') and st.st_uid != os.getuid()) or st.st_mode & 0o022:
+            if not self._warned:
+                self._warned = True
+                print('Not using the relay socket %s, it belongs to another user or others can write to it'
+                      % self.path)
+            return False
+        return True
+
+
+def get_relay(path: str = None) -> RelayClient:
+    '''
+    The client of a relay socket, shared by every notificator of the process.
+    '''
+    path = path or default_relay_path()
+    client = _clients.get(path)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(path)
+            if client is None:
+                client = _clients[path] = RelayClient(path)
+    return client
+
+
+def find_relay(relay=None) -> RelayClient:
+    '''
+    The relay client for the relay argument of a notificator, None if messages are sent directly.
+    :param relay: None uses the socket of $DONGDONG_RELAY or $XDG_RUNTIME_DIR if one is set, True also the socket
+        in the temp directory, a path uses that socket, False uses no relay
+    '''
+    if relay is False:
+        return None
+    if relay is None or relay is True:
+        path = default_relay_path(fallback=relay is True)
+        return get_relay(path) if path else None
+    return get_relay(relay)
+
+
+class RelayServer:
+    def __init__(self, path: str = None, max_attempts: int = MAX_ATTEMPTS, retry_delay: float = RETRY_DELAY,
+                 queue_size: int = 1000):
+        '''
+        Receive the messages of the notificators of this host and send them with one pool of connections,
+        one rate limit per webhook and retries. Messages to one webhook are sent in order by one thread,
+        the monitor() messages first.
+        :param path: socket to listen on, see default_relay_path. Only the user running the relay can use it.
+        :param max_attempts: times a message is sent before it is given up
+        :param retry_delay: seconds before the second attempt, doubled for every further attempt
+        :param queue_size: pending messages per webhook, the oldest push() messages are dropped beyond that
+        '''
+        self.path = path or default_relay_path()
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.queue_size = queue_size
+        self.received = 0
+        self.sent = 0
+        self.failed = 0
+        self._queues = {}
+        self._sock = None
+        self._closed = False
+
+    def bind(self):
+        import socket
+        if os.path.exists(self.path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            try:
+                probe.connect(self.path)
+            except OSError:
+                # Left behind by a relay that did not exit cleanly
+                os.unlink(self.path)
+            else:
+                raise RuntimeError('A relay is already listening on %s' % self.path)
+            finally:
+                probe.close()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        umask = os.umask(0o177)
+        try:
+            sock.bind(self.path)
+        finally:
+            os.umask(umask)
+        self._sock = sock
+        return self
+
+    def serve_forever(self):
+        import json
+        if self._sock is None:
+            self.bind()
+        while not self._closed:
+            try:
+                data = self._sock.recv(MAX_DATAGRAM)
+            except OSError:
+                if self._closed:
+                    break
+                raise
+            try:
+                self.dispatch(json.loads(data.decode('utf-8')))
+            except:
+                print('The relay received a malformed message')
+
+    def dispatch(self, request: dict):
+        from .DeliveryQueue import DeliveryQueue
+        self.received += 1
+        key = request.get('key') or request['url']
+        queue = self._queues.get(key)
+        if queue is None:
+            from .DeliveryStats import get_stats, watch_queue
+            stats = get_stats(request.get('backend') or 'relay')
+            queue = self._queues[key] = DeliveryQueue(self._deliver, maxsize=self.queue_size,
+                                                      on_drop=functools.partial(stats.count, 'dropped'))
+            watch_queue(stats.backend, queue)
+        queue.put(request, urgent=bool(request.get('important')))
+
+    def _deliver(self, request: dict):
+        from .HttpTransport import get_transport
+        from .RateLimiter import get_limiter, NORMAL, HIGH
+        from .DeliveryStats import get_stats
+        stats = get_stats(request.get('backend') or 'relay')
+        if request.get('rate_limit'):
+            limiter = get_limiter(request.get('key') or request['url'], *request['rate_limit'])
+            limiter.acquire(HIGH if request.get('important') else NORMAL)
+        timeout = request.get('timeout')
+        for attempt in range(self.max_attempts):
+            if attempt:
+                stats.count('retried')
+            start = time.perf_counter()
+            try:
+                get_transport().post(request['url'], data=request.get('data'), json=request.get('json'),
+                                     headers=request.get('headers'),
+                                     timeout=tuple(timeout) if isinstance(timeout, list) else timeout)
+            except:
+                if attempt + 1 < self.max_attempts:
+                    time.sleep(self.retry_delay * 2 ** attempt)
+                continue
+            stats.observe(time.perf_counter() - start)
+            self.sent += 1
+            return
+        stats.count('failed')
+        self.failed += 1
+        print('Unable to push message after %d attempts, please check network or configuration file'
+              % self.max_attempts)
+
+    def close(self, timeout: float = 10):
+        '''
+        Stop receiving, send what is pending within timeout seconds and remove the socket.
+        '''
+        self._closed = True
+        if self._sock is not None:
+            self._sock.close()
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+        deadline = time.monotonic() + timeout
+        for queue in list(self._queues.values()):
+            queue.flush(max(deadline - time.monotonic(), 0))
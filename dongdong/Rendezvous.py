@@ -0,0 +1,147 @@
+'''
+@Project : dongdong
+@File : Rendezvous.py
+@Description : Collect the outcome of every rank of a distributed job through a shared directory
+'''
+import os
+import re
+import json
+import time
+import shutil
+import tempfile
+
+POLL_INTERVAL = 0.5
+
+
+def rank_info() -> dict:
+    '''
+    Rank, local rank and world size as set by torchrun, torch.distributed.launch, deepspeed, ...
+    '''
+    rank = int(os.environ.get('RANK', 0))
+    return {
+        'rank': rank,
+        'local_rank': int(os.environ.get('LOCAL_RANK', rank)),
+        'world_size': int(os.environ.get('WORLD_SIZE', 1)),
+    }
+
+
+def default_rendezvous_dir() -> str:
+    '''
+    A directory named after the job, it is only shared by the ranks of one machine unless
+    DONGDONG_RENDEZVOUS_DIR points to a shared file system.
+    Without a job id, the ranks of a job are told apart from those of the other jobs of the machine by
+    the master address and port, and by their parent, the launcher that started them.
+    '''
+    if os.environ.get('DONGDONG_RENDEZVOUS_DIR'):
+        return os.environ['DONGDONG_RENDEZVOUS_DIR']
+    run_id = os.environ.get('TORCHELASTIC_RUN_ID')
+    # torchrun sets it to 'none' unless it runs standalone or is given --rdzv-id, for every job alike
+    if run_id == 'none':
+        run_id = None
+    job = (run_id or os.environ.get('SLURM_JOB_ID') or
+           '%s-%s-%d' % (os.environ.get('MASTER_ADDR', 'localhost'), os.environ.get('MASTER_PORT', '0'), os.getppid()))
+    return os.path.join(tempfile.gettempdir(), 'dongdong-rendezvous', re.sub(r'[^\w.-]', '_', job))
+
+
+class FileRendezvous:
+    def __init__(self, directory: str, rank: int, world_size: int):
+        '''
+        Each rank writes its outcome to rank-<rank>.json in directory, rank 0 reads them all.
+        :param directory: a directory every rank can reach
+        :param rank: rank of this process
+        :param world_size: number of ranks
+        '''
+        self.directory = directory
+        self.rank = rank
+        self.world_size = world_size
+
+    def _path(self, rank: int, suffix: str = 'json') -> str:
+        return os.path.join(self.directory, 'rank-%d.%s' % (rank, suffix))
+
+    def report(self, outcome: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(self.rank)
+        # Written under a temporary name and renamed, so rank 0 never reads a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.rank-%d.' % self.rank)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(outcome, f)
+        os.replace(tmp_path, path)
+
+    def collect(self, timeout: float, since: float = 0) -> dict:
+        '''
+        Wait until every rank has reported, or timeout. Each report read is acknowledged, see wait_collected.
+        :param timeout: seconds to wait at most
+        :param since: ignore the reports of ranks that ended before this timestamp, left by a previous run
+        :return: {rank: outcome}
+        '''
+        deadline = time.monotonic() + timeout
+        outcomes = {}
+        while True:
+            for rank in range(self.world_size):
+                if rank in outcomes:
+                    continue
+                try:
+                    with open(self._path(rank)) as f:
+                        outcome = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                if outcome['end'] >= since:
+                    outcomes[rank] = outcome
+                    try:
+                        open(self._path(rank, 'collected'), 'w').close()
+                    except OSError:
+                        pass
+            if len(outcomes) == self.world_size or time.monotonic() >= deadline:
+                return outcomes
+            time.sleep(POLL_INTERVAL)
+
+    def wait_collected(self, timeout: float) -> bool:
+        '''
+        Wait until rank 0 has read the report of this rank, or timeout.
+        :return: False if it was not read in time, rank 0 may be stuck in a collective operation or killed
+        '''
+        deadline = time.monotonic() + timeout
+        while True:
+            # The report is gone once rank 0 has sent the summary and removed the directory
+            if os.path.exists(self._path(self.rank, 'collected')) or not os.path.exists(self._path(self.rank)):
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(POLL_INTERVAL)
+
+    def cleanup(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def _ranges(ranks: list) -> str:
+    '''
+    [0, 1, 2, 5, 7, 8] -> '0-2, 5, 7-8'
+    '''
+    parts = []
+    for rank in sorted(ranks):
+        if parts and parts[-1][1] == rank - 1:
+            parts[-1][1] = rank
+        else:
+            parts.append([rank, rank])
+    return ', '.join(str(a) if a == b else '%d-%d' % (a, b) for a, b in parts)
+
+
+def summarize(outcomes: dict, world_size: int):
+    '''
+    :return: the summary lines and the outcome of the first rank that crashed, None if none crashed
+    '''
+    complete = [rank for rank, outcome in outcomes.items() if outcome['status'] == 'complete']
+    failed = sorted((outcome for outcome in outcomes.values() if outcome['status'] != 'complete'),
+                    key=lambda outcome: outcome['end'])
+    missing = [rank for rank in range(world_size) if rank not in outcomes]
+    lines = [f'Ranks complete: {len(complete)}/{world_size}\n']
+    # Ranks failing with the same error are listed together, a crash usually takes many ranks down at once
+    errors = {}
+    for outcome in failed:
+        errors.setdefault(outcome['error'], []).append(outcome)
+    for error, group in errors.items():
+        hosts = sorted(set(outcome['host'] for outcome in group))
+        lines.append(f'Rank {_ranges([outcome["rank"] for outcome in group])} ({", ".join(hosts)}) failed: {error}\n')
+    if missing:
+        lines.append(f'No report from rank {_ranges(missing)}\n')
+    return lines, (failed[0] if failed else None)
@@ -0,0 +1,143 @@
+'''
+@Project : dongdong
+@File : ResourceSampler.py
+@Description : Background sampler of the resources used by the process, read from /proc
+'''
+import os
+import sys
+import time
+import threading
+from array import array
+
+# CPU time the sampler may use, as a fraction of one core, before it samples less often
+OVERHEAD_BUDGET = 0.001
+FIELDS = ('time', 'cpu', 'rss', 'threads', 'read_bytes', 'write_bytes', 'load')
+
+
+def _size(n: float) -> str:
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if abs(n) < 1024:
+            return '%.1f %s' % (n, unit)
+        n /= 1024
+    return '%.1f TiB' % n
+
+
+class ResourceSampler:
+    def __init__(self, interval: float = 5, capacity: int = 720):
+        '''
+        Every `interval` seconds the sampler reads CPU time, RSS, peak RSS, threads, I/O bytes and load average
+        into a ring buffer of `capacity` samples, preallocated so sampling never allocates per sample.
+        On systems without /proc, only CPU time and peak RSS are available, from getrusage.
+        :param interval: seconds between two samples
+        :param capacity: number of samples kept, the oldest are overwritten
+        '''
+        self.interval = interval
+        self.capacity = capacity
+        self._ring = {name: array('d', bytes(8 * capacity)) for name in FIELDS}
+        self._count = 0
+        self._first = None
+        self._peak_rss = 0
+        self._overhead = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self._proc = os.path.exists('/proc/self/stat')
+        self._ticks = os.sysconf('SC_CLK_TCK') if self._proc else 100
+
+    def start(self):
+        self._first = self._read()
+        self._started = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name='dongdong-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.interval + 1)
+        self._record(self._read())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            begin = time.thread_time()
+            self._record(self._read())
+            self._overhead += time.thread_time() - begin
+            elapsed = time.monotonic() - self._started
+            if elapsed and self._overhead / elapsed > OVERHEAD_BUDGET:
+                self.interval *= 2
+
+    def _read(self) -> tuple:
+        if not self._proc:
+            import resource
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            peak = usage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+            return time.monotonic(), usage.ru_utime + usage.ru_stime, 0, 0, 0, 0, 0, peak
+        with open('/proc/self/stat', 'rb') as f:
+            stat = f.read()
+        # The command name may contain spaces, the fields start after its closing parenthesis
+        fields = stat[stat.rindex(b')') + 2:].split()
+        cpu = (int(fields[11]) + int(fields[12])) / self._ticks
+        threads = int(fields[17])
+        rss = peak = 0
+        with open('/proc/self/status', 'rb') as f:
+            for line in f:
+                if line.startswith(b'VmRSS:'):
+                    rss = int(line.split()[1]) * 1024
+                elif line.startswith(b'VmHWM:'):
+                    peak = int(line.split()[1]) * 1024
+        read_bytes = write_bytes = 0
+        try:
+            with open('/proc/self/io', 'rb') as f:
+                for line in f:
+                    if line.startswith(b'read_bytes:'):
+                        read_bytes = int(line.split()[1])
+                    elif line.startswith(b'write_bytes:'):
+                        write_bytes = int(line.split()[1])
+        except OSError:
+            pass
+        with open('/proc/loadavg', 'rb') as f:
+            load = float(f.read().split()[0])
+        return time.monotonic(), cpu, rss, threads, read_bytes, write_bytes, load, peak
+
+    def _record(self, sample: tuple):
+        index = self._count % self.capacity
+        for name, value in zip(FIELDS, sample):
+            self._ring[name][index] = value
+        self._peak_rss = max(self._peak_rss, sample[-1], sample[2])
+        self._count += 1
+
+    def samples(self) -> dict:
+        '''
+        The samples kept in the ring buffer, oldest first, as {field: list}.
+        '''
+        n = min(self._count, self.capacity)
+        start = self._count - n
+        return {name: [ring[(start + i) % self.capacity] for i in range(n)] for name, ring in self._ring.items()}
+
+    def summary(self) -> dict:
+        if self._first is None or not self._count:
+            return {}
+        last = self._count - 1
+        samples = self.samples()
+        wall = self._ring['time'][last % self.capacity] - self._first[0]
+        cpu = self._ring['cpu'][last % self.capacity] - self._first[1]
+        return {
+            'peak_rss': self._peak_rss,
+            'cpu_utilization': cpu / wall if wall > 0 else 0.0,
+            'max_threads': max(samples['threads']),
+            'read_bytes': self._ring['read_bytes'][last % self.capacity] - self._first[4],
+            'write_bytes': self._ring['write_bytes'][last % self.capacity] - self._first[5],
+            'max_load': max(samples['load']),
+            'samples': self._count,
+            'overhead': self._overhead / wall if wall > 0 else 0.0,
+        }
+
+    def summary_lines(self) -> list:
+        summary = self.summary()
+        if not summary:
+            return []
+        lines = [f'Peak memory: {_size(summary["peak_rss"])}, mean CPU: {summary["cpu_utilization"]:.0%}\n']
+        if self._proc:
+            lines.append(f'Threads: {summary["max_threads"]:.0f}, load average: {summary["max_load"]:.2f}, '
+                         f'I/O: {_size(summary["read_bytes"])} read, {_size(summary["write_bytes"])} written\n')
+        lines.append(f'Telemetry: {summary["samples"]} samples, {summary["overhead"]:.4%} CPU\n')
+        return lines
@@ -0,0 +1,215 @@
+'''
+@Project : dongdong
+@File : ShutdownHandlers.py
+@Description : Opt-in signal handlers and excepthook reporting preemptions, and flushing within a deadline at exit
+'''
+import os
+import sys
+import time
+import atexit
+import threading
+from .BoundedRepr import truncate, MAX_TRACEBACK_BYTES
+from .DeliveryQueue import set_exit_deadline
+
+DEFAULT_SIGNALS = ('SIGTERM', 'SIGINT', 'SIGHUP')
+# Seconds left to report and flush once the process is told to stop, keep it below the grace period
+DEFAULT_DEADLINE = 10
+
+_pid = None
+_notificator = None
+_event = None
+_budget = DEFAULT_DEADLINE
+_deadline = None
+_previous = {}
+_handled = set()
+_previous_excepthook = None
+# Name of the signal the process was stopped by, and where it was running when it came
+_signame = None
+_stack = None
+_reported = False
+
+
+class ShutdownSignal(SystemExit):
+    def __init__(self, signum: int):
+        '''
+        Raised in the main thread by the installed handlers when SIGTERM or SIGHUP comes, SIGINT raises
+        KeyboardInterrupt as usual. The exit status is 128 + the signal number, as for a process killed by it.
+        '''
+        import signal
+        super().__init__(128 + signum)
+        self.signame = signal.Signals(signum).name
+
+    def __str__(self):
+        return self.signame
+
+
+def installed() -> bool:
+    return _pid == os.getpid()
+
+
+def install_shutdown(notificator=None, deadline: float = DEFAULT_DEADLINE, signals=DEFAULT_SIGNALS,
+                     excepthook: bool = True):
+    '''
+    Report the jobs stopped by a signal, e.g. preempted by Slurm or Kubernetes with SIGTERM, and bound the time
+    spent on notifications once they are told to stop. Call it once, from the main thread.
+    When one of signals comes, SIGTERM and SIGHUP raise ShutdownSignal (a SystemExit) in the main thread
+    and SIGINT raises KeyboardInterrupt: the monitored functions it goes through push an interrupt message
+    instead of nothing, and the messages still queued are sent in parallel at exit, all within deadline seconds.
+    Signals the program handles itself are passed on to its handlers, the stop is then reported at exit.
+    :param notificator: also push a crash message for an uncaught exception, and an interrupt message at exit
+        if no monitored function reported the signal, e.g. for scripts without monitor()
+    :param deadline: seconds the process may spend reporting and flushing after the signal,
+        or after an uncaught exception
+    :param signals: names of the signals handled, those not available on the platform or ignored are skipped
+    :param excepthook: install sys.excepthook, only used with a notificator
+    '''
+    global _pid, _notificator, _event, _budget, _previous_excepthook
+    # signal imports enum, it is only imported once the handlers are installed
+    import signal
+    _budget = deadline
+    for name in signals:
+        signum = getattr(signal, name, None)
+        if signum is None or signum in _previous:
+            continue
+        previous = signal.getsignal(signum)
+        if previous == signal.SIG_IGN:
+            continue
+        _previous[signum] = previous
+        _handled.add(name)
+        signal.signal(signum, _handle_signal)
+    if notificator is not None:
+        from .Event import Event
+        _notificator = notificator
+        if _event is None:
+            _event = Event()
+            _event.begin()
+        if excepthook and _previous_excepthook is None:
+            _previous_excepthook = sys.excepthook
+            sys.excepthook = _excepthook
+    if _pid is None:
+        atexit.register(_report_at_exit)
+    _pid = os.getpid()
+
+
+def _start_deadline():
+    global _deadline
+    if _deadline is None:
+        _deadline = time.monotonic() + _budget
+        set_exit_deadline(_deadline)
+
+
+def remaining() -> float:
+    '''
+    Seconds left before the deadline, which starts the first time it is asked for.
+    '''
+    _start_deadline()
+    return max(_deadline - time.monotonic(), 0)
+
+
+def _handle_signal(signum, frame):
+    global _signame, _stack
+    import signal
+    previous = _previous.get(signum)
+    if os.getpid() != _pid:
+        # A forked child, such as a DataLoader worker, stops the way it did before
+        _pass_on(signum, frame, previous)
+        return
+    if _signame is not None:
+        # Already stopping, pressing Ctrl-C again interrupts the reporting and the flush
+        if signum == signal.SIGINT:
+            raise KeyboardInterrupt
+        return
+    import traceback
+    _signame = signal.Signals(signum).name
+    _stack = truncate(''.join(traceback.format_stack(frame)), MAX_TRACEBACK_BYTES)
+    _start_deadline()
+    if callable(previous) and previous is not signal.default_int_handler:
+        previous(signum, frame)
+    elif signum == signal.SIGINT:
+        raise KeyboardInterrupt
+    else:
+        raise ShutdownSignal(signum)
+
+
+def _pass_on(signum, frame, previous):
+    import signal
+    if callable(previous):
+        previous(signum, frame)
+        return
+    signal.signal(signum, previous if previous is not None else signal.SIG_DFL)
+    os.kill(os.getpid(), signum)
+
+
+def stopping(error: BaseException) -> bool:
+    '''
+    Whether error stops a monitored function because of a handled signal, and is to be reported as an interrupt.
+    '''
+    if not installed():
+        return False
+    if isinstance(error, ShutdownSignal):
+        return True
+    if isinstance(error, KeyboardInterrupt):
+        return 'SIGINT' in _handled
+    # asyncio.run() cancels the tasks once the signal has interrupted the event loop
+    return _signame is not None and type(error).__name__ == 'CancelledError'
+
+
+def describe(error: BaseException) -> str:
+    if isinstance(error, ShutdownSignal):
+        return error.signame
+    if isinstance(error, KeyboardInterrupt):
+        return 'SIGINT (KeyboardInterrupt)'
+    return '%s (%s)' % (_signame, type(error).__name__)
+
+
+def mark_reported(error: BaseException):
+    '''
+    Tell the excepthook that a monitored function already pushed a message about error.
+    '''
+    global _reported
+    if stopping(error):
+        _reported = True
+    try:
+        error.__dongdong_reported__ = True
+    except:
+        pass
+
+
+def within_deadline(function, *args):
+    '''
+    Call function in a daemon thread and wait for it until the deadline, a slow network does not delay the exit.
+    '''
+    thread = threading.Thread(target=function, args=args, name='dongdong-shutdown', daemon=True)
+    thread.start()
+    thread.join(remaining())
+
+
+def _report(kind: str, error=None):
+    global _reported
+    _reported = True
+    event = _event
+    _notificator._end_event(event, error=error)
+    if kind == 'interrupt':
+        event.error = describe(error) if error is not None else _signame
+        if error is None:
+            event.traceback = _stack
+    within_deadline(_notificator._notify, kind, event)
+
+
+def _excepthook(exc_type, error, tb):
+    if installed() and _notificator is not None and not _reported \
+            and not getattr(error, '__dongdong_reported__', False):
+        try:
+            _report('interrupt' if stopping(error) else 'crash', error)
+        except:
+            print('Unable to report the uncaught exception')
+    _previous_excepthook(exc_type, error, tb)
+
+
+def _report_at_exit():
+    # Runs before the queues are flushed, atexit calls the functions registered last first
+    if installed() and _notificator is not None and _signame is not None and not _reported:
+        try:
+            _report('interrupt')
+        except:
+            print('Unable to report the %s' % _signame)
@@ -0,0 +1,306 @@
+'''
+@Project : dongdong
+@File : SweepMonitor.py
+@Description : One digest for the many trials of a sweep, run by threads or processes, instead of messages per trial
+'''
+import os
+import re
+import json
+import shutil
+import time
+import datetime
+import functools
+import itertools
+import threading
+import tempfile
+from .BoundedRepr import BoundedRepr, render_value, truncate
+from .DeliveryQueue import register_flush
+from .MetricsHistory import default_goal
+
+# Seconds between two reads of the trial files, the final summary is sent at most this long after the last trial
+POLL_INTERVAL = 5
+MAX_PARAMS_CHARS = 120
+MAX_VALUE_CHARS = 200
+MAX_ERROR_CHARS = 300
+
+
+def default_sweep_dir(name: str) -> str:
+    return os.path.join(tempfile.gettempdir(), 'dongdong-sweeps',
+                        '%s-%d-%d' % (re.sub(r'[^\w.-]', '_', name), os.getpid(), time.time()))
+
+
+def _duration(seconds: float) -> str:
+    return str(datetime.timedelta(seconds=round(seconds)))
+
+
+def _number(value: float) -> str:
+    return '%.4g' % value
+
+
+def _params(args: tuple, kwargs: dict) -> str:
+    '''
+    The arguments of a trial, short enough for one line of the table.
+    '''
+    short = BoundedRepr()
+    short.maxstring = short.maxother = 40
+    short.maxlist = short.maxtuple = short.maxdict = 5
+    parts = [short.repr(arg) for arg in args] + ['%s=%s' % (key, short.repr(value)) for key, value in kwargs.items()]
+    text = ', '.join(parts)
+    return text if len(text) <= MAX_PARAMS_CHARS else text[:MAX_PARAMS_CHARS - 3] + '...'
+
+
+class SweepMonitor:
+    def __init__(self, notificator, name: str = None, interval: float = 600, rank_by=None, goal: str = None,
+                 total: int = None, top: int = 10, directory: str = None):
+        '''
+        Decorator for the trial function of a sweep: the trials are not reported one by one, their status,
+        duration and returned value are gathered, and a digest is pushed every interval seconds while
+        trials progress, then a summary ranking them once all are done.
+        Each trial writes its outcome to a file of directory, so trials can run in threads, or in the processes
+        of a multiprocessing or concurrent.futures pool, forked or spawned. Only the process that created
+        the monitor pushes messages, the final summary is pushed when total trials are done,
+        when close() is called, or at exit.
+        :param notificator: any notificator, or a MultiNotificator
+        :param name: name of the sweep, shown in the messages, defaults to the name of the trial function
+        :param interval: seconds between two digests, no digest is pushed if no trial ended meanwhile
+        :param rank_by: how to score a trial from its returned value: a key of the returned dict or the name of
+            an attribute, a callable, or None if the trial returns a number
+        :param goal: 'min' or 'max', which scores are best, guessed from rank_by if it is a name (loss is minimized)
+        :param total: number of trials, to show the progress and estimate the end of the sweep
+        :param top: trials listed in the ranking
+        :param directory: where the trials write their outcome, it must be reachable by every process running
+            trials, defaults to a new directory in the temp directory, removed once the sweep is closed
+        '''
+        self.notificator = notificator
+        self.name = name
+        self.interval = interval
+        self.rank_by = rank_by
+        self.goal = goal or (default_goal(rank_by) if isinstance(rank_by, str) else 'max')
+        self.total = total
+        self.top = top
+        self.directory = directory
+        self._owner = None
+        # Whether the directory was made for the sweep, and is removed with the final summary
+        self._temporary = False
+        self._ids = itertools.count()
+        self._finished = {}
+        self._lock = threading.Lock()
+        self._changed = False
+        self._closed = False
+        self._wake = threading.Event()
+        if name is not None:
+            self._setup()
+
+    def _setup(self):
+        # Spawned workers import the trial function again, the directory of the sweep reaches them in the environment
+        variable = 'DONGDONG_SWEEP_' + re.sub(r'\W', '_', self.name).upper()
+        owner, _, inherited = os.environ.get(variable, '').partition(':')
+        self._temporary = self.directory is None
+        if inherited and owner != str(os.getpid()):
+            self.directory = self.directory or inherited
+            return
+        self.directory = self.directory or default_sweep_dir(self.name)
+        os.environ[variable] = '%d:%s' % (os.getpid(), self.directory)
+        self._owner = os.getpid()
+        os.makedirs(self.directory, exist_ok=True)
+        threading.Thread(target=self._run, name='dongdong-sweep', daemon=True).start()
+        register_flush(self)
+
+    def __call__(self, func):
+        if self.name is None:
+            self.name = func.__qualname__
+            self._setup()
+
+        @functools.wraps(func)
+        def trial(*args, **kwargs):
+            record = self._begin(args, kwargs)
+            try:
+                value = func(*args, **kwargs)
+            except Exception as ex:
+                self._end(record, error=ex)
+                raise
+            self._end(record, value=value)
+            return value
+
+        return trial
+
+    def _begin(self, args: tuple, kwargs: dict) -> dict:
+        record = {
+            'id': '%d-%d' % (os.getpid(), next(self._ids)),
+            'params': _params(args, kwargs),
+            'status': 'running',
+            'start': time.time(),
+            'end': None,
+            'value': None,
+            'score': None,
+            'error': None,
+        }
+        self._write(record)
+        return record
+
+    def _end(self, record: dict, value=None, error: Exception = None):
+        record['end'] = time.time()
+        if error is None:
+            record['status'] = 'complete'
+            record['value'] = render_value(value, MAX_VALUE_CHARS)
+            record['score'] = self._score(value)
+        else:
+            record['status'] = 'crash'
+            record['error'] = truncate('%s: %s' % (type(error).__name__, error), MAX_ERROR_CHARS)
+        self._write(record)
+
+    def _score(self, value) -> float:
+        try:
+            if callable(self.rank_by):
+                score = self.rank_by(value)
+            elif self.rank_by is None:
+                score = value
+            elif isinstance(value, dict):
+                score = value[self.rank_by]
+            else:
+                score = getattr(value, self.rank_by)
+            score = float(score)
+        except:
+            return None
+        # NaN is not ranked
+        return score if score == score else None
+
+    def _write(self, record: dict):
+        # Written under a temporary name and renamed, so a partial file is never read
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.trial-')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(record, f)
+            os.replace(tmp_path, os.path.join(self.directory, 'trial-%s.json' % record['id']))
+        except FileNotFoundError:
+            # The sweep is closed and its temporary directory removed, trials still running are not reported
+            if not self._temporary:
+                print('Unable to record the trial in %s' % self.directory)
+        except:
+            print('Unable to record the trial in %s' % self.directory)
+
+    def trials(self) -> list:
+        '''
+        The records of the trials started so far, from the files of the trials: params, status (running, complete
+        or crash), start and end timestamps, returned value, score and error. Finished trials are only read once.
+        '''
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        with self._lock:
+            running = []
+            for name in names:
+                if not (name.startswith('trial-') and name.endswith('.json')) or name[6:-5] in self._finished:
+                    continue
+                try:
+                    with open(os.path.join(self.directory, name)) as f:
+                        record = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                if record['status'] == 'running':
+                    running.append(record)
+                else:
+                    self._finished[record['id']] = record
+                    self._changed = True
+            return list(self._finished.values()) + running
+
+    def summary(self, final: bool = False) -> str:
+        '''
+        The text of a digest: progress, durations, the best trials so far and the errors of the failed ones.
+        '''
+        trials = self.trials()
+        complete = [record for record in trials if record['status'] == 'complete']
+        crashed = [record for record in trials if record['status'] == 'crash']
+        running = len(trials) - len(complete) - len(crashed)
+        finished = len(complete) + len(crashed)
+        line = f'Trials: {len(trials)} started'
+        if self.total:
+            line += f' of {self.total}'
+        lines = [line + f', {running} running, {len(complete)} complete, {len(crashed)} crashed\n']
+        durations = sorted(record['end'] - record['start'] for record in complete + crashed)
+        if durations:
+            lines.append(f'Trial duration: median {_duration(durations[len(durations) // 2])}, '
+                         f'max {_duration(durations[-1])}\n')
+        if trials:
+            first = min(record['start'] for record in trials)
+            elapsed = time.time() - first
+            line = f'Sweep running for: {_duration(elapsed)}'
+            if self.total and finished and not final and finished < self.total:
+                line += f', about {_duration(elapsed / finished * (self.total - finished))} left'
+            lines.append(line + '\n')
+        ranked = sorted((record for record in complete if record['score'] is not None),
+                        key=lambda record: record['score'], reverse=self.goal == 'max')
+        if ranked:
+            label = self.rank_by if isinstance(self.rank_by, str) else 'score'
+            lines.append(f'\nBest {label} ({self.goal}):\n')
+            for rank, record in enumerate(ranked[:self.top], 1):
+                lines.append(f'{rank}. {_number(record["score"])} ({record["params"]}) '
+                             f'in {_duration(record["end"] - record["start"])}\n')
+        elif complete:
+            lines.append('\nLast returned values:\n')
+            for record in sorted(complete, key=lambda record: record['end'])[-self.top:]:
+                lines.append(f'({record["params"]}): {record["value"]}\n')
+        if crashed:
+            # Trials failing the same way are listed together, a bad region of the search space fails many at once
+            errors = {}
+            for record in sorted(crashed, key=lambda record: record['end']):
+                errors.setdefault(record['error'], []).append(record)
+            lines.append('\nFailed:\n')
+            for error, group in sorted(errors.items(), key=lambda item: -len(item[1]))[:self.top]:
+                lines.append(f'{error} (x{len(group)}, e.g. ({group[0]["params"]}))\n')
+        return ''.join(lines).rstrip('\n')
+
+    def _run(self):
+        last = time.monotonic()
+        while not self._closed:
+            self._wake.wait(POLL_INTERVAL)
+            if self._closed:
+                return
+            try:
+                trials = self.trials()
+                done = self.total and sum(record['status'] != 'running' for record in trials) >= self.total
+                if done:
+                    self.close()
+                elif time.monotonic() - last >= self.interval:
+                    last = time.monotonic()
+                    self._push_digest()
+            except:
+                print('Unable to read the trials of sweep %s' % self.name)
+
+    def _push_digest(self):
+        with self._lock:
+            changed, self._changed = self._changed, False
+        if changed:
+            self.notificator._push_text(self.summary(), title='Sweep %s' % self.name)
+
+    def close(self):
+        '''
+        Push the final summary of the sweep, once, and remove the directory of the trials if the sweep made it.
+        '''
+        if self._owner != os.getpid():
+            return
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._wake.set()
+        if self.trials():
+            self.notificator._push_text(self.summary(final=True), title='Sweep %s is over' % self.name,
+                                        important=True)
+        if self._temporary:
+            # Renamed first, trials still running in other processes would fill it while it is removed
+            removed = self.directory + '.closed'
+            try:
+                os.rename(self.directory, removed)
+            except OSError:
+                removed = self.directory
+            shutil.rmtree(removed, ignore_errors=True)
+
+    def flush(self, timeout: float = None) -> bool:
+        '''
+        Called at exit: push the final summary if it was not, and wait for the notificator to send it.
+        '''
+        self.close()
+        flush = getattr(self.notificator, 'flush', None)
+        return flush(timeout) if flush is not None else True
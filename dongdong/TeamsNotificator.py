@@ -6,18 +6,18 @@
 @Email : Chenglongli@cug.edu.cn
 @Description : 
 '''
-import functools
-import os
-import datetime
-import socket
 import json
-import traceback
-import requests
-from .configure import teams_user_mentions, teams_webhook, DATE_FORMAT
+from .UserConfig import load_config
+from .BaseNotificator import BaseNotificator
 
 
-class TeamsNotificator:
-    def __init__(self, webhook: str = None, taskname=None, user_mentions: [str] = []):
+class TeamsNotificator(BaseNotificator):
+    # https://learn.microsoft.com/en-us/microsoftteams/platform/webhooks-and-connectors/how-to/connectors-using#rate-limiting-for-connectors
+    RATE_LIMIT = (4, 1)
+    # The payload may hold 28 KB, JSON escaping can double the size of non-ASCII text
+    MAX_BYTES = 14000
+
+    def __init__(self, webhook: str = None, taskname=None, user_mentions: [str] = [], profile: str = None, **kwargs):
         '''
         This class will configure the settings for Teams notification.
         :param webhook:
@@ -26,13 +26,16 @@ class TeamsNotificator:
         :param taskname:
         :param user_mentions:
             Optional users ids to notify.
+        :param profile: section of the config file to read the missing settings from, see setconfigures
+        :param kwargs: delivery options such as async_delivery, see BaseNotificator
             
         You can set self.startmsg，self.completemsg and self.crashmsg via a string list to change the push information of the monitor
         '''
-        if not webhook:
-            webhook = teams_webhook
-        if not user_mentions:
-            user_mentions = teams_user_mentions
+        super().__init__(**kwargs)
+        if not webhook or not user_mentions:
+            config = load_config(profile)
+            webhook = webhook or config['teams_webhook']
+            user_mentions = user_mentions or config['teams_user_mentions']
         self.webhook = webhook
         self.taskname = taskname
         self.user_mentions = user_mentions
@@ -43,94 +46,14 @@ class TeamsNotificator:
             "username": "dongdong",
         }
 
-    def monitor(self):
-        def decorator_sender(func):
-            @functools.wraps(func)
-            def wrapper_sender(*args, **kwargs):
-
-                start_time = datetime.datetime.now()
-                host_name = socket.gethostname()
-
-                if 'RANK' in os.environ:
-                    master_process = (int(os.environ['RANK']) == 0)
-                    host_name += ' - RANK: %s' % os.environ['RANK']
-                else:
-                    master_process = True
-
-                if master_process:
-                    if self.startmsg:
-                        contents = self.startmsg
-                    else:
-                        contents = ['The script starts running 🎬\n',
-                                    f'Machine name: {host_name}\n',
-                                    f'Task name: {self.taskname}\n',
-                                    f'Starting date: {start_time.strftime(DATE_FORMAT)}']
-                    contents.append(' '.join(self.user_mentions))
-                    self.dump['text'] = '\n'.join(contents)
-                    try:
-                        requests.post(self.webhook, json.dumps(self.dump))
-                    except:
-                        print('Unable to push message, please check network or configuration file')
-                try:
-                    value = func(*args, **kwargs)
-
-                    if master_process:
-                        end_time = datetime.datetime.now()
-                        elapsed_time = end_time - start_time
-                        if self.completemsg:
-                            contents = self.completemsg
-                        else:
-                            contents = ['The script is complete 🎉\n',
-                                        f'Machine name: {host_name}\n',
-                                        f'Task name: {self.taskname}\n',
-                                        f'Starting date: {start_time.strftime(DATE_FORMAT)}\n',
-                                        f'End date: {end_time.strftime(DATE_FORMAT)}\n'
-                                        f'Running duration: {str(elapsed_time)}']
-                        try:
-                            str_value = str(value)
-                            contents.append(
-                                '\nMain call returned value: %s' % str_value)
-                        except:
-                            contents.append("\nMain call returned value: ERROR - Couldn't str the returned value.")
-                        contents.append(' '.join(self.user_mentions))
-                        self.dump['text'] = '\n'.join(contents)
-                        try:
-                            requests.post(self.webhook, json.dumps(self.dump))
-                        except:
-                            print('Unable to push message, please check network or configuration file')
+    def _rate_limit_key(self):
+        return self.webhook
 
-                    return value
-
-                except Exception as ex:
-                    end_time = datetime.datetime.now()
-                    elapsed_time = end_time - start_time
-                    if self.crashmsg:
-                        contents = self.crashmsg
-                    else:
-                        contents = ['The script has crashed ☠️\n',
-                                    f'Machine name: {host_name}\n',
-                                    f'Task name: {self.taskname}\n',
-                                    f'Starting date: {start_time.strftime(DATE_FORMAT)}\n',
-                                    f'Crash date: {end_time.strftime(DATE_FORMAT)}\n',
-                                    f'Crashed running duration: {str(elapsed_time)}\n\n',
-                                    f'Here is the error:\n\n{ex}\n\n',
-                                    f'{traceback.format_exc()}']
-                    contents.append(' '.join(self.user_mentions))
-                    self.dump['text'] = '\n'.join(contents)
-                    try:
-                        requests.post(self.webhook, json.dumps(self.dump))
-                    except:
-                        print('Unable to push message, please check network or configuration file')
-                    raise ex
-
-            return wrapper_sender
-
-        return decorator_sender
+    def _request(self, payload):
+        return self.webhook, {'data': payload}
 
     def push(self, contents):
-        contents.append(' '.join(self.user_mentions))
-        self.dump['text'] = '\n'.join(contents)
-        try:
-            requests.post(self.webhook, json.dumps(self.dump))
-        except:
-            print('Unable to push message, please check network or configuration file')
+        self._submit('\n'.join(contents))
+
+    def _payload(self, text):
+        return json.dumps(dict(self.dump, text='\n'.join([text, ' '.join(self.user_mentions)])))
@@ -0,0 +1,127 @@
+'''
+@Project : dongdong
+@File : UserConfig.py
+@Description : Tokens and webhooks read from environment variables and ~/.config/dongdong/config.ini
+'''
+import os
+import tempfile
+import threading
+
+STR_KEYS = ('bark_token', 'teams_webhook', 'dingtalk_webhook', 'telegram_token', 'telegram_chat_id',
+            'wechat_webhook')
+LIST_KEYS = ('teams_user_mentions', 'dingtalk_user_mentions', 'wechat_user_mentions', 'wechat_user_mentions_mobile')
+DEFAULT_PROFILE = 'default'
+
+_parsers = {}
+_parsers_lock = threading.Lock()
+
+
+def default_config_path() -> str:
+    '''
+    $DONGDONG_CONFIG, or config.ini in the dongdong directory of $XDG_CONFIG_HOME (~/.config)
+    '''
+    if os.environ.get('DONGDONG_CONFIG'):
+        return os.environ['DONGDONG_CONFIG']
+    config = os.environ.get('XDG_CONFIG_HOME') or os.path.join(os.path.expanduser('~'), '.config')
+    return os.path.join(config, 'dongdong', 'config.ini')
+
+
+def _new_parser():
+    import configparser
+    # Webhook URLs contain %, and keys missing from a profile are taken from [default]
+    return configparser.ConfigParser(interpolation=None, default_section=DEFAULT_PROFILE)
+
+
+def _read(path: str):
+    '''
+    The parsed config file, parsed again only if the file was replaced since.
+    '''
+    try:
+        stat = os.stat(path)
+        version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        version = None
+    cached = _parsers.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    with _parsers_lock:
+        parser = _new_parser()
+        if version is not None:
+            # The file is only ever replaced as a whole, readers never see a partial file
+            parser.read(path, encoding='utf-8')
+        _parsers[path] = (version, parser)
+    return parser
+
+
+def _split(text: str) -> list:
+    return [item.strip() for item in text.split(',') if item.strip()]
+
+
+def load_config(profile: str = None, path: str = None) -> dict:
+    '''
+    The tokens, webhooks and mentions to use, each one taken from the first place that sets it:
+    the profile in the config file, the [default] section of the config file, the environment variable
+    DONGDONG_<NAME> (e.g. DONGDONG_BARK_TOKEN), then the values written in configure.py by older versions.
+    The arguments given to a notificator take precedence over all of them.
+    :param profile: section of the config file, defaults to $DONGDONG_PROFILE or default
+    :param path: config file, see default_config_path
+    :return: {name: value}, lists for the *_user_mentions* names
+    '''
+    from . import configure
+    profile = profile or os.environ.get('DONGDONG_PROFILE') or DEFAULT_PROFILE
+    parser = _read(path or default_config_path())
+    if profile != DEFAULT_PROFILE and not parser.has_section(profile):
+        raise ValueError('No profile %r in the config file %s' % (profile, path or default_config_path()))
+    section = parser[profile]
+    values = {}
+    for name in STR_KEYS + LIST_KEYS:
+        # The [default] section is the fallback of the profile
+        value = section.get(name)
+        if value is None:
+            value = os.environ.get('DONGDONG_' + name.upper())
+        if value is None:
+            values[name] = getattr(configure, name)
+        else:
+            values[name] = _split(value) if name in LIST_KEYS else value
+    return values
+
+
+def _lock(path: str):
+    '''
+    An exclusive lock on path + '.lock', so concurrent writers do not lose each other's changes.
+    '''
+    try:
+        import fcntl
+    except ImportError:
+        return None
+    fd = os.open(path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    return fd
+
+
+def save_config(values: dict, profile: str = DEFAULT_PROFILE, path: str = None):
+    '''
+    Write values into a profile of the config file, the other profiles and names are kept.
+    The file is replaced atomically and only readable by its owner.
+    :param values: {name: value}, lists are written comma separated
+    :param profile: section to write
+    :param path: config file, see default_config_path
+    '''
+    path = path or default_config_path()
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd = _lock(path)
+    try:
+        parser = _new_parser()
+        parser.read(path, encoding='utf-8')
+        if profile != DEFAULT_PROFILE and not parser.has_section(profile):
+            parser.add_section(profile)
+        for name, value in values.items():
+            parser[profile][name] = ', '.join(value) if isinstance(value, (list, tuple)) else str(value)
+        tmp_fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.config.')
+        with os.fdopen(tmp_fd, 'w', encoding='utf-8') as f:
+            parser.write(f)
+        os.replace(tmp_path, path)
+    finally:
+        if fd is not None:
+            os.close(fd)
@@ -0,0 +1,94 @@
+'''
+@Project : dongdong
+@File : Watchdog.py
+@Description : Background thread raising an alert when the process stops calling heartbeat()
+'''
+import sys
+import time
+import threading
+
+# Longest time between two alerts about the same stall
+MAX_ALERT_INTERVAL = 6 * 3600
+
+_beats = 0
+
+
+def heartbeat():
+    '''
+    Tell the watchdogs of monitor(watchdog=...) that the job is making progress, e.g. once per batch.
+    It only increments a counter, so it can be called in the hottest loop.
+    '''
+    global _beats
+    _beats += 1
+
+
+def thread_stacks(skip: int = None) -> str:
+    '''
+    The current stack of every thread of the process, the main thread first.
+    :param skip: ident of a thread to leave out
+    '''
+    import traceback
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    main = threading.main_thread().ident
+    parts = []
+    for ident, frame in sorted(sys._current_frames().items(), key=lambda item: item[0] != main):
+        if ident == skip:
+            continue
+        parts.append('Thread %s (%d):\n%s' % (names.get(ident, 'unknown'), ident,
+                                              ''.join(traceback.format_stack(frame))))
+    return '\n'.join(parts)
+
+
+class Watchdog:
+    def __init__(self, alert, timeout: float, backoff: float = 2, resume=None):
+        '''
+        A daemon thread checks the heartbeat() counter, if it has not moved for timeout seconds
+        alert(stalled_seconds, stacks) is called, then again after timeout * backoff, timeout * backoff ** 2, ...
+        :param alert: callable taking the seconds since the last heartbeat and the stacks of all threads
+        :param timeout: seconds without heartbeat before the first alert
+        :param backoff: factor applied to the delay between two alerts about the same stall
+        :param resume: callable taking the seconds the stall lasted, called when heartbeats come back after an alert
+        '''
+        self.alert = alert
+        self.timeout = timeout
+        self.backoff = backoff
+        self.resume = resume
+        self.alerts = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='dongdong-watchdog', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        last_beats = _beats
+        last_progress = time.monotonic()
+        delay = next_alert = self.timeout
+        alerted = False
+        while not self._stop.wait(min(self.timeout / 4, 30)):
+            now = time.monotonic()
+            if _beats != last_beats:
+                if alerted and self.resume is not None:
+                    self._call(self.resume, now - last_progress)
+                last_beats = _beats
+                last_progress = now
+                delay = next_alert = self.timeout
+                alerted = False
+            elif now - last_progress >= next_alert:
+                self.alerts += 1
+                alerted = True
+                self._call(self.alert, now - last_progress, thread_stacks(skip=threading.get_ident()))
+                delay = min(delay * self.backoff, MAX_ALERT_INTERVAL)
+                next_alert = now - last_progress + delay
+
+    @staticmethod
+    def _call(function, *args):
+        try:
+            function(*args)
+        except:
+            print('Unable to send the watchdog message')
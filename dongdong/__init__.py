@@ -1,6 +1,52 @@
-from .TeamsNotificator import TeamsNotificator
-from .BarkNotificator import BarkNotificator
-from .DesktopNotificator import DesktopNotificator
-from .DingTalkNotificator import DingTalkNotificator
-from .SetConfigures import setconfigures
-from .WechatNotificator import WechatNotificator
\ No newline at end of file
+'''
+Notificators are imported on first access, so `import dongdong` stays cheap,
+e.g. `from dongdong import DesktopNotificator` never imports requests.
+`from dongdong import BarkNotificator` is the class even after `import dongdong.BarkNotificator`,
+see _Package.
+'''
+import sys
+import types
+import importlib
+
+_exports = {
+    'BarkNotificator': '.BarkNotificator',
+    'DesktopNotificator': '.DesktopNotificator',
+    'DingTalkNotificator': '.DingTalkNotificator',
+    'TeamsNotificator': '.TeamsNotificator',
+    'WechatNotificator': '.WechatNotificator',
+    'MultiNotificator': '.MultiNotificator',
+    'setconfigures': '.SetConfigures',
+    'configure_transport': '.HttpTransport',
+    'set_rate_limit': '.RateLimiter',
+    'heartbeat': '.Watchdog',
+    'DongdongHandler': '.DongdongHandler',
+    'stats': '.DeliveryStats',
+    'export_prometheus': '.DeliveryStats',
+    'install_shutdown': '.ShutdownHandlers',
+}
+
+__all__ = list(_exports)
+
+
+def __getattr__(name):
+    if name not in _exports:
+        raise AttributeError('module %r has no attribute %r' % (__name__, name))
+    value = getattr(importlib.import_module(_exports[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+
+class _Package(types.ModuleType):
+    def __setattr__(self, name, value):
+        # Importing a submodule binds it as an attribute of the package, the class of the same name is kept instead
+        if name in _exports and isinstance(value, types.ModuleType) and \
+                value.__name__ == __name__ + _exports[name] and hasattr(value, name):
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
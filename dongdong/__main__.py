@@ -0,0 +1,113 @@
+'''
+@Project : dongdong
+@File : __main__.py
+@Description : Command line, e.g. dongdong run --via dingtalk -- python train.py --epochs 10
+'''
+import sys
+import argparse
+from .CommandRunner import DEFAULT_TAIL_LINES
+
+NOTIFICATORS = {
+    'bark': 'BarkNotificator',
+    'dingtalk': 'DingTalkNotificator',
+    'teams': 'TeamsNotificator',
+    'wechat': 'WechatNotificator',
+    'desktop': 'DesktopNotificator',
+}
+
+
+def make_notificator(via: [str], taskname: str = None, profile: str = None):
+    '''
+    The notificator of each name in via, a MultiNotificator if there are several.
+    '''
+    import dongdong
+    notificators = []
+    for name in via:
+        cls = getattr(dongdong, NOTIFICATORS[name])
+        if name == 'desktop':
+            notificators.append(cls(taskname=taskname))
+        else:
+            notificators.append(cls(taskname=taskname, profile=profile))
+    if len(notificators) == 1:
+        return notificators[0]
+    return dongdong.MultiNotificator(*notificators)
+
+
+def _run(args) -> int:
+    from .CommandRunner import run_command
+    command = args.command
+    if command and command[0] == '--':
+        command = command[1:]
+    if not command:
+        print('dongdong run: no command given, e.g. dongdong run --via bark -- python train.py', file=sys.stderr)
+        return 2
+    notificator = make_notificator(args.via or ['desktop'], args.taskname, args.profile)
+    return run_command(notificator, command, tail_lines=args.tail)
+
+
+def _relay(args) -> int:
+    import signal
+    from .Relay import RelayServer
+    server = RelayServer(args.socket, max_attempts=args.attempts)
+    try:
+        server.bind()
+    except RuntimeError as ex:
+        print('dongdong relay: %s' % ex, file=sys.stderr)
+        return 1
+
+    def stop(signum, frame):
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    if args.prometheus:
+        from .DeliveryStats import export_prometheus
+        export_prometheus(args.prometheus)
+    print('dongdong relay listening on %s' % server.path, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='dongdong', description='Be notified when your running script is complete')
+    commands = parser.add_subparsers(dest='subcommand')
+    run = commands.add_parser('run', help='run a command and push a message when it starts and ends',
+                              description='Run a command, its output is passed through unchanged. A message is '
+                                          'pushed when it starts, and when it ends with its exit code or signal '
+                                          'and its last lines of output.')
+    run.add_argument('--via', action='append', choices=sorted(NOTIFICATORS),
+                     help='notificator to use, repeat it to use several, defaults to desktop')
+    run.add_argument('--taskname', help='task name shown in the messages')
+    run.add_argument('--profile', help='profile of the config file to take the tokens and webhooks from')
+    run.add_argument('--tail', type=int, default=DEFAULT_TAIL_LINES, help='number of output lines given in the messages')
+    run.add_argument('command', nargs=argparse.REMAINDER, help='the command to run, after --')
+    run.set_defaults(handler=_run)
+    relay = commands.add_parser('relay', help='send the messages of every process of this host',
+                                description='Listen on a Unix socket for the messages of the notificators of this '
+                                            'host and send them with shared connections, rate limits and retries. '
+                                            'Notificators use it whenever it runs, if the socket is not in '
+                                            'the temp directory, else only with relay=True.')
+    relay.add_argument('--socket', help='socket to listen on, defaults to $DONGDONG_RELAY, or dongdong-relay.sock '
+                                        'in $XDG_RUNTIME_DIR or in the temp directory')
+    relay.add_argument('--attempts', type=int, default=5, help='times a message is sent before it is given up')
+    relay.add_argument('--prometheus', help='write the delivery statistics of the relay to this file every 15 '
+                                            'seconds, for the textfile collector of the node exporter')
+    relay.set_defaults(handler=_relay)
+    return parser
+
+
+def main(argv: [str] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.subcommand is None:
+        parser.print_help()
+        return 2
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -17,7 +17,7 @@ setup(
             ]
     },
     zip_safe=False,
-    python_requires='>=3.6',
+    python_requires='>=3.7',
     install_requires=[
         'requests',
     ],
@@ -0,0 +1,59 @@
+'''
+@Project : dongdong
+@File : helpers.py
+@Description : Stand-in notificators and a fresh interpreter, shared by the tests
+'''
+import os
+import sys
+import subprocess
+from dongdong.BaseNotificator import BaseNotificator
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+
+class RecordingNotificator:
+    def __init__(self):
+        '''
+        Records the messages of the helpers built on top of notificators (sweeps, logging digests, ...),
+        as (title, text) tuples.
+        '''
+        self.messages = []
+
+    def _push_text(self, text, title=None, important=False):
+        self.messages.append((title, text))
+
+
+class StubNotificator(BaseNotificator):
+    def __init__(self, name: str = 'stub', echo: bool = False, **kwargs):
+        '''
+        A notificator keeping the texts it delivers in self.delivered, instead of sending them.
+        :param echo: also print every delivered text on one line, prefixed with name, e.g. in a subprocess
+        '''
+        kwargs.setdefault('relay', False)
+        super().__init__(**kwargs)
+        self.name = name
+        self.echo = echo
+        self.delivered = []
+
+    def _payload(self, text, **options):
+        return text
+
+    def _deliver(self, payload):
+        self.delivered.append(payload)
+        if self.echo:
+            # One write per line, the backends deliver from several threads at once
+            sys.stdout.write('%s %s\n' % (self.name, payload.replace('\n', ' ')))
+            sys.stdout.flush()
+
+
+def run_python(code: str, timeout: float = 60) -> str:
+    '''
+    Run code in a fresh interpreter, importing dongdong from this tree and these helpers.
+    :return: what it printed, the test fails if it exits with an error
+    '''
+    path = os.pathsep.join([ROOT, HERE, os.environ.get('PYTHONPATH', '')])
+    result = subprocess.run([sys.executable, '-c', code], env=dict(os.environ, PYTHONPATH=path), timeout=timeout,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    assert result.returncode == 0, result.stderr
+    return result.stdout
@@ -0,0 +1,34 @@
+'''
+@Project : dongdong
+@File : test_bounded_repr.py
+@Description : Returned values are rendered in bounded time and size, whatever container holds them
+'''
+import time
+from collections import OrderedDict, defaultdict, namedtuple
+from dongdong.BoundedRepr import render_value, MAX_VALUE_CHARS
+
+
+class Weight:
+    def __repr__(self):
+        return 'w' * 4000
+
+
+def test_state_dict_is_bounded():
+    state = OrderedDict(('layer%d.weight' % i, Weight()) for i in range(2000))
+    start = time.perf_counter()
+    text = render_value(state)
+    assert time.perf_counter() - start < 0.05
+    assert len(text) <= MAX_VALUE_CHARS
+    assert text.startswith("OrderedDict({'layer0.weight': ")
+
+
+def test_container_subclasses():
+    assert render_value(defaultdict(list, a=[1, 2])) == "defaultdict({'a': [1, 2]})"
+    assert render_value(type('Batch', (list,), {})(range(100))).endswith('49, ...])')
+    assert render_value(namedtuple('Point', 'x y')(1, 2)) == 'Point(x=1, y=2)'
+
+
+def test_builtins_unchanged():
+    assert render_value({'loss': 0.5}) == "{'loss': 0.5}"
+    assert render_value(range(3)) == 'range(0, 3)'
+    assert render_value(0.25) == '0.25'
@@ -0,0 +1,167 @@
+'''
+@Project : dongdong
+@File : test_crash_cache.py
+@Description : Crash fingerprints that survive restarts and edits, and the expiry of the remembered crashes
+'''
+import pytest
+import dongdong.CrashCache as crash_cache
+from dongdong.CrashCache import CrashCache, fingerprint
+from helpers import StubNotificator, run_python
+
+CRASH = '''
+def load(path):
+    return open(path).read()
+
+
+def train(path):
+%s    return load(path)
+'''
+
+
+class Clock:
+    def __init__(self, now: float = 1000000):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+def crash(directory, code: str, *args) -> BaseException:
+    '''
+    Run train(*args) from directory/src/train.py, a file so that the traceback has the source lines.
+    '''
+    path = directory / 'src' / 'train.py'
+    path.parent.mkdir(parents=True)
+    path.write_text(code)
+    scope = {}
+    exec(compile(code, str(path), 'exec'), scope)
+    try:
+        scope['train'](*args)
+    except BaseException as error:
+        return error
+
+
+def recurse(n: int):
+    if n == 0:
+        raise RecursionError('too deep')
+    recurse(n - 1)
+
+
+def caught(function, *args) -> BaseException:
+    try:
+        function(*args)
+    except BaseException as error:
+        return error
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(crash_cache, 'time', clock)
+    return clock
+
+
+def test_fingerprint_ignores_message_and_line_numbers(tmp_path):
+    # Checked out elsewhere as well
+    first = crash(tmp_path / 'a', CRASH % '', str(tmp_path / 'missing'))
+    moved = crash(tmp_path / 'b', '\n\n\n' + CRASH % '    # Comments move the lines\n', str(tmp_path / 'other'))
+    assert str(first) != str(moved)
+    assert fingerprint(first) == fingerprint(moved)
+
+
+def test_fingerprint_of_another_crash(tmp_path):
+    edited = CRASH.replace('return open(path).read()', 'with open(path) as f:\n        return f.read()')
+    first = crash(tmp_path / 'a', CRASH % '', str(tmp_path / 'missing'))
+    assert fingerprint(first) != fingerprint(crash(tmp_path / 'b', CRASH % '', None))
+    assert fingerprint(first) != fingerprint(crash(tmp_path / 'c', edited % '', str(tmp_path / 'missing')))
+
+
+def test_fingerprint_ignores_recursion_depth():
+    assert fingerprint(caught(recurse, 3)) == fingerprint(caught(recurse, 30))
+
+
+def test_fingerprint_includes_cause():
+    def wrap(error):
+        try:
+            raise error
+        except Exception as cause:
+            raise RuntimeError('failed') from cause
+
+    assert fingerprint(caught(wrap, KeyError('a'))) == fingerprint(caught(wrap, KeyError('b')))
+    assert fingerprint(caught(wrap, KeyError('a'))) != fingerprint(caught(wrap, ValueError('a')))
+
+
+def test_fingerprint_stable_across_processes(tmp_path):
+    code = '''
+from dongdong.CrashCache import fingerprint
+%s
+try:
+    train(%r)
+except OSError as error:
+    print(fingerprint(error))
+'''
+    first = run_python(code % (CRASH % '', str(tmp_path / 'missing')))
+    second = run_python(code % ('\n' + CRASH % '', str(tmp_path / 'other')))
+    assert first == second
+    assert len(first.strip()) == 20
+
+
+def test_fingerprint_ignores_install_location():
+    assert crash_cache._frame_file('/home/a/venv/lib/site-packages/torch/nn/module.py') == 'nn/module.py'
+    assert crash_cache._frame_file('C:\\Users\\b\\torch\\nn\\module.py') == 'nn/module.py'
+
+
+def test_repeat_within_window(tmp_path, clock):
+    cache = CrashCache(str(tmp_path / 'crashes.sqlite'), ttl=3600)
+    reported = clock.now
+    assert cache.record('abc', 600) == (True, 0, None)
+    clock.now += 60
+    assert cache.record('abc', 600) == (False, 1, reported)
+    clock.now += 60
+    assert cache.record('abc', 600) == (False, 2, reported)
+    assert cache.record('def', 600) == (True, 0, None)
+    clock.now += 600
+    assert cache.record('abc', 600) == (True, 2, reported)
+    assert cache.record('abc', 600) == (False, 1, clock.now)
+
+
+def test_shared_by_processes(tmp_path, clock):
+    path = str(tmp_path / 'crashes.sqlite')
+    reported = clock.now
+    assert CrashCache(path).record('abc', 600) == (True, 0, None)
+    assert CrashCache(path).record('abc', 600) == (False, 1, reported)
+
+
+def test_expired_after_ttl(tmp_path, clock):
+    cache = CrashCache(str(tmp_path / 'crashes.sqlite'), ttl=3600)
+    cache.record('abc', 7200)
+    clock.now += 3601
+    # Forgotten, although the window has not elapsed yet
+    assert cache.record('abc', 7200) == (True, 0, None)
+
+
+def test_seen_again_before_ttl(tmp_path, clock):
+    cache = CrashCache(str(tmp_path / 'crashes.sqlite'), ttl=3600)
+    reported = clock.now
+    cache.record('abc', 10000)
+    for i in range(3):
+        clock.now += 3000
+        assert cache.record('abc', 10000) == (False, i + 1, reported)
+    clock.now += 1300
+    assert cache.record('abc', 10000) == (True, 3, reported)
+
+
+def test_monitor_suppresses_repeated_crash(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+    notificator = StubNotificator()
+
+    @notificator.monitor(repeat_window=600)
+    def train():
+        raise ValueError('loss is nan')
+
+    for i in range(2):
+        with pytest.raises(ValueError):
+            train()
+    crashes = [text for text in notificator.delivered if 'ValueError' in text]
+    assert len(crashes) == 1
+    assert (tmp_path / 'dongdong' / 'crashes.sqlite').exists()
@@ -0,0 +1,236 @@
+'''
+@Project : dongdong
+@File : test_dbus.py
+@Description : The D-Bus client against a private dbus-daemon and a stand-in notification service, no desktop needed
+'''
+import os
+import socket
+import shutil
+import struct
+import threading
+import subprocess
+import pytest
+from dongdong.DBusNotifier import SessionBus, DBusNotifier, DBusError, METHOD_CALL, MEMBER, REPLY_SERIAL
+
+pytestmark = pytest.mark.skipif(shutil.which('dbus-daemon') is None or not hasattr(os, 'getuid'),
+                                reason='needs dbus-daemon')
+
+CONFIG = '''<!DOCTYPE busconfig PUBLIC "-//freedesktop//DTD D-BUS Bus Configuration 1.0//EN"
+ "http://www.freedesktop.org/standards/dbus/1.0/busconfig.dtd">
+<busconfig>
+  <type>session</type>
+  <listen>unix:path=%s</listen>
+  <auth>EXTERNAL</auth>
+  <policy context="default">
+    <allow send_destination="*" eavesdrop="true"/>
+    <allow eavesdrop="true"/>
+    <allow own="*"/>
+  </policy>
+</busconfig>
+'''
+METHOD_RETURN = 2
+SENDER = 7
+
+
+@pytest.fixture
+def bus_address(tmp_path):
+    path = tmp_path / 'bus'
+    config = tmp_path / 'bus.conf'
+    config.write_text(CONFIG % path)
+    daemon = subprocess.Popen(['dbus-daemon', '--config-file=%s' % config, '--nofork', '--print-address'],
+                              stdout=subprocess.PIPE, universal_newlines=True)
+    try:
+        yield daemon.stdout.readline().strip()
+    finally:
+        daemon.terminate()
+        daemon.wait()
+
+
+class _Body:
+    '''
+    Reads a little-endian message body, independently of the code under test.
+    '''
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+
+    def align(self, n: int):
+        self.pos += -self.pos % n
+
+    def uint32(self, code: str = 'I') -> int:
+        self.align(4)
+        value, = struct.unpack('<' + code, self.data[self.pos:self.pos + 4])
+        self.pos += 4
+        return value
+
+    def string(self) -> str:
+        length = self.uint32()
+        value = self.data[self.pos:self.pos + length].decode('utf-8')
+        self.pos += length + 1
+        return value
+
+    def empty_array(self, element_alignment: int):
+        assert self.uint32() == 0
+        self.align(element_alignment)
+
+
+def _reply(serial: int, reply_serial: int, destination: str, notification_id: int) -> bytes:
+    body = struct.pack('<I', notification_id)
+    message = bytearray(struct.pack('<cBBBIII', b'l', METHOD_RETURN, 0, 1, len(body), serial, 0))
+
+    def field(code: int, signature: str, value: bytes, alignment: int):
+        message.extend(b'\0' * (-len(message) % 8))
+        message.extend(bytes([code, 1]) + signature.encode('ascii') + b'\0')
+        message.extend(b'\0' * (-len(message) % alignment))
+        message.extend(value)
+
+    field(REPLY_SERIAL, 'u', struct.pack('<I', reply_serial), 4)
+    encoded = destination.encode('utf-8')
+    field(6, 's', struct.pack('<I', len(encoded)) + encoded + b'\0', 4)
+    field(8, 'g', b'\x01u\0', 1)
+    message[12:16] = struct.pack('<I', len(message) - 16)
+    message.extend(b'\0' * (-len(message) % 8))
+    return bytes(message) + body
+
+
+class NotificationService:
+    def __init__(self, address: str):
+        '''
+        Owns org.freedesktop.Notifications on the bus and records the notifications it is asked to show.
+        '''
+        self.notifications = []
+        self._bus = SessionBus(address, timeout=0.2)
+        name = 'org.freedesktop.Notifications'.encode('utf-8')
+        body = struct.pack('<I', len(name)) + name + b'\0' + b'\0' * (-(len(name) + 5) % 4) + struct.pack('<I', 4)
+        self._bus.call('org.freedesktop.DBus', '/org/freedesktop/DBus', 'org.freedesktop.DBus', 'RequestName',
+                       'su', body)
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        serial = 1000
+        while not self._stop:
+            try:
+                message_type, call_serial, fields, body, order = self._bus._read_message()
+            except socket.timeout:
+                continue
+            except (OSError, DBusError):
+                return
+            if message_type != METHOD_CALL or fields.get(MEMBER) != 'Notify':
+                continue
+            reader = _Body(body)
+            app_name, replaces_id, icon = reader.string(), reader.uint32(), reader.string()
+            summary, text = reader.string(), reader.string()
+            reader.empty_array(4)
+            reader.empty_array(8)
+            expire_timeout = reader.uint32('i')
+            self.notifications.append((app_name, replaces_id, icon, summary, text, expire_timeout))
+            serial += 1
+            self._bus._sock.sendall(_reply(serial, call_serial, fields[SENDER], len(self.notifications)))
+
+    def close(self):
+        self._stop = True
+        self._thread.join()
+        self._bus.close()
+
+
+@pytest.fixture
+def service(bus_address):
+    service = NotificationService(bus_address)
+    yield service
+    service.close()
+
+
+def test_notify(bus_address, service):
+    bus = SessionBus(bus_address)
+    try:
+        assert bus.notify('Training', 'The script is complete 🎉\nRunning duration: 1:02:03') == 1
+        assert bus.notify('Training', 'again') == 2
+    finally:
+        bus.close()
+    assert service.notifications[0] == ('dongdong', 0, '', 'Training',
+                                        'The script is complete 🎉\nRunning duration: 1:02:03', -1)
+
+
+def test_notifier_merges_bursts(bus_address, service):
+    fallback = []
+    notifier = DBusNotifier(bus_address)
+    notifier.submit('Progress', '10%', lambda *args: fallback.append(args))
+    notifier.submit('Progress', '20%', lambda *args: fallback.append(args))
+    assert notifier.flush(5)
+    assert [notification[3:5] for notification in service.notifications] == [('Progress', '10%\n20%')]
+    assert fallback == []
+
+
+def test_fallback_without_service(bus_address):
+    fallback = []
+    notifier = DBusNotifier(bus_address)
+    notifier.submit('Crash', 'ValueError', lambda *args: fallback.append(args))
+    assert notifier.flush(5)
+    assert fallback == [('Crash', 'ValueError')]
+
+
+def test_fallback_without_bus(tmp_path):
+    fallback = []
+    notifier = DBusNotifier('unix:path=%s' % (tmp_path / 'missing'))
+    notifier.submit('Crash', 'ValueError', lambda *args: fallback.append(args))
+    assert notifier.flush(5)
+    assert fallback == [('Crash', 'ValueError')]
+
+
+def test_done_after_shown(bus_address, service):
+    done = []
+    notifier = DBusNotifier(bus_address)
+    notifier.submit('Progress', '10%', None, lambda *args: done.append(args))
+    notifier.submit('Progress', '20%', None, lambda *args: done.append(args))
+    assert notifier.flush(5)
+    assert len(service.notifications) == 1
+    assert [shown for shown, seconds in done] == [True, True]
+    assert all(seconds >= 0 for shown, seconds in done)
+
+
+def test_done_when_fallback_fails(tmp_path):
+    done = []
+
+    def fallback(title, message):
+        raise OSError('no notify-send')
+
+    notifier = DBusNotifier('unix:path=%s' % (tmp_path / 'missing'))
+    notifier.submit('Crash', 'ValueError', fallback, lambda *args: done.append(args))
+    assert notifier.flush(5)
+    assert [shown for shown, seconds in done] == [False]
+
+
+def test_desktop_counts_shown_messages(bus_address, service, monkeypatch):
+    import platform
+    from dongdong import DesktopNotificator
+    monkeypatch.setattr(platform, 'system', lambda: 'Linux')
+    notificator = DesktopNotificator(bus_address=bus_address, relay=False)
+    before = notificator.stats()
+    notificator.push('Training', 'epoch 1')
+    assert notificator.flush(5)
+    after = notificator.stats()
+    assert service.notifications[-1][3:5] == ('Training', 'epoch 1')
+    assert after['sent'] - before['sent'] == 1
+    assert after['latency']['count'] - before['latency']['count'] == 1
+    assert after['failed'] == before['failed']
+
+
+def test_desktop_counts_failed_fallback(tmp_path, monkeypatch):
+    import platform
+    from dongdong import DesktopNotificator
+    monkeypatch.setattr(platform, 'system', lambda: 'Linux')
+
+    def spawn(title, message):
+        raise OSError('no notify-send')
+
+    notificator = DesktopNotificator(bus_address='unix:path=%s' % (tmp_path / 'missing'), relay=False)
+    monkeypatch.setattr(notificator, '_spawn', spawn)
+    before = notificator.stats()
+    notificator.push('Crash', 'ValueError')
+    assert notificator.flush(5)
+    after = notificator.stats()
+    assert after['sent'] == before['sent']
+    assert after['failed'] - before['failed'] == 1
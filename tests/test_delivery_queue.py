@@ -0,0 +1,105 @@
+'''
+@Project : dongdong
+@File : test_delivery_queue.py
+@Description : Overflow policies, priority lane and failures of the delivery queue
+'''
+import threading
+import pytest
+from dongdong.DeliveryQueue import DeliveryQueue
+
+
+class BlockedDelivery:
+    def __init__(self):
+        '''
+        Records the delivered items, the first one blocks the worker until release() is called.
+        '''
+        self.items = []
+        self.busy = threading.Event()
+        self._released = threading.Event()
+
+    def __call__(self, item):
+        self.busy.set()
+        self._released.wait(5)
+        self.items.append(item)
+
+    def release(self):
+        self._released.set()
+
+
+def blocked_queue(overflow: str, maxsize: int = 2):
+    deliver = BlockedDelivery()
+    drops = []
+    queue = DeliveryQueue(deliver, maxsize=maxsize, overflow=overflow, on_drop=lambda: drops.append(1))
+    queue.put(0)
+    # The worker holds item 0, the queue itself is empty
+    assert deliver.busy.wait(5)
+    return queue, deliver, drops
+
+
+def test_drop_oldest():
+    queue, deliver, drops = blocked_queue('drop-oldest')
+    assert all(queue.put(item) for item in (1, 2, 3))
+    deliver.release()
+    assert queue.flush(5)
+    assert deliver.items == [0, 2, 3]
+    assert queue.dropped == 1 and len(drops) == 1
+
+
+def test_drop_new():
+    queue, deliver, drops = blocked_queue('drop-new')
+    assert queue.put(1) and queue.put(2)
+    assert not queue.put(3)
+    deliver.release()
+    assert queue.flush(5)
+    assert deliver.items == [0, 1, 2]
+    assert queue.dropped == 1 and len(drops) == 1
+
+
+def test_block():
+    queue, deliver, drops = blocked_queue('block')
+    queue.put(1)
+    queue.put(2)
+    blocked = threading.Thread(target=queue.put, args=(3,))
+    blocked.start()
+    blocked.join(0.2)
+    assert blocked.is_alive()
+    deliver.release()
+    blocked.join(5)
+    assert queue.flush(5)
+    assert deliver.items == [0, 1, 2, 3]
+    assert queue.dropped == 0
+
+
+def test_urgent_first_and_never_dropped():
+    queue, deliver, drops = blocked_queue('drop-new')
+    queue.put(1)
+    queue.put(2)
+    assert queue.put('crash', urgent=True)
+    assert queue.put('complete', urgent=True)
+    assert len(queue) == 4
+    deliver.release()
+    assert queue.flush(5)
+    assert deliver.items == [0, 'crash', 'complete', 1, 2]
+    assert queue.dropped == 0
+
+
+def test_worker_survives_failed_delivery(capsys):
+    delivered = []
+
+    def deliver(item):
+        if item == 'bad':
+            raise RuntimeError('backend down')
+        delivered.append(item)
+
+    queue = DeliveryQueue(deliver)
+    queue.put('bad')
+    assert queue.flush(5)
+    queue.put('good')
+    assert queue.flush(5)
+    assert delivered == ['good']
+    assert 'Unable to deliver a queued message' in capsys.readouterr().out
+
+
+def test_invalid_overflow():
+    with pytest.raises(ValueError):
+        DeliveryQueue(print, overflow='drop-all')
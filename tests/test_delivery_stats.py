@@ -0,0 +1,50 @@
+'''
+@Project : dongdong
+@File : test_delivery_stats.py
+@Description : The backends reported by dongdong.stats() and the files of the Prometheus export
+'''
+import dongdong
+from dongdong import MultiNotificator
+from dongdong.DeliveryStats import PrometheusExporter
+from helpers import StubNotificator, run_python
+
+
+def test_multi_is_not_a_backend():
+    multi = MultiNotificator(StubNotificator(), StubNotificator())
+    multi.push('hello')
+    assert 'multi' not in dongdong.stats()
+    assert list(multi.stats()) == ['stub']
+    assert multi.stats()['stub']['sent'] >= 2
+
+
+def test_per_process_file_removed_at_exit(tmp_path):
+    path = tmp_path / 'dongdong_{pid}.prom'
+    output = run_python('''
+import os
+import dongdong
+from helpers import StubNotificator
+StubNotificator()._push_text('hello')
+dongdong.export_prometheus(%r, interval=3600)
+print(os.getpid())
+''' % str(path))
+    assert not (tmp_path / ('dongdong_%s.prom' % output.strip())).exists()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_shared_file_kept_at_exit(tmp_path):
+    path = tmp_path / 'dongdong.prom'
+    run_python('''
+import dongdong
+from helpers import StubNotificator
+StubNotificator()._push_text('hello')
+dongdong.export_prometheus(%r, interval=3600)
+''' % str(path))
+    assert 'dongdong_messages_sent_total{backend="stub"} 1' in path.read_text()
+
+
+def test_stopped_exporter_does_not_write(tmp_path):
+    exporter = PrometheusExporter(str(tmp_path / 'dongdong_{pid}.prom'), 3600)
+    exporter.start()
+    exporter.stop()
+    assert exporter.flush()
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,40 @@
+'''
+@Project : dongdong
+@File : test_exit_delivery.py
+@Description : Messages sent from atexit hooks, once thread pools refuse new work, still reach every backend
+'''
+import textwrap
+from helpers import run_python
+
+STUB = '''
+import atexit
+import logging
+from dongdong import MultiNotificator, DongdongHandler
+from helpers import StubNotificator
+
+multi = MultiNotificator(StubNotificator('a', echo=True), StubNotificator('b', echo=True))
+'''
+
+
+def run(script: str) -> list:
+    return sorted(run_python(STUB + textwrap.dedent(script)).splitlines())
+
+
+def test_push_at_exit():
+    lines = run('''
+        # The pool of the MultiNotificator exists, and is shut down before the atexit hooks run
+        multi.push('started')
+        atexit.register(multi.push, 'bye')
+    ''')
+    assert lines == ['a bye', 'a started', 'b bye', 'b started']
+
+
+def test_logging_digest_at_exit():
+    lines = run('''
+        multi.push('started')
+        logger = logging.getLogger('exit')
+        logger.addHandler(DongdongHandler(multi, interval=3600))
+        logger.warning('disk almost full')
+    ''')
+    assert [line.split(' ')[0] for line in lines] == ['a', 'a', 'b', 'b']
+    assert sum(line.endswith('WARNING exit: disk almost full') for line in lines) == 2
@@ -0,0 +1,53 @@
+'''
+@Project : dongdong
+@File : test_logging_handler.py
+@Description : Pending log records keep neither exception frames nor mutable arguments
+'''
+import gc
+import logging
+import weakref
+from dongdong import DongdongHandler
+from helpers import RecordingNotificator
+
+
+class Batch:
+    pass
+
+
+def make_logger(name: str):
+    notificator = RecordingNotificator()
+    handler = DongdongHandler(notificator, interval=3600)
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    logger.addHandler(handler)
+    return logger, handler, notificator
+
+
+def test_exception_frames_are_released():
+    logger, handler, notificator = make_logger('test.frames')
+
+    def step():
+        batch = Batch()
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            logger.exception('step %d failed', 3)
+        return weakref.ref(batch)
+
+    batch = step()
+    gc.collect()
+    assert batch() is None
+    handler.flush()
+    assert 'step 3 failed' in notificator.messages[0][1]
+    assert 'ZeroDivisionError: division by zero' in notificator.messages[0][1]
+    handler.close()
+
+
+def test_arguments_are_rendered_when_logged():
+    logger, handler, notificator = make_logger('test.args')
+    shapes = [32]
+    logger.warning('batch of shape %s', shapes)
+    shapes.append(224)
+    handler.flush()
+    assert notificator.messages[0][1].endswith('WARNING test.args: batch of shape [32]')
+    handler.close()
@@ -0,0 +1,69 @@
+'''
+@Project : dongdong
+@File : test_metrics.py
+@Description : Which metrics are minimized, and which monitored call their summary is reported with
+'''
+import threading
+import pytest
+from dongdong.MetricsHistory import default_goal
+from helpers import StubNotificator
+
+
+@pytest.mark.parametrize('name', ['loss', 'val_loss', 'valLoss', 'MSELoss', 'top1-error', 'train/wer', 'valWER',
+                                  'ppl', 'perplexity_val'])
+def test_minimized(name):
+    assert default_goal(name) == 'min'
+
+
+@pytest.mark.parametrize('name', ['accuracy', 'val_acc', 'power', 'answer_rate', 'interval', 'bleu', 'lr'])
+def test_maximized(name):
+    assert default_goal(name) == 'max'
+
+
+def complete_message(notificator, value: str) -> str:
+    return next(text for text in notificator.delivered
+                if text.startswith('The script is complete') and text.endswith('returned value: ' + value))
+
+
+def test_concurrent_calls_keep_their_metrics():
+    notificator = StubNotificator()
+    barrier = threading.Barrier(2)
+
+    @notificator.monitor()
+    def job(name):
+        for step in range(3):
+            barrier.wait(5)
+            notificator.log_metrics(step, **{name + '_loss': step})
+        return name
+
+    threads = [threading.Thread(target=job, args=(name,)) for name in ('first', 'second')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    first, second = complete_message(notificator, 'first'), complete_message(notificator, 'second')
+    assert 'first_loss: last 2 (step 2)' in first and 'second_loss' not in first
+    assert 'second_loss: last 2 (step 2)' in second and 'first_loss' not in second
+    assert notificator.metrics.series == {}
+
+
+def test_goals_apply_to_monitored_calls():
+    notificator = StubNotificator()
+    notificator.metrics.goals['gap'] = 'min'
+
+    @notificator.monitor()
+    def job():
+        notificator.log_metrics(0, gap=3)
+        notificator.log_metrics(1, gap=1)
+        notificator.log_metrics(2, gap=2)
+        return 'done'
+
+    job()
+    assert 'gap: last 2 (step 2), best 1 (step 1)' in complete_message(notificator, 'done')
+
+
+def test_metrics_outside_monitor():
+    notificator = StubNotificator()
+    notificator.log_metrics(0, loss=0.5)
+    notificator.push_metrics()
+    assert notificator.delivered == ['Metrics\nloss: last 0.5 (step 0), best 0.5 (step 0), min 0.5, max 0.5 ▅']
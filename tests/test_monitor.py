@@ -0,0 +1,98 @@
+'''
+@Project : dongdong
+@File : test_monitor.py
+@Description : The event of a monitored function ends, and its threads stop, whichever way the function exits,
+    and only the stops reported by install_shutdown send a message
+'''
+import sys
+import time
+import textwrap
+import threading
+import pytest
+from dongdong.Event import Event
+from helpers import StubNotificator, run_python
+
+
+def dongdong_threads() -> list:
+    '''
+    The watchdog and sampler threads still running, after they had a moment to notice they were stopped.
+    '''
+    for thread in threading.enumerate():
+        if thread.name in ('dongdong-watchdog', 'dongdong-sampler'):
+            thread.join(1)
+    return [thread.name for thread in threading.enumerate() if thread.name in ('dongdong-watchdog', 'dongdong-sampler')]
+
+
+def test_watchdog_stops_after_sys_exit():
+    notificator = StubNotificator()
+
+    @notificator.monitor(watchdog=0.2, telemetry=True, telemetry_interval=0.05)
+    def job():
+        sys.exit(3)
+
+    with pytest.raises(SystemExit):
+        job()
+    time.sleep(0.5)
+    assert not any('stopped making progress' in text for text in notificator.delivered)
+    assert dongdong_threads() == []
+    assert Event.current() is None
+
+
+@pytest.mark.parametrize('error', [SystemExit(0), KeyboardInterrupt()])
+def test_exit_without_message(error):
+    notificator = StubNotificator()
+
+    @notificator.monitor(watchdog=0.2)
+    def job():
+        raise error
+
+    with pytest.raises(type(error)):
+        job()
+    # Only a stop by a signal handled by install_shutdown is reported
+    assert len(notificator.delivered) == 1 and notificator.delivered[0].startswith('The script starts running')
+    assert dongdong_threads() == []
+    assert Event.current() is None
+
+
+def test_cancelled_coroutine():
+    import asyncio
+    notificator = StubNotificator()
+
+    @notificator.monitor(watchdog=0.2)
+    async def job():
+        await asyncio.sleep(60)
+
+    async def main():
+        task = asyncio.ensure_future(job())
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert not any('has crashed' in text for text in notificator.delivered)
+    assert dongdong_threads() == []
+    assert Event.current() is None
+
+
+def test_interrupt_with_install_shutdown():
+    output = run_python(textwrap.dedent('''
+        from dongdong import install_shutdown
+        from helpers import StubNotificator, run_python
+
+        install_shutdown()
+        notificator = StubNotificator(echo=True)
+
+        @notificator.monitor()
+        def job():
+            raise KeyboardInterrupt
+
+        try:
+            job()
+        except KeyboardInterrupt:
+            pass
+    '''))
+    lines = output.splitlines()
+    assert len(lines) == 2
+    assert lines[1].startswith('stub The script was stopped')
+    assert 'Stopped by: SIGINT (KeyboardInterrupt)' in lines[1]
@@ -0,0 +1,88 @@
+'''
+@Project : dongdong
+@File : test_outbox.py
+@Description : Compaction, leases and replay of the outbox
+'''
+import time
+from dongdong.Outbox import Outbox
+from helpers import StubNotificator
+
+
+class FlakyNotificator(StubNotificator):
+    down = False
+
+    def _deliver(self, payload):
+        if self.down:
+            raise ConnectionError('backend down')
+        super()._deliver(payload)
+
+
+def stored(outbox: Outbox) -> list:
+    return [payload for id_, payload, important in outbox.claim('Bark', 'url')]
+
+
+def test_compaction_drops_oldest_pushes_first(tmp_path):
+    outbox = Outbox(str(tmp_path / 'outbox.sqlite'), max_messages=3)
+    outbox.add('Bark', 'url', 'crash', important=True)
+    for text in ('a', 'b', 'c'):
+        outbox.add('Bark', 'url', text)
+    assert stored(outbox) == ['crash', 'b', 'c']
+    outbox.add('Bark', 'url', 'complete', important=True)
+    outbox.add('Bark', 'url', 'interrupt', important=True)
+    # Once only monitor() messages are left, the oldest of them go
+    assert outbox.count() == 3
+
+
+def test_compaction_by_size_and_age(tmp_path):
+    outbox = Outbox(str(tmp_path / 'outbox.sqlite'), max_bytes=100, max_age=0.2)
+    for index in range(5):
+        outbox.add('Bark', 'url', '%d' % index + 'x' * 40)
+    # JSON strings of 43 bytes, three of them would exceed 100 bytes
+    assert outbox.count() == 2
+    time.sleep(0.3)
+    assert stored(outbox) == []
+    outbox.add('Bark', 'url', 'new')
+    assert outbox.count() == 1
+
+
+def test_claim_lease_and_release(tmp_path):
+    outbox = Outbox(str(tmp_path / 'outbox.sqlite'))
+    outbox.add('Bark', 'url', {'text': 'a'})
+    outbox.add('Bark', 'other', {'text': 'b'})
+    claimed = outbox.claim('Bark', 'url')
+    assert [payload for id_, payload, important in claimed] == [{'text': 'a'}]
+    # Leased to this claim, another process does not get it
+    assert outbox.claim('Bark', 'url') == []
+    outbox.release([claimed[0][0]])
+    assert outbox.claim('Bark', 'url') == claimed
+    outbox.remove(claimed[0][0])
+    assert outbox.count('Bark', 'url') == 0 and outbox.count() == 1
+
+
+def wait_empty(outbox: Outbox, timeout: float = 5) -> bool:
+    deadline = time.monotonic() + timeout
+    while outbox.count() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return outbox.count() == 0
+
+
+def test_replay_in_order_once_reachable(tmp_path):
+    outbox = Outbox(str(tmp_path / 'outbox.sqlite'))
+    notificator = FlakyNotificator(outbox=outbox, outbox_retry=0.1)
+    notificator.down = True
+    notificator._push_text('first')
+    notificator._push_text('second')
+    assert outbox.count() == 2 and notificator.delivered == []
+    notificator.down = False
+    assert wait_empty(outbox)
+    assert notificator.delivered == ['first', 'second']
+    assert notificator.stats()['retried'] >= 2
+
+
+def test_replay_by_next_process(tmp_path):
+    outbox = Outbox(str(tmp_path / 'outbox.sqlite'))
+    outbox.add('FlakyNotificator', '', 'left by a previous run', important=True)
+    notificator = FlakyNotificator(outbox=outbox)
+    notificator._push_text('new')
+    assert wait_empty(outbox)
+    assert notificator.delivered == ['new', 'left by a previous run']
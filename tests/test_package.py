@@ -0,0 +1,24 @@
+'''
+@Project : dongdong
+@File : test_package.py
+@Description : The exported names of the package stay the classes, whichever way their modules were imported
+'''
+from helpers import run_python
+
+
+def run(code: str) -> str:
+    return run_python(code).strip()
+
+
+def test_class_after_submodule_import():
+    assert run('from dongdong.DingTalkNotificator import DingTalkNotificator\n'
+               'from dongdong import DingTalkNotificator\n'
+               'print(isinstance(DingTalkNotificator, type))') == 'True'
+
+
+def test_class_after_package_attribute_access():
+    assert run('from dongdong import BarkNotificator\n'
+               'import dongdong.BarkNotificator\n'
+               'import dongdong\n'
+               'print(dongdong.BarkNotificator.__name__, isinstance(dongdong.BarkNotificator, type))') \
+        == 'BarkNotificator True'
@@ -0,0 +1,83 @@
+'''
+@Project : dongdong
+@File : test_progress.py
+@Description : The length of a tracker, known or not, and the monitored call its throughput is reported with
+'''
+import threading
+import pytest
+from dongdong.ProgressTracker import ProgressTracker
+from helpers import StubNotificator
+
+
+def test_len_known():
+    tracker = ProgressTracker(range(5), report=lambda tracker: None)
+    assert len(tracker) == 5
+    assert list(tracker) == [0, 1, 2, 3, 4]
+
+
+def test_len_unknown():
+    tracker = ProgressTracker(iter(range(5)), report=lambda tracker: None)
+    with pytest.raises(TypeError, match='pass total'):
+        len(tracker)
+    assert list(tracker) == [0, 1, 2, 3, 4]
+    assert tracker
+
+
+def complete_messages(notificator) -> dict:
+    '''
+    The complete messages of monitor(), by the value the monitored function returned.
+    '''
+    return {text.rsplit('Main call returned value: ', 1)[1]: text for text in notificator.delivered
+            if text.startswith('The script is complete')}
+
+
+def test_track_in_concurrent_threads():
+    notificator = StubNotificator()
+    barrier = threading.Barrier(2)
+
+    @notificator.monitor()
+    def job(name):
+        for _ in notificator.track(range(3), desc=name):
+            # Both loops run at the same time
+            barrier.wait(5)
+        return name
+
+    threads = [threading.Thread(target=job, args=(name,)) for name in ('first', 'second')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    messages = complete_messages(notificator)
+    assert 'Throughput of first' in messages['first'] and 'Throughput of second' not in messages['first']
+    assert 'Throughput of second' in messages['second'] and 'Throughput of first' not in messages['second']
+
+
+def test_track_in_concurrent_tasks():
+    import asyncio
+    notificator = StubNotificator()
+
+    @notificator.monitor()
+    async def job(name):
+        for _ in notificator.track(range(3), desc=name):
+            await asyncio.sleep(0.01)
+        return name
+
+    async def main():
+        await asyncio.gather(job('first'), job('second'))
+
+    asyncio.run(main())
+    messages = complete_messages(notificator)
+    assert 'Throughput of first' in messages['first'] and 'Throughput of second' not in messages['first']
+    assert 'Throughput of second' in messages['second'] and 'Throughput of first' not in messages['second']
+
+
+def test_track_outside_monitor():
+    notificator = StubNotificator()
+    assert list(notificator.track(range(3))) == [0, 1, 2]
+
+    @notificator.monitor()
+    def job():
+        return 'done'
+
+    job()
+    assert 'Throughput' not in complete_messages(notificator)['done']
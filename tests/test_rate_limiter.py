@@ -0,0 +1,89 @@
+'''
+@Project : dongdong
+@File : test_rate_limiter.py
+@Description : The token buckets: reserved tokens for important messages, waiting and dropping the others
+'''
+import time
+import threading
+from dongdong.RateLimiter import TokenBucket, get_limiter, NORMAL, HIGH
+from helpers import StubNotificator
+
+
+class LimitedNotificator(StubNotificator):
+    def __init__(self, key: str, **kwargs):
+        super().__init__(**kwargs)
+        self.key = key
+
+    def _rate_limit_key(self):
+        return self.key
+
+
+def test_reserve_only_for_high():
+    bucket = TokenBucket(3, 60, reserve=1)
+    assert bucket.acquire(NORMAL, timeout=0)
+    assert bucket.acquire(NORMAL, timeout=0)
+    assert not bucket.acquire(NORMAL, timeout=0)
+    assert bucket.acquire(HIGH, timeout=0)
+    assert not bucket.acquire(HIGH, timeout=0)
+
+
+def test_reserve_below_capacity():
+    bucket = TokenBucket(1, 60, reserve=1)
+    assert bucket.reserve == 0
+    assert bucket.acquire(NORMAL, timeout=0)
+
+
+def test_normal_waits_for_refill():
+    bucket = TokenBucket(2, 0.2, reserve=1)
+    assert bucket.acquire(NORMAL, timeout=0)
+    start = time.monotonic()
+    assert bucket.acquire(NORMAL, timeout=5)
+    # One token back every 0.1 s
+    assert 0.05 < time.monotonic() - start < 1
+
+
+def test_normal_gives_up_after_timeout():
+    bucket = TokenBucket(1, 60, reserve=0)
+    assert bucket.acquire(NORMAL)
+    start = time.monotonic()
+    assert not bucket.acquire(NORMAL, timeout=0.1)
+    assert 0.05 < time.monotonic() - start < 1
+
+
+def test_high_served_before_waiting_normal():
+    bucket = TokenBucket(1, 0.3, reserve=0)
+    assert bucket.acquire(NORMAL)
+    order = []
+    high = threading.Thread(target=lambda: order.append(bucket.acquire(HIGH, timeout=5) and 'high'))
+    high.start()
+    time.sleep(0.05)
+    assert not bucket.acquire(NORMAL, timeout=0)
+    normal = threading.Thread(target=lambda: order.append(bucket.acquire(NORMAL, timeout=5) and 'normal'))
+    normal.start()
+    high.join(5)
+    normal.join(5)
+    assert order == ['high', 'normal']
+
+
+def test_limiter_shared_by_key():
+    assert get_limiter('test-shared', 5, 60) is get_limiter('test-shared', 10, 1)
+    assert get_limiter('test-shared', 5, 60) is not get_limiter('test-other', 5, 60)
+
+
+def test_notificator_drops_regular_keeps_important():
+    notificator = LimitedNotificator('test-drop', rate_limit=(2, 60), rate_limit_wait=0)
+    before = notificator.stats()['dropped']
+    for i in range(3):
+        notificator._push_text('regular %d' % i)
+    notificator._push_text('crash', important=True)
+    assert notificator.delivered == ['regular 0', 'crash']
+    assert notificator.stats()['dropped'] - before == 2
+
+
+def test_notificator_regular_waits():
+    notificator = LimitedNotificator('test-wait', rate_limit=(2, 0.2), rate_limit_wait=5)
+    start = time.monotonic()
+    for i in range(3):
+        notificator._push_text('regular %d' % i)
+    assert notificator.delivered == ['regular 0', 'regular 1', 'regular 2']
+    assert time.monotonic() - start > 0.1
@@ -0,0 +1,52 @@
+'''
+@Project : dongdong
+@File : test_relay.py
+@Description : Messages, and the webhook tokens they hold, only go to a relay socket of this user
+'''
+import os
+import pytest
+from dongdong.Relay import RelayServer, RelayClient, find_relay
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'getuid'), reason='Unix sockets of a user')
+
+REQUEST = {'url': 'https://example.com/hook?access_token=secret', 'json': {'text': 'hi'}}
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = RelayServer(str(tmp_path / 'relay.sock')).bind()
+    server._sock.settimeout(1)
+    yield server
+    server.close(timeout=0)
+
+
+def test_submits_to_own_socket(server):
+    assert RelayClient(server.path).submit(REQUEST)
+    assert b'secret' in server._sock.recv(65536)
+
+
+def test_refuses_writable_socket(server):
+    os.chmod(server.path, 0o666)
+    assert not RelayClient(server.path).submit(REQUEST)
+
+
+@pytest.mark.skipif(not hasattr(os, 'getuid') or os.getuid() != 0, reason='needs root to chown')
+def test_refuses_socket_of_another_user(server):
+    os.chown(server.path, 65534, -1)
+    assert not RelayClient(server.path).submit(REQUEST)
+
+
+def test_refuses_other_files(tmp_path):
+    path = tmp_path / 'relay.sock'
+    path.write_text('')
+    assert not RelayClient(str(path)).submit(REQUEST)
+
+
+def test_temp_directory_only_when_enabled(monkeypatch):
+    monkeypatch.delenv('DONGDONG_RELAY', raising=False)
+    monkeypatch.delenv('XDG_RUNTIME_DIR', raising=False)
+    assert find_relay() is None
+    assert find_relay(False) is None
+    assert find_relay(True) is not None
+    monkeypatch.setenv('XDG_RUNTIME_DIR', '/run/user/1000')
+    assert find_relay().path == '/run/user/1000/dongdong-relay.sock'
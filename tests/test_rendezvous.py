@@ -0,0 +1,72 @@
+'''
+@Project : dongdong
+@File : test_rendezvous.py
+@Description : The rendezvous directory of a job, and the crash message of a rank rank 0 does not collect
+'''
+import os
+import time
+import threading
+import pytest
+import dongdong.Event
+from dongdong.Rendezvous import FileRendezvous, default_rendezvous_dir
+from helpers import StubNotificator
+
+
+@pytest.fixture
+def rank1(monkeypatch):
+    for name in ('DONGDONG_RENDEZVOUS_DIR', 'TORCHELASTIC_RUN_ID', 'SLURM_JOB_ID'):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv('RANK', '1')
+    monkeypatch.setenv('WORLD_SIZE', '2')
+    monkeypatch.setenv('MASTER_ADDR', '10.0.0.1')
+    monkeypatch.setenv('MASTER_PORT', '29500')
+    monkeypatch.setattr(dongdong.Event, '_host_metadata',
+                        {'host': 'node', 'host_name': 'node - RANK: 1', 'master_process': False})
+
+
+def test_run_id_none_is_ignored(rank1, monkeypatch):
+    monkeypatch.setenv('TORCHELASTIC_RUN_ID', 'none')
+    assert os.path.basename(default_rendezvous_dir()) == '10.0.0.1-29500-%d' % os.getppid()
+    monkeypatch.setenv('TORCHELASTIC_RUN_ID', 'job-42')
+    assert os.path.basename(default_rendezvous_dir()) == 'job-42'
+
+
+def crashing_job(notificator, directory, fallback: float):
+    @notificator.monitor(distributed=True, rendezvous_dir=str(directory), rendezvous_fallback=fallback)
+    def train():
+        raise ValueError('nan loss')
+
+    with pytest.raises(ValueError):
+        train()
+
+
+def test_crash_sent_when_not_collected(rank1, tmp_path):
+    notificator = StubNotificator()
+    crashing_job(notificator, tmp_path, 0.2)
+    assert len(notificator.delivered) == 1
+    assert notificator.delivered[0].startswith('The script has crashed')
+    assert 'ValueError: nan loss' in notificator.delivered[0]
+
+
+def test_crash_left_to_rank0(rank1, tmp_path):
+    notificator = StubNotificator()
+    rank0 = FileRendezvous(str(tmp_path), 0, 2)
+    rank0.report({'rank': 0, 'status': 'complete', 'end': time.time()})
+    collected = {}
+    collector = threading.Thread(target=lambda: collected.update(rank0.collect(10)))
+    collector.start()
+    crashing_job(notificator, tmp_path, 10)
+    collector.join()
+    assert notificator.delivered == []
+    assert collected[1]['error'] == 'ValueError: nan loss'
+
+
+def test_complete_does_not_wait(rank1, tmp_path):
+    notificator = StubNotificator()
+
+    @notificator.monitor(distributed=True, rendezvous_dir=str(tmp_path), rendezvous_fallback=60)
+    def train():
+        return 1
+
+    assert train() == 1
+    assert notificator.delivered == []
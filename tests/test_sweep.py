@@ -0,0 +1,37 @@
+'''
+@Project : dongdong
+@File : test_sweep.py
+@Description : The directory of a sweep is removed with the final summary, only if the sweep made it
+'''
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dongdong.SweepMonitor import SweepMonitor
+from helpers import RecordingNotificator
+
+
+def run_sweep(directory=None):
+    notificator = RecordingNotificator()
+    monitor = SweepMonitor(notificator, name='test-%d' % (directory is None), rank_by='loss', directory=directory)
+
+    @monitor
+    def trial(lr):
+        return {'loss': (lr - 0.3) ** 2}
+
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(trial, [0.1, 0.2, 0.3, 0.4]))
+    monitor.close()
+    return monitor, notificator
+
+
+def test_temporary_directory_removed():
+    monitor, notificator = run_sweep()
+    assert notificator.messages[0][0] == 'Sweep test-1 is over'
+    assert 'Trials: 4 started, 0 running, 4 complete, 0 crashed' in notificator.messages[0][1]
+    assert not os.path.exists(monitor.directory)
+    assert not os.path.exists(monitor.directory + '.closed')
+
+
+def test_given_directory_kept(tmp_path):
+    monitor, notificator = run_sweep(str(tmp_path / 'trials'))
+    assert len(notificator.messages) == 1
+    assert len(os.listdir(monitor.directory)) == 4
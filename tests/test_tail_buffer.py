@@ -0,0 +1,83 @@
+'''
+@Project : dongdong
+@File : test_tail_buffer.py
+@Description : The last lines of a command: bounded by bytes, and never showing half a character
+'''
+from dongdong.CommandRunner import TailBuffer
+
+
+def test_last_lines():
+    tail = TailBuffer(max_lines=3)
+    for i in range(10):
+        tail.feed(b'line %d\n' % i)
+    tail.feed(b'partial')
+    assert tail.text() == 'line 7\nline 8\nline 9\npartial'
+
+
+def test_chunk_of_many_lines():
+    tail = TailBuffer(max_lines=3)
+    tail.feed(b'start of a line ')
+    tail.feed(b''.join(b'line %d\n' % i for i in range(1000)) + b'end')
+    assert tail.text() == 'line 997\nline 998\nline 999\nend'
+
+
+def test_long_line_cut():
+    tail = TailBuffer(max_lines=3, max_line_bytes=10)
+    tail.feed(b'0123456789abcdef\nshort\n')
+    assert tail.text() == '0123456789 [...]\nshort'
+
+
+def test_memory_bounded_without_newline():
+    tail = TailBuffer(max_lines=3, max_line_bytes=100)
+    for _ in range(1000):
+        tail.feed(b'x' * 1000)
+    assert len(tail._partial) == 100
+    assert tail.text() == 'x' * 100 + ' [...]'
+    tail.feed(b'\nnext\n')
+    assert tail.text() == 'x' * 100 + ' [...]\nnext'
+
+
+def test_carriage_return():
+    tail = TailBuffer(max_lines=3, max_line_bytes=10)
+    tail.feed(b'epoch 1: ' + b'#' * 20)
+    tail.feed(b'\repoch 1: 100%\n')
+    assert tail.text() == 'epoch 1: 1 [...]'
+    tail.feed(b'\r10%')
+    tail.feed(b'\r50%')
+    assert tail.text() == 'epoch 1: 1 [...]\n50%'
+
+
+def test_character_split_between_reads():
+    tail = TailBuffer()
+    data = 'loss 0.5 ✓ 训练完成 🎉\n'.encode('utf-8')
+    for i in range(len(data)):
+        tail.feed(data[i:i + 1])
+    assert tail.text() == 'loss 0.5 ✓ 训练完成 🎉'
+
+
+def test_cut_inside_character():
+    for size, text in ((2, 'é'), (3, 'é'), (4, 'éé'), (5, 'éé')):
+        tail = TailBuffer(max_line_bytes=size)
+        tail.feed('ééé\n'.encode('utf-8'))
+        assert tail.text() == text + ' [...]'
+    for size in range(4):
+        tail = TailBuffer(max_line_bytes=4 + size)
+        tail.feed('🎉🎉\n'.encode('utf-8'))
+        assert tail.text() == '🎉 [...]'
+    tail = TailBuffer(max_line_bytes=3)
+    tail.feed('a训练\n'.encode('utf-8'))
+    assert tail.text() == 'a [...]'
+
+
+def test_cut_inside_character_across_reads():
+    tail = TailBuffer(max_line_bytes=4)
+    data = 'ab训练'.encode('utf-8')
+    tail.feed(data[:3])
+    tail.feed(data[3:] + b'\n')
+    assert tail.text() == 'ab [...]'
+
+
+def test_invalid_bytes_replaced():
+    tail = TailBuffer()
+    tail.feed(b'latin-1 \xe9t\xe9\n')
+    assert tail.text() == 'latin-1 �t�'
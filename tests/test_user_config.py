@@ -0,0 +1,83 @@
+'''
+@Project : dongdong
+@File : test_user_config.py
+@Description : Where the tokens and webhooks come from: arguments, profile, [default] section, environment
+'''
+import pytest
+from dongdong import setconfigures, DingTalkNotificator
+from dongdong.UserConfig import load_config, STR_KEYS, LIST_KEYS
+
+WEBHOOK = 'https://oapi.dingtalk.com/robot/send?access_token=%s'
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    for name in STR_KEYS + LIST_KEYS:
+        monkeypatch.delenv('DONGDONG_' + name.upper(), raising=False)
+    monkeypatch.delenv('DONGDONG_PROFILE', raising=False)
+    path = str(tmp_path / 'config.ini')
+    monkeypatch.setenv('DONGDONG_CONFIG', path)
+    return path
+
+
+def test_nothing_set(config):
+    values = load_config()
+    assert values['bark_token'] == ''
+    assert values['dingtalk_user_mentions'] == []
+
+
+def test_profile_before_default_section(config):
+    setconfigures(dingtalk_webhook=WEBHOOK % 'default', bark_token='default-bark')
+    setconfigures(dingtalk_webhook=WEBHOOK % 'cluster', profile='cluster')
+    values = load_config('cluster')
+    assert values['dingtalk_webhook'] == WEBHOOK % 'cluster'
+    # Missing from the profile
+    assert values['bark_token'] == 'default-bark'
+    assert load_config()['dingtalk_webhook'] == WEBHOOK % 'default'
+
+
+def test_default_section_before_environment(config, monkeypatch):
+    setconfigures(bark_token='file-bark')
+    monkeypatch.setenv('DONGDONG_BARK_TOKEN', 'env-bark')
+    monkeypatch.setenv('DONGDONG_TEAMS_WEBHOOK', 'https://teams.example/env')
+    values = load_config()
+    assert values['bark_token'] == 'file-bark'
+    assert values['teams_webhook'] == 'https://teams.example/env'
+
+
+def test_environment_lists(config, monkeypatch):
+    monkeypatch.setenv('DONGDONG_DINGTALK_USER_MENTIONS', '138xxxx, 139xxxx,')
+    assert load_config()['dingtalk_user_mentions'] == ['138xxxx', '139xxxx']
+
+
+def test_profile_from_environment(config, monkeypatch):
+    setconfigures(bark_token='cluster-bark', profile='cluster')
+    monkeypatch.setenv('DONGDONG_PROFILE', 'cluster')
+    assert load_config()['bark_token'] == 'cluster-bark'
+
+
+def test_missing_profile(config):
+    setconfigures(bark_token='default-bark')
+    with pytest.raises(ValueError):
+        load_config('missing')
+
+
+def test_setconfigures_keeps_other_values(config):
+    setconfigures(bark_token='bark', dingtalk_user_mentions=['138xxxx', '139xxxx'])
+    setconfigures(teams_webhook='https://teams.example/file')
+    values = load_config()
+    assert values['bark_token'] == 'bark'
+    assert values['teams_webhook'] == 'https://teams.example/file'
+    assert values['dingtalk_user_mentions'] == ['138xxxx', '139xxxx']
+
+
+def test_arguments_before_config(config, monkeypatch):
+    setconfigures(dingtalk_webhook=WEBHOOK % 'default', dingtalk_user_mentions=['138xxxx'])
+    setconfigures(dingtalk_webhook=WEBHOOK % 'cluster', profile='cluster')
+    monkeypatch.setenv('DONGDONG_DINGTALK_USER_MENTIONS', '139xxxx')
+    notificator = DingTalkNotificator(WEBHOOK % 'argument', profile='cluster', relay=False)
+    assert notificator.webhook == WEBHOOK % 'argument'
+    assert notificator.user_mentions == ['138xxxx']
+    notificator = DingTalkNotificator(user_mentions=['137xxxx'], profile='cluster', relay=False)
+    assert notificator.webhook == WEBHOOK % 'cluster'
+    assert notificator.user_mentions == ['137xxxx']